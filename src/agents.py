@@ -4,10 +4,22 @@ Created on 07/set/2016
 @author: Lorenzo Selvatici
 '''
 
+import random
+import time
+
+import gamelog
 import util
-from settings import Settings
+from settings import getConfig
 from rules import Rules, Action
-from inference import ExactInference
+from inference import BeliefService
+from hashing import ZOBRIST, TranspositionTable
+from reachability import TicketReachability
+
+log = gamelog.getLogger("agents")
+try:
+    from distances import DistanceOracle, MAX_TABLE_NODES
+except ImportError: # numpy is not available
+    DistanceOracle = None
 
 class AgentRole:
     """
@@ -23,10 +35,12 @@ class AgentState:
     Example: current position, moves history, number of ticket, ect.
     """
     
-    def __init__(self, ticketDict, initialPosition, movesHistory=[]):
+    def __init__(self, ticketDict, initialPosition, movesHistory=None):
         """
         Initializes the agent state, the optional parameters movesHistory is by default an empty list.
         """
+        if movesHistory is None:
+            movesHistory = [] # NOT a default argument: the list would be shared by all the agent states
         self.position = initialPosition
         self.movesHistory = movesHistory # a list of Action
         self.ticketDict=ticketDict
@@ -39,6 +53,14 @@ class AgentState:
         self.movesHistory.append(action)
         self.position = action.getEnd()
     
+    def removeLastMove(self):
+        """
+        Removes the last action from the history and moves the agent back to its start, returns the action.
+        """
+        action = self.movesHistory.pop()
+        self.position = action.getStart()
+        return action
+    
     def getMovesHistory(self):
         """
         Return a list of Action.
@@ -66,13 +88,17 @@ class Agent:
     Represents a generic ABSTRACT agent (the getAction and deepCopy methods are not implemented yet).    
     """
     
-    def __init__(self, index, role, agentState):
+    def __init__(self, index, role, agentState, config=None):
+        """
+        config is the configuration of the game (GameConfig in settings.py), the default one if it is None.
+        """
         assert index>=0
         if index==0: assert role==AgentRole.Mr_X
         if index>0: assert role==AgentRole.COP
         self.index = index
         self.role = role
         self.agentState = agentState
+        self.config = getConfig(config)
     
     def getRole(self):
         """
@@ -110,6 +136,14 @@ class Agent:
         tickets[ticket]-=1
         self.agentState.addMoveToHistory(action)
     
+    def undoAction(self, action):
+        """
+        Undoes the action, which must be the last one performed (see performAction).
+        """
+        assert self.agentState.getMovesHistory()[-1] == action
+        self.agentState.removeLastMove()
+        self.agentState.ticketDict[action.getTicketType()]+=1
+    
     def __repr__(self):
         return "{} ({}) -> {}\n".format(self.role, self.type, self.index) + self.agentState.__str__()
 
@@ -118,23 +152,26 @@ class MrX(Agent):
     A generic Mr.X agent, still abstract.
     """
     
-    def __init__(self, agentState=None):
+    def __init__(self, agentState=None, config=None):
         """
         An agent state (AgentState) can be optionally supplied, otherwise it would be loaded by the settings
         """
+        config = getConfig(config)
         if agentState is None:
-            # create the agent state from the specified settings in Settings (see settings.py)
-            ticketDict = Settings.getInitialMrXTickets()
-            initialPosition = Settings.getInitialMrXPosition()
+            # create the agent state from the settings of the configuration (see settings.py)
+            ticketDict = config.getInitialMrXTickets()
+            initialPosition = config.getInitialMrXPosition()
             agentState = AgentState(ticketDict, initialPosition)
         
         self.notHiddenMoves = {}
+        self.notHiddenMovesNumbers = config.getNotHiddenMovesNumbers()
         moves = agentState.getMovesHistory()
         for i, action in enumerate(moves):
-            if i+1 in Settings.getNotHiddenMovesNumbers():
+            if i+1 in self.notHiddenMovesNumbers:
                 self.notHiddenMoves[i+1] = action.getEnd()
+        self.ticketHistory = [action.getTicketType() for action in moves] # kept up to date by performAction
         
-        Agent.__init__(self, 0, AgentRole.Mr_X, agentState)
+        Agent.__init__(self, 0, AgentRole.Mr_X, agentState, config)
     
     def __eq__(self, other):
         if not isinstance(other, MrX):
@@ -142,11 +179,11 @@ class MrX(Agent):
         return self.getAgentState() == other.getAgentState()
     
     def __repr__(self):
-        if Settings.isDebug():
+        if self.config.isDebug():
             return Agent.__repr__(self)
         else:
             not_hidden = {}
-            for number in Settings.getNotHiddenMovesNumbers():
+            for number in self.notHiddenMovesNumbers:
                 not_hidden[number] = "-" if number not in self.notHiddenMoves \
                                          else self.notHiddenMoves[number]
                 
@@ -155,34 +192,64 @@ class MrX(Agent):
                  + str([action.getTicketType() for action in self.agentState.movesHistory]) \
                  + "\n" + "\n".join("{} : {}".format(key, not_hidden[key]) for key in sorted(not_hidden))
     
+    def getTicketHistory(self):
+        """
+        Returns the list of the tickets used by Mr.X, in order: it must NOT be modified.
+        """
+        return self.ticketHistory
+    
     def performAction(self, action):
         Agent.performAction(self, action)
+        self.ticketHistory.append(action.getTicketType())
         current = len(self.agentState.movesHistory)
-        if current in Settings.getNotHiddenMovesNumbers():
+        if current in self.notHiddenMovesNumbers:
             self.notHiddenMoves[current] = self.agentState.getPosition()
+    
+    def undoAction(self, action):
+        current = len(self.agentState.movesHistory)
+        if current in self.notHiddenMoves:
+            del self.notHiddenMoves[current]
+        Agent.undoAction(self, action)
+        self.ticketHistory.pop()
         
 class Cop(Agent):
     """
     A generic cop agent, still abstract.
     """
     
-    def __init__(self, index, agentState=None):
+    def __init__(self, index, agentState=None, config=None):
         """
         An agent state (AgentState) can be optionally supplied, otherwise it would be loaded by the settings
         """
+        config = getConfig(config)
         if agentState is None:
-            # create the agent state from the specified settings in Settings (see settings.py)
-            ticketDict = Settings.getInitialCopsTickets()
-            initialPosition = Settings.getInitialCopsPositions(index)
+            # create the agent state from the settings of the configuration (see settings.py)
+            ticketDict = config.getInitialCopsTickets()
+            initialPosition = config.getInitialCopsPositions(index)
             agentState = AgentState(ticketDict, initialPosition)
         
-        Agent.__init__(self, index, AgentRole.COP, agentState)
+        Agent.__init__(self, index, AgentRole.COP, agentState, config)
+        self.beliefService = None
+    
+    def setBeliefService(self, beliefService):
+        """
+        Shares the beliefs of the team (BeliefService in inference.py) with the cop.
+        """
+        self.beliefService = beliefService
+    
+    def getBeliefService(self):
+        """
+        Returns the beliefs of the team, a service of its own is created if none was shared with the cop.
+        """
+        if self.beliefService is None:
+            self.beliefService = BeliefService(config=self.config)
+        return self.beliefService
     
     def deepCopy(self):
         """
         Returns a deep copy of itself.
         """
-        return Cop(self.index, self.agentState.deepCopy())
+        return Cop(self.index, self.agentState.deepCopy(), self.config)
     
     def __eq__(self, other):
         if not isinstance(other, Cop):
@@ -233,15 +300,15 @@ class KeyboardMrX(KeyboardAgent, MrX):
     """
     A Mr.X agent whose action are taken as input from the keyboard.
     """
-    def __init__(self, agentState = None):
-        MrX.__init__(self, agentState)
+    def __init__(self, agentState = None, config = None):
+        MrX.__init__(self, agentState, config)
         self.type = "KeyboardMrX"
     
     def deepCopy(self):
         """
         Returns a deep copy of itself.
         """
-        return KeyboardMrX(self.agentState.deepCopy())
+        return KeyboardMrX(self.agentState.deepCopy(), self.config)
     
     def __repr__(self):
         return MrX.__repr__(self)
@@ -249,50 +316,635 @@ class KeyboardMrX(KeyboardAgent, MrX):
     def performAction(self, action):
         MrX.performAction(self, action)
 
+    def undoAction(self, action):
+        MrX.undoAction(self, action)
+
 
 class KeyboardCop(KeyboardAgent, Cop):
     """
     A Cop agent whose action are taken as input from the keyboard.
     """
-    def __init__(self, index, agentState = None):
-        Cop.__init__(self, index, agentState)
+    def __init__(self, index, agentState = None, config = None):
+        Cop.__init__(self, index, agentState, config)
         self.type = "KeyboardCop"
         
     def deepCopy(self):
         """
         Returns a deep copy of itself.
         """
-        return KeyboardCop(self.index, self.agentState.deepCopy())
+        return KeyboardCop(self.index, self.agentState.deepCopy(), self.config)
+
+
+def distancesFrom(node, layout):
+    """
+    Returns the number of moves (whatever the tickets) from node to every node of layout, as a sequence indexed
+    by node.
+    With numpy and at most MAX_TABLE_NODES nodes the distances come from the tables of the DistanceOracle
+    (see distances.py) and the nodes which can not be reached have the distance DistanceOracle.getUnreachable()
+    (255 or 65535), otherwise they are computed with a BFS and cached, and the nodes which can not be reached
+    have the distance number of nodes.
+    NOTE : compare with a value not smaller than the number of nodes to know if a node can be reached.
+    """
+    size = len(layout.getAdjacency()[0]) - 1
+    if DistanceOracle is not None and size <= MAX_TABLE_NODES:
+        return DistanceOracle.forLayout(layout).distancesFrom([node])[0]
+    
+    cache = layout.getShared("distancesFrom", lambda layout: {}) # node --> [number of moves to every node]
+    if node not in cache:
+        if len(cache) > max(16, 2 ** 24 // size): # at most some millions of distances
+            cache.clear()
+        distances = [size] * size
+        distances[node] = 0
+        frontier = [node]
+        while frontier:
+            next_frontier = []
+            for n in frontier:
+                for m in layout.getNeighbours(n):
+                    if distances[m] == size:
+                        distances[m] = distances[n] + 1
+                        next_frontier.append(m)
+            frontier = next_frontier
+        cache[node] = distances
+    return cache[node]
+
+
+class SearchTimeout(Exception):
+    """
+    Raised when the time budget of a search agent expires.
+    """
+    pass
+
+
+class SearchCop(Cop):
+    """
+    An autonomous cop which plans with a depth-limited expectimax search:
+    - the position of Mr.X is a chance node, distributed as the beliefs of the team (see BeliefService)
+      (only the GameConfig.getSearchBeliefSamples() most likely positions are considered);
+    - Mr.X moves are chance nodes too (uniform among his legal moves, the model of the inference);
+    - the cops (all of them, played in turn order) maximize the utility.
+    The moves after which the cop can not meet Mr.X anymore with the tickets left (see _pruneActions)
+    are not searched.
+    The search uses iterative deepening with move ordering and a transposition table of its own
+    (the agents are created for every game, so are the tables), and returns the best move of the
+    last completed depth when the time budget (GameConfig.getSearchTimeBudget()) expires.
+    NOTE : a capture is worth WIN + the depth left, so only the values searched at the same depth are reused.
+    """
+    
+    WIN = 1000.0 # utility of a capture
+    
+    def __init__(self, index, agentState=None, beliefService=None, stats=None, config=None, table=None):
+        Cop.__init__(self, index, agentState, config)
+        self.type = "SearchCop"
+        self.beliefService = beliefService
+        if stats is None:
+            stats = {"moves": 0, "nodes": 0, "time": 0.0, "depth": 0, "nodesPerSecond": 0.0, "depths": [],
+                     "pruned": 0}
+        self.stats = stats # shared by the copies of the agent
+        if table is None:
+            table = TranspositionTable()
+        self.table = table # shared by the copies of the agent
+    
+    def deepCopy(self):
+        return SearchCop(self.index, self.agentState.deepCopy(), self.beliefService, self.stats, self.config,
+                         self.table)
+    
+    def getStats(self):
+        """
+        Returns the statistics of the search: number of moves, searched nodes, seconds, depth reached
+        (of the last move and of every move), nodes per second and root moves pruned (see _pruneActions).
+        """
+        return self.stats
+    
+    def getAction(self, gameState, display):
+        """
+        Returns the best action found within the time budget, None if there is no legal action.
+        """
+        startTime = time.time()
+        self.deadline = startTime + self.config.getSearchTimeBudget()
+        self.maxNumMoves = gameState.data.config.getMaxNumMoves()
+        self.layout = gameState.data.layout
+        self.nodes = 0
+        
+        rootActions = Rules.getLegalActions(self, gameState.data)
+        if rootActions == []:
+            return None
+        
+        samples = self._sampleMrXPositions(gameState)
+        rootActions = self._pruneActions(rootActions, samples, gameState)
+        states = [] # one copy of the state for every possible position of Mr.X
+        for position, _ in samples:
+            state = gameState.deepCopy()
+            state.placeAgent(0, position)
+            states.append(state)
+        
+        # initial move ordering: closer to the most likely position of Mr.X first
+        distances = distancesFrom(samples[0][0], self.layout)
+        rootActions.sort(key=lambda action: distances[action.getEnd()])
+        bestAction, depthReached = rootActions[0], 0
+        
+        try:
+            for depth in range(1, self.config.getSearchMaxDepth() + 1):
+                values = [self._expectedValue(states, samples, action, depth) for action in rootActions]
+                ranking = sorted(range(len(rootActions)), key=lambda i: -values[i])
+                rootActions = [rootActions[i] for i in ranking] # best first at the next iteration
+                bestAction, depthReached = rootActions[0], depth
+        except SearchTimeout:
+            pass
+        
+        elapsed = time.time() - startTime
+        self.stats["moves"] += 1
+        self.stats["nodes"] += self.nodes
+        self.stats["time"] += elapsed
+        self.stats["depth"] = depthReached
+        self.stats["depths"].append(depthReached)
+        self.stats["nodesPerSecond"] = self.stats["nodes"] / max(self.stats["time"], 1e-9)
+        return bestAction
+    
+    def _sampleMrXPositions(self, gameState):
+        """
+        Returns the list of the most likely positions of Mr.X, according to the beliefs of the team,
+        with their (normalized) probabilities: [(position, probability), ...]
+        """
+        numSamples = self.config.getSearchBeliefSamples()
+        beliefs = self.getBeliefService().getBeliefs(gameState)
+        if isinstance(beliefs, util.Distribution):
+            samples = [(p, pos) for pos, p in beliefs.topK(numSamples)]
+        else:
+            samples = sorted([(p, pos) for pos, p in beliefs.items() if p > 0], reverse=True)
+            samples = samples[:numSamples]
+        if samples == []: # the evidences are not consistent: guess uniformly
+            samples = [(1.0, pos) for pos in gameState.data.config.getLegalPositions()][:numSamples]
+        total = sum([p for p, _ in samples])
+        return [(pos, p / total) for p, pos in samples]
+    
+    def _pruneActions(self, actions, samples, gameState):
+        """
+        Ticket budget pruning (see reachability.py): drops the actions after which the cop can not reach,
+        with the tickets it has left and within the moves left, any node that Mr.X can reach
+        from his likely positions with his tickets (unless all of the actions are such).
+        """
+        engine = TicketReachability.forLayout(self.layout)
+        movesLeft = self.maxNumMoves - gameState.getNumMoves()
+        mrxTickets = gameState.data.getAgentState(0).getTicketsAsDict()
+        mrxNodes = set()
+        for position, _ in samples:
+            mrxNodes.update(engine.reachable(position, mrxTickets, movesLeft))
+        
+        tickets = self.agentState.getTicketsAsDict()
+        result = []
+        for action in actions:
+            left = dict(tickets)
+            left[action.getTicketType()] -= 1
+            reachable = engine.reachable(action.getEnd(), left, movesLeft)
+            if not mrxNodes.isdisjoint(reachable):
+                result.append(action)
+        if result == []:
+            return actions
+        self.stats["pruned"] += len(actions) - len(result)
+        return result
+    
+    def _expectedValue(self, states, samples, action, depth):
+        """
+        The value of the action averaged over the possible positions of Mr.X.
+        """
+        nextIndex = (self.index + 1) % (states[0].numberOfCops() + 1)
+        result = 0.0
+        for state, (_, probability) in zip(states, samples):
+            state.applyAction(self.index, action, trusted=True)
+            try:
+                result += probability * self._value(state, nextIndex, depth - 1)
+            finally:
+                state.undoAction()
+        return result
+    
+    def _value(self, state, agentIndex, depth):
+        """
+        The expectimax value of the state, with agentIndex to move and depth moves left.
+        """
+        self.nodes += 1
+        if self.nodes & 127 == 0 and time.time() > self.deadline:
+            raise SearchTimeout()
+        
+        data = state.data
+        mrxPosition = data.getAgentState(0).getPosition()
+        for i in range(data.numberOfCops()):
+            if data.getAgentState(i + 1).getPosition() == mrxPosition:
+                return SearchCop.WIN + depth # the sooner the better
+        if agentIndex == 0 and data.getNumMoves() == self.maxNumMoves:
+            return -SearchCop.WIN
+        if depth == 0:
+            return self._evaluate(data)
+        
+        key = data.getHash() ^ ZOBRIST.turn(agentIndex)
+        entry = self.table.probe(key, depth, exact=True)
+        if entry is not None:
+            return entry[1]
+        
+        agent = data.getAgent(agentIndex)
+        actions = Rules.getLegalActions(agent, data)
+        nextIndex = (agentIndex + 1) % (data.numberOfCops() + 1)
+        bestAction = None
+        
+        if agentIndex == 0:
+            if actions == []:
+                value = SearchCop.WIN + depth # Mr.X is stuck
+            else:
+                value = 0.0
+                for action in actions:
+                    state.applyAction(0, action, trusted=True)
+                    try:
+                        value += self._value(state, nextIndex, depth - 1)
+                    finally:
+                        state.undoAction()
+                value /= len(actions)
+        elif actions == []:
+            value = self._value(state, nextIndex, depth - 1) # skip the turn
+        else:
+            value = None
+            for action in self._orderActions(actions, key, mrxPosition):
+                state.applyAction(agentIndex, action, trusted=True)
+                try:
+                    actionValue = self._value(state, nextIndex, depth - 1)
+                finally:
+                    state.undoAction()
+                if value is None or actionValue > value:
+                    value, bestAction = actionValue, action
+        
+        self.table.store(key, depth, value, TranspositionTable.EXACT, bestAction)
+        return value
+    
+    def _orderActions(self, actions, key, mrxPosition):
+        """
+        Move ordering: the best action of the transposition table first, then the ones closer to Mr.X.
+        """
+        distances = distancesFrom(mrxPosition, self.layout)
+        ordered = sorted(actions, key=lambda action: distances[action.getEnd()])
+        best = self.table.getBestAction(key)
+        if best is not None and best in ordered:
+            ordered.remove(best)
+            ordered.insert(0, best)
+        return ordered
+    
+    def _evaluate(self, data):
+        """
+        Heuristic utility of a (not final) state: the cops should be close to Mr.X.
+        """
+        distances = distancesFrom(data.getAgentState(0).getPosition(), data.layout)
+        copDistances = [int(distances[data.getAgentState(i + 1).getPosition()])
+                        for i in range(data.numberOfCops())]
+        return -10.0 * min(copDistances) - float(sum(copDistances)) / len(copDistances)
+
+
+class MCTSNode:
+    """
+    A node of the (open loop) tree of MCTSMrX: it represents a sequence of Mr.X moves,
+    the cop responses in between are sampled again at every simulation.
+    """
+    
+    def __init__(self, numMoves, position):
+        self.numMoves = numMoves # the number of moves of Mr.X and his position when it is his turn
+        self.position = position # in the node (they identify the node when the tree is reused)
+        self.children = {} # Action --> MCTSNode
+        self.visits = 0
+        self.value = 0.0 # the sum of the results of the simulations (1 Mr.X escapes, 0 he is caught)
+    
+    def getChild(self, action):
+        if action not in self.children:
+            self.children[action] = MCTSNode(self.numMoves + 1, action.getEnd())
+        return self.children[action]
+    
+    def select(self, actions, exploration):
+        """
+        Returns the action with the highest UCB1 score among actions (the not visited ones first).
+        """
+        import math
+        logVisits = math.log(max(self.visits, 1))
+        best, bestScore = None, None
+        for action in actions:
+            child = self.children.get(action)
+            if child is None or child.visits == 0:
+                return action
+            score = child.value / child.visits + exploration * math.sqrt(logVisits / child.visits)
+            if bestScore is None or score > bestScore:
+                best, bestScore = action, score
+        return best
+
+
+class MCTSMrX(MrX):
+    """
+    A Mr.X agent which plans with Monte Carlo Tree Search (UCT).
+    - the tree contains only Mr.X decisions, the expansion uses Rules.getLegalActions;
+    - the responses of the cops are sampled: each cop moves towards the last position where Mr.X
+      was revealed (NOT_HIDDEN_MOVES schedule), sometimes at random;
+    - the rollouts play until the end of the game with the same cops and a Mr.X who avoids the cops.
+    Every move the search runs for GameConfig.getMCTSTimeBudget() seconds. With GameConfig.getMCTSWorkers() > 1
+    as many processes build their own trees in parallel (root parallelization) and their statistics
+    of the moves from the root are added to the ones of the main tree.
+    The subtree of the chosen move is reused on the next turn.
+    """
+    
+    EXPLORATION = 0.7  # UCB1 exploration constant
+    RANDOM_COP_MOVE = 0.3 # probability that a sampled cop moves at random
+    
+    def __init__(self, agentState = None, memory = None, config = None):
+        MrX.__init__(self, agentState, config)
+        self.type = "MCTSMrX"
+        if memory is None:
+            memory = {"root": None,
+                      "stats": {"moves": 0, "simulations": 0, "time": 0.0, "simulationsPerSecond": 0.0,
+                                "reusedVisits": 0, "workers": 1}}
+        self.memory = memory # the tree and the statistics, shared by the copies of the agent
+    
+    def deepCopy(self):
+        """
+        Returns a deep copy of itself.
+        """
+        return MCTSMrX(self.agentState.deepCopy(), self.memory, self.config)
+    
+    def __repr__(self):
+        return MrX.__repr__(self)
+    
+    def performAction(self, action):
+        MrX.performAction(self, action)
+    
+    def undoAction(self, action):
+        MrX.undoAction(self, action)
+    
+    def getStats(self):
+        """
+        Returns the statistics of the search: number of moves, simulations, seconds, simulations per second,
+        visits inherited from the previous turns (tree reuse) and number of processes.
+        """
+        return self.memory["stats"]
+    
+    def getAction(self, gameState, display):
+        """
+        Returns the move with the most visits after the search, None if there is no legal action.
+        """
+        startTime = time.time()
+        budget = self.config.getMCTSTimeBudget()
+        actions = Rules.getLegalActions(self, gameState.data)
+        if actions == []:
+            return None
+        
+        root = self.memory["root"]
+        numMoves, position = gameState.getNumMoves(), self.agentState.getPosition()
+        if root is None or root.numMoves != numMoves or root.position != position:
+            root = MCTSNode(numMoves, position)
+        stats = self.memory["stats"]
+        stats["reusedVisits"] += root.visits
+        
+        numWorkers = self.config.getMCTSWorkers()
+        workers = _getMCTSPool(numWorkers)
+        if workers is not None:
+            agentStates = [gameState.data.getAgentState(i) for i in range(gameState.numberOfCops() + 1)]
+            settings = gameState.data.config.settings
+            layoutFileName = gameState.data.layout.fileName # the layout of the game, whatever the settings
+            seed = random.randint(0, 2**31)
+            pending = workers.map_async(_mctsWorker, [(agentStates, settings, layoutFileName, budget, seed + i)
+                                                      for i in range(numWorkers - 1)])
+        
+        simulations = runMCTS(gameState.deepCopy(), root, startTime + budget)
+        
+        visits = {}
+        for action, child in root.children.items():
+            visits[action] = child.visits
+        if workers is not None:
+            for workerVisits, workerSimulations in pending.get():
+                simulations += workerSimulations
+                for action, count in workerVisits.items():
+                    visits[action] = visits.get(action, 0) + count
+        
+        action = max(actions, key=lambda a: visits.get(a, 0))
+        self.memory["root"] = root.getChild(action) # tree reuse
+        
+        stats["moves"] += 1
+        stats["simulations"] += simulations
+        stats["time"] += time.time() - startTime
+        stats["simulationsPerSecond"] = stats["simulations"] / max(stats["time"], 1e-9)
+        stats["workers"] = numWorkers if workers is not None else 1
+        return action
+
+
+def runMCTS(state, root, deadline):
+    """
+    Runs MCTS simulations from state (Mr.X to move), updating the tree of root, until the deadline.
+    The state is modified during the simulations and restored at the end of each one.
+    Returns the number of simulations.
+    """
+    simulations = 0
+    while simulations == 0 or time.time() < deadline:
+        applied = [0] # number of actions applied on the state
+        def apply(agentIndex, action):
+            state.applyAction(agentIndex, action, trusted=True)
+            applied[0] += 1
+        
+        node, path = root, [root]
+        while True:
+            result = _mctsMrXTurn(state)
+            if result is not None:
+                break
+            actions = Rules.getLegalActions(state.data.getAgent(0), state.data)
+            action = node.select(actions, MCTSMrX.EXPLORATION)
+            expanded = node.getChild(action).visits == 0
+            node = node.getChild(action)
+            path.append(node)
+            apply(0, action)
+            result = _mctsCopsTurn(state, apply)
+            if result is not None:
+                break
+            if expanded:
+                result = _mctsRollout(state, apply)
+                break
+        
+        for n in path:
+            n.visits += 1
+            n.value += result
+        for _ in range(applied[0]):
+            state.undoAction()
+        simulations += 1
+    return simulations
+
+
+def _mctsMrXTurn(state):
+    """
+    Returns the result of the game if it is over at Mr.X turn (1 Mr.X wins, 0 the cops win), None otherwise.
+    """
+    data = state.data
+    if data.getNumMoves() >= data.config.getMaxNumMoves():
+        return 1.0
+    if Rules.getLegalActions(data.getAgent(0), data) == []:
+        return 0.0
+    return None
+
+
+def _mctsCopsTurn(state, apply):
+    """
+    Plays a sampled response of all the cops, returns the result of the game if it is over, None otherwise.
+    """
+    data = state.data
+    mrx = data.getAgent(0)
+    revealed = mrx.notHiddenMoves[max(mrx.notHiddenMoves)] if mrx.notHiddenMoves else None
+    mrxPosition = mrx.getAgentState().getPosition()
+    
+    moved = False
+    for i in range(data.numberOfCops()):
+        if data.getAgentState(i + 1).getPosition() == mrxPosition:
+            return 0.0
+        actions = Rules.getLegalActions(data.getAgent(i + 1), data)
+        if actions == []:
+            continue
+        moved = True
+        if revealed is None or random.random() < MCTSMrX.RANDOM_COP_MOVE:
+            action = random.choice(actions)
+        else:
+            distances = distancesFrom(revealed, data.layout)
+            action = min(actions, key=lambda a: (distances[a.getEnd()], random.random()))
+        apply(i + 1, action)
+    
+    if mrxPosition in [data.getAgentState(i + 1).getPosition() for i in range(data.numberOfCops())]:
+        return 0.0
+    if not moved:
+        return 1.0 # the cops can not move
+    return None
+
+
+def _mctsRollout(state, apply):
+    """
+    Plays the game until its end: Mr.X moves at random avoiding the nodes next to a cop (if possible).
+    Returns the result (1 Mr.X wins, 0 the cops win).
+    """
+    data = state.data
+    layout = data.layout
+    while True:
+        result = _mctsMrXTurn(state)
+        if result is not None:
+            return result
+        actions = Rules.getLegalActions(data.getAgent(0), data)
+        dangerous = set()
+        for i in range(data.numberOfCops()):
+            dangerous.update(layout.getNeighbours(data.getAgentState(i + 1).getPosition()))
+        safe = [a for a in actions if a.getEnd() not in dangerous]
+        apply(0, random.choice(safe if safe else actions))
+        result = _mctsCopsTurn(state, apply)
+        if result is not None:
+            return result
+
+
+_mctsPool = [None, 0] # the pool of worker processes of MCTSMrX and its size
+
+def _getMCTSPool(workers):
+    """
+    Returns a pool of (workers - 1) processes (the main process is a worker too), None if workers <= 1
+    or if the current process can not have children (es: it is a worker of a batch).
+    """
+    import multiprocessing
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        return None
+    if _mctsPool[1] != workers - 1:
+        if _mctsPool[0] is not None:
+            _mctsPool[0].terminate()
+        _mctsPool[0], _mctsPool[1] = multiprocessing.Pool(workers - 1), workers - 1
+    return _mctsPool[0]
+
+
+def _mctsWorker(args):
+    """
+    Runs MCTS in a worker process on a new tree, returns the visits of the moves from the root
+    and the number of simulations.
+    """
+    agentStates, settings, layoutFileName, budget, seed = args
+    deadline = time.time() + budget
+    random.seed(seed)
+    # the state is rebuilt on the layout of the worker (the agent states and the settings are small to send)
+    from game import GameState, GameStateData
+    from settings import GameConfig
+    config = GameConfig(settings, layout=GameConfig.loadLayout(layoutFileName))
+    agents_list = [MrX(agentStates[0], config)] + [Cop(i + 1, agentStates[i + 1], config)
+                                                   for i in range(len(agentStates) - 1)]
+    state = GameState(GameStateData(config.getLayout(), agents_list, config))
+    root = MCTSNode(state.getNumMoves(), agentStates[0].getPosition())
+    simulations = runMCTS(state, root, deadline)
+    return dict([(action, child.visits) for action, child in root.children.items()]), simulations
+
+
+class RandomAgent(Agent):
+    """
+    Defines a self-controlled agent which chooses uniformly at random among its legal actions.
+    """
+    
+    def getAction(self, gameState, display):
+        """
+        Given a certain gameState (GameState), returns a random legal action (Action), None if there is none.
+        """
+        possActions = Rules.getLegalActions(self, gameState.data)
+        if possActions == []:
+            return None
+        import random
+        return random.choice(possActions)
+
+
+class RandomMrX(RandomAgent, MrX):
+    """
+    A Mr.X agent which moves at random.
+    """
+    def __init__(self, agentState = None, config = None):
+        MrX.__init__(self, agentState, config)
+        self.type = "RandomMrX"
+    
+    def deepCopy(self):
+        """
+        Returns a deep copy of itself.
+        """
+        return RandomMrX(self.agentState.deepCopy(), self.config)
+    
+    def __repr__(self):
+        return MrX.__repr__(self)
+    
+    def performAction(self, action):
+        MrX.performAction(self, action)
+    
+    def undoAction(self, action):
+        MrX.undoAction(self, action)
+
+
+class RandomCop(RandomAgent, Cop):
+    """
+    A Cop agent which moves at random.
+    """
+    def __init__(self, index, agentState = None, config = None):
+        Cop.__init__(self, index, agentState, config)
+        self.type = "RandomCop"
+    
+    def deepCopy(self):
+        """
+        Returns a deep copy of itself.
+        """
+        return RandomCop(self.index, self.agentState.deepCopy(), self.config)
 
 
 class SmartKeyboardCop(Cop, KeyboardAgent):
     """
     A smart cop has a strong ability to guess Mr.X position.
     """
-    def __init__(self, index, agentState=None, inference = None):
-        Cop.__init__(self, index, agentState)
+    def __init__(self, index, agentState=None, beliefService = None, config = None):
+        Cop.__init__(self, index, agentState, config)
         self.type = "SmartCop"
-        if inference is None:
-            self.inference = ExactInference()
-        else:
-            self.inference = inference
+        self.beliefService = beliefService
     
     def deepCopy(self):
-        return SmartKeyboardCop(self.index, self.agentState.deepCopy(), self.inference)
+        return SmartKeyboardCop(self.index, self.agentState.deepCopy(), self.beliefService, self.config)
     
     def getAction(self, gameState, display):
         """
         Ask the user for an action after having displayed the beliefs distribution.
         """
-        ticketList, notHiddenMoves = gameState.getMrXEvidences()
-        self.inference.updateBeliefs(ticketList, notHiddenMoves, gameState.deepCopy())
-        beliefsDistribution = self.inference.getBeliefsDistribution()  # util.Counter
-        
-        mostLikelyPositions = beliefsDistribution.argMax()  # the list of most likely positions
+        gameState.getMrXEvidences() # log the evidences
+        beliefsDistribution = self.getBeliefService().getBeliefs(gameState)  # util.Counter or util.Distribution
         
         ##### TO CHANGE (WHEN IMPLEMENTED THE GUI DISPLAYER OF BELIEFS DISTRIBUTION)
-        print beliefsDistribution
-        print mostLikelyPositions
+        log.info("%s", beliefsDistribution)
+        log.info("%s", gamelog.Lazy(beliefsDistribution.argMax))  # the list of most likely positions
         #####
         return KeyboardAgent.getAction(self, gameState, display)
 
@@ -0,0 +1,222 @@
+'''
+Headless batch simulation of bot-vs-bot games.
+
+The games are played without any display and sharded across a pool of worker processes,
+every game has its own seed so that any result can be reproduced.
+Only self-controlled agents (es: RandomMrX, RandomCop) can be used.
+
+Command line usage:
+python batch.py -n 1000 --mrx Random --cops Random --seed 0 -o results.jsonl
+'''
+
+import random
+import time
+
+import agents
+from agents import AgentRole
+from game import GameState, GameStateData
+import gamelog
+import profiling
+from inference import BeliefService
+from settings import getConfig
+
+log = gamelog.getLogger("batch")
+
+
+def getAgentClass(agentType, suffix):
+    """
+    Returns the class of an agent: agentType is a type of agents.py (es: "Random", with suffix "MrX"
+    it is agents.RandomMrX) or the full name of a class of another module, a plugin (es: "myagents.SmartMrX").
+    The agents are created with the keyword argument config (see createAgents), as the ones of agents.py.
+    """
+    if "." in agentType:
+        moduleName, className = agentType.rsplit(".", 1)
+        return getattr(__import__(moduleName, fromlist=[className]), className)
+    return (agents.__dict__)[agentType + suffix]
+
+
+def createAgents(mrxType=None, copsType=None, config=None):
+    """
+    Creates a list of agents of the game configuration config (GameConfig in settings.py, by default
+    the Settings), the types of instances are the ones in config if they are not specified
+    (see getAgentClass). It creates the agents of the interactive games too (see scotlandYard.py).
+    """
+    config = getConfig(config)
+    if mrxType is None:
+        mrxType = config.getMrXType()
+    if copsType is None:
+        copsType = config.getCopsType()
+    mrx = getAgentClass(mrxType, "MrX")(config=config)
+    cops = [getAgentClass(copsType, "Cop")(i + 1, config=config)
+            for i in range(config.getNumberOfCops())]
+    return [mrx] + cops
+
+
+def checkSelfControlled(mrxType=None, copsType=None, config=None):
+    """
+    Raises ValueError if the agents of the types (see createAgents) are not self-controlled:
+    the Keyboard agents ask the display for their moves, they can not play headless games.
+    """
+    config = getConfig(config)
+    if mrxType is None:
+        mrxType = config.getMrXType()
+    if copsType is None:
+        copsType = config.getCopsType()
+    for agentType, suffix in ((mrxType, "MrX"), (copsType, "Cop")):
+        if issubclass(getAgentClass(agentType, suffix), agents.KeyboardAgent):
+            raise ValueError("%s%s is not self-controlled (it asks the display for its moves): "
+                             "choose another type (es: --mrx Random --cops Random)" % (agentType, suffix))
+
+
+def makeSpecs(numGames, mrxType=None, copsType=None, seed=0, profile=False):
+    """
+    Returns the list of the specifications of numGames games, the game i is played with the seed (seed + i).
+    A specification is a dictionary with the keys: "game", "seed", "mrx", "cops", "profile",
+    and optionally "settings": the settings of the game which differ from the Settings (see GameConfig.derive).
+    """
+    return [{"game": i, "seed": seed + i, "mrx": mrxType, "cops": copsType, "profile": profile}
+            for i in range(numGames)]
+
+
+def _seed(seed):
+    random.seed(seed)
+    try:
+        import numpy
+        numpy.random.seed(seed % 2**32)
+    except ImportError:
+        pass
+
+
+def playGame(spec, config=None):
+    """
+    Plays a whole game without display, given its specification (see makeSpecs), the settings of the
+    specification change the ones of config (GameConfig in settings.py, by default the Settings).
+    Returns a dictionary with the result of the game:
+    - the keys of the specification
+    - "winner" : the winner (AgentRole)
+    - "reason" : why the game is over (EndReason in game.py)
+    - "message" : the description of the end of the game (see GameState.isEndState)
+    - "numMoves" : the number of moves of Mr.X
+    - "plies" : the number of turns (of every agent, skipped turns included)
+    - "agentTime" : the seconds spent by every agent (index 0 is Mr.X) in getAction
+    - "agentStats" : the statistics of every agent which reports them (es: SearchCop), None for the others
+    - "wallTime" : the duration of the whole game in seconds
+    - "profile" : the profile of the game (see Profiler.getSummary), only if spec["profile"] is True
+    The game has a configuration of its own (see GameConfig.derive): the Settings are never changed,
+    so a process can play games with different settings, all of them on the same (shared) layouts.
+    Raises ValueError if the agents are not self-controlled (see checkSelfControlled).
+    """
+    _seed(spec["seed"])
+    # the random initial positions are drawn by the new configuration
+    config = getConfig(config).derive(spec.get("settings"))
+    checkSelfControlled(spec.get("mrx"), spec.get("cops"), config)
+    profiler = profiling.enable() if spec.get("profile") else None
+    startTime = time.time()
+    
+    agents_list = createAgents(spec.get("mrx"), spec.get("cops"), config)
+    beliefService = BeliefService(config=config)
+    for cop in agents_list[1:]:
+        cop.setBeliefService(beliefService)
+    gameState = GameState(GameStateData(config.getLayout(), agents_list, config))
+    agentTime = [0.0] * len(agents_list)
+    getActions = [agent.getAction for agent in agents_list]
+    if profiler is not None:  # time the thinking of every agent
+        getActions = [profiler.wrap(getAction, "getAction", i) for i, getAction in enumerate(getActions)]
+    
+    counter = 0
+    plies = 0
+    turn = AgentRole.Mr_X
+    while not gameState.isEndState(turn)[0]:
+        thinkStart = time.time()
+        new_action = getActions[counter](gameState, None)
+        agentTime[counter] += time.time() - thinkStart
+        
+        if not new_action is None:  # if there is a possible action, do it (in place, as Game.run)
+            gameState.applyAction(counter, new_action)
+        
+        plies += 1
+        counter = (counter + 1) % len(agents_list)
+        turn = AgentRole.Mr_X if counter == 0 else AgentRole.COP
+    
+    _, winner, message = gameState.isEndState(turn)
+    result = dict(spec)
+    result.update({"winner": winner,
+                   "reason": gameState.getEndReason(turn),
+                   "message": message.strip(),
+                   "numMoves": gameState.getNumMoves(),
+                   "plies": plies,
+                   "agentTime": agentTime,
+                   "agentStats": [a.getStats() if hasattr(a, "getStats") else None for a in agents_list],
+                   "wallTime": time.time() - startTime})
+    if profiler is not None:
+        profiler.record("game", result["wallTime"])
+        result["profile"] = profiling.disable().getSummary()
+    log.info("game %d: %s wins in %d moves", spec["game"], winner, result["numMoves"],
+             extra={"data": {"game": spec["game"], "seed": spec["seed"], "reason": result["reason"]}})
+    gamelog.flush()  # the worker processes may exit without closing the handlers
+    return result
+
+
+def runBatch(specs, processes=None, chunksize=1):
+    """
+    Plays the games of the specifications in a pool of processes (processes=None means one for every CPU).
+    It is a generator: the results (see playGame) are yielded as soon as the games finish,
+    thus NOT in the order of specs.
+    With processes=1 the games are played in the current process.
+    """
+    if processes == 1:
+        for spec in specs:
+            yield playGame(spec)
+        return
+    
+    import multiprocessing
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(playGame, specs, chunksize):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def main(argv=None):
+    import argparse
+    import json
+    import sys
+    
+    parser = argparse.ArgumentParser(description="Plays headless bot-vs-bot games, writes a JSON line per game.")
+    parser.add_argument("-n", "--games", type=int, default=100, help="number of games")
+    parser.add_argument("--mrx", default=None, help="Mr.X type (default: MrX_TYPE in the settings)")
+    parser.add_argument("--cops", default=None, help="cops type (default: COPS_TYPE in the settings)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("-o", "--output", default=None, help="output file (default: stdout)")
+    parser.add_argument("--log-level", default="WARNING", help="level of the messages printed on stderr")
+    parser.add_argument("--log-file", default=None, help="file the messages are appended to as JSON lines")
+    parser.add_argument("--profile", action="store_true", help="add the profile of every game to its result")
+    args = parser.parse_args(argv)
+    try:
+        checkSelfControlled(args.mrx, args.cops)
+    except ValueError, message:
+        parser.error(str(message))
+    gamelog.configure(args.log_level, args.log_file, stream=sys.stderr)
+    
+    out_file = sys.stdout if args.output is None else open(args.output, "w")
+    wins = {AgentRole.Mr_X: 0, AgentRole.COP: 0}
+    startTime = time.time()
+    for result in runBatch(makeSpecs(args.games, args.mrx, args.cops, args.seed, args.profile),
+                           args.processes):
+        out_file.write(json.dumps(result, sort_keys=True) + "\n")
+        wins[result["winner"]] += 1
+    if out_file is not sys.stdout:
+        out_file.close()
+    
+    sys.stderr.write("%d games in %.2f s - Mr.X wins: %d, cops wins: %d\n" %
+                     (args.games, time.time() - startTime, wins[AgentRole.Mr_X], wins[AgentRole.COP]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+'''
+Benchmarks of the hot paths of the game, on the shipped layout and on synthetic boards of growing size
+(from 100 to 100k nodes), to see how they scale.
+
+Every benchmark is run for some rounds, every round calls the measured function until at least
+minTime seconds are spent: the result of a benchmark is the time per call of its best round
+(the least disturbed one) and of the median round.
+The results of every run are appended (a JSON object per line) to a history file, two runs of the history
+can be compared: the benchmarks which got slower by more than a threshold are flagged as regressions.
+
+Command line usage:
+python benchmark.py                              # all the benchmarks, appended to benchmark_history.jsonl
+python benchmark.py --sizes 100,1000 --only game,Rules.getLegalActions --label baseline
+python benchmark.py --compare                    # the last run against the previous one
+python benchmark.py --compare baseline -1 --threshold 0.05
+'''
+
+import os
+import random
+import tempfile
+import time
+
+import batch
+import layoutgen
+from agents import AgentRole
+from game import GameState, GameStateData
+from inference import ExactInference
+from layout import Layout
+from rules import Rules
+from settings import GameConfig
+
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000] # the number of nodes of the synthetic boards
+DEFAULT_HISTORY = "benchmark_history.jsonl"
+
+
+def getBoards(sizes, directory):
+    """
+    Returns the list of the couples (name, layout file name) of the boards: the shipped layout
+    and a synthetic grid (see layoutgen.py) for every size, written in directory.
+    """
+    boards = [("layout.txt", Layout("DEFAULT").fileName)]
+    for size in sizes:
+        fileName = os.path.join(directory, "grid-%d.txt" % size)
+        layoutgen.generate(fileName, "grid", size, seed=0)
+        boards.append(("grid-%d" % size, fileName))
+    return boards
+
+
+def _turn(agentIndex):
+    return AgentRole.Mr_X if agentIndex == 0 else AgentRole.COP
+
+
+class BoardContext:
+    """
+    What the benchmarks of a board need: the layout, a game configuration on it (the Settings but the layout)
+    and some game states of a random game on it.
+    """
+    
+    def __init__(self, fileName, numStates=20, seed=0):
+        random.seed(seed)
+        self.fileName = fileName
+        self.layout = Layout(fileName)
+        self.config = GameConfig(GameConfig.getDefault().settings, layout=self.layout)
+        self.states = []  # (game state, index of the agent to move)
+        self.afterFirstMove = None  # the state after the first move of Mr.X (see ExactInference.updateBeliefs)
+        
+        gameState = GameState(GameStateData(self.layout, batch.createAgents("Random", "Random", self.config),
+                                            self.config))
+        numAgents = gameState.numberOfCops() + 1
+        counter = 0
+        while len(self.states) < numStates and not gameState.isEndState(_turn(counter))[0]:
+            actions = Rules.getLegalActions(gameState.data.getAgent(counter), gameState.data)
+            if actions:
+                self.states.append((gameState, counter))
+                gameState = gameState.generateSuccessor(counter, random.choice(actions))
+                if counter == 0 and self.afterFirstMove is None:
+                    self.afterFirstMove = gameState
+            counter = (counter + 1) % numAgents
+
+
+# the benchmarks: name --> function (BoardContext) returning the measured function and a function
+# returning the list of the arguments of its calls in a round (they are prepared out of the measure)
+
+def _layoutLoad(context):
+    return Layout, lambda: [(context.fileName,)]
+
+
+def _getEdgesFromNode(context):
+    nodes = sorted(context.layout.getNodesStations().keys())
+    nodes = [(node,) for node in random.Random(0).sample(nodes, min(len(nodes), 1000))]
+    return context.layout.getEdgesFromNode, lambda: nodes
+
+
+def _getLegalActions(context):
+    calls = [(state.data.getAgent(i), state.data) for state, _ in context.states
+             for i in range(state.numberOfCops() + 1)]
+    return Rules.getLegalActions, lambda: calls
+
+
+def _generateSuccessor(context):
+    calls = []
+    for state, counter in context.states:
+        actions = Rules.getLegalActions(state.data.getAgent(counter), state.data)
+        calls.append((state, counter, actions[0]))
+    return (lambda state, counter, action: state.generateSuccessor(counter, action)), lambda: calls
+
+
+def _isEndState(context):
+    calls = [(state, turn) for state, _ in context.states for turn in (AgentRole.Mr_X, AgentRole.COP)]
+    return (lambda state, turn: state.isEndState(turn)), lambda: calls
+
+
+def _updateBeliefs(context):
+    gameState = context.afterFirstMove
+    prototype = ExactInference(config=context.config)
+    mrx = gameState.data.agents[0]
+    return ((lambda inference: inference.updateBeliefs(mrx.getTicketHistory(), mrx.notHiddenMoves, gameState)),
+            lambda: [(prototype.deepCopy(),)])
+
+
+def _game(context):
+    def play(seed):
+        return batch.playGame({"game": 0, "seed": seed, "mrx": "Random", "cops": "Random"}, context.config)
+    seeds = iter(xrange(10**9))
+    return play, lambda: [(seeds.next(),)]
+
+
+BENCHMARKS = [("Layout.load", _layoutLoad),
+              ("Layout.getEdgesFromNode", _getEdgesFromNode),
+              ("Rules.getLegalActions", _getLegalActions),
+              ("GameState.generateSuccessor", _generateSuccessor),
+              ("GameState.isEndState", _isEndState),
+              ("ExactInference.updateBeliefs", _updateBeliefs),
+              ("game", _game)]
+
+
+def measure(function, makeCalls, rounds=3, minTime=0.1):
+    """
+    Returns the seconds per call of function in the best and in the median of rounds rounds,
+    and the number of calls; makeCalls returns the list of the arguments of a batch of calls.
+    """
+    perCall = []
+    numCalls = 0
+    for _ in range(rounds):
+        elapsed = 0.0
+        calls = 0
+        while elapsed < minTime:
+            batchCalls = makeCalls()
+            start = time.time()
+            for args in batchCalls:
+                function(*args)
+            elapsed += time.time() - start
+            calls += len(batchCalls)
+        perCall.append(elapsed / calls)
+        numCalls += calls
+    perCall.sort()
+    return perCall[0], perCall[len(perCall) // 2], numCalls
+
+
+def runBenchmarks(sizes=DEFAULT_SIZES, only=None, rounds=3, minTime=0.1, verbose=True):
+    """
+    Runs the benchmarks (only the ones whose name is in only, if it is not None) on every board.
+    Returns the list of the results: dictionaries with the keys "benchmark", "board", "nodes",
+    "best", "median" (seconds per call) and "calls".
+    """
+    import shutil
+    directory = tempfile.mkdtemp(prefix="sybench")
+    results = []
+    try:
+        for board, fileName in getBoards(sizes, directory):
+            context = BoardContext(fileName)
+            for name, setup in BENCHMARKS:
+                if only is not None and name not in only:
+                    continue
+                function, makeCalls = setup(context)
+                best, median, calls = measure(function, makeCalls, rounds, minTime)
+                result = {"benchmark": name, "board": board, "nodes": context.layout.getNumNodes(),
+                          "best": best, "median": median, "calls": calls}
+                results.append(result)
+                if verbose:
+                    print "%-30s %-12s %12.3f us %12.3f us  (%d calls)" % (name, board, best * 1e6, median * 1e6, calls)
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def _commit():
+    """
+    Returns the current git commit (None if it is unknown).
+    """
+    import subprocess
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def appendRun(results, historyFileName=DEFAULT_HISTORY, label=None):
+    """
+    Appends a run (the results, the time, the git commit and the label) to the history file.
+    """
+    import json
+    import platform
+    run = {"time": time.time(), "label": label, "commit": _commit(), "python": platform.python_version(),
+           "results": results}
+    with open(historyFileName, "a") as out_file:
+        out_file.write(json.dumps(run, sort_keys=True) + "\n")
+    return run
+
+
+def loadHistory(historyFileName=DEFAULT_HISTORY):
+    """
+    Returns the list of the runs in the history file, oldest first.
+    """
+    import json
+    with open(historyFileName) as in_file:
+        return [json.loads(line) for line in in_file if line.strip()]
+
+
+def findRun(history, reference):
+    """
+    Returns the run of the history with the given label, or at the given index (es: -1 is the last run).
+    """
+    for run in reversed(history):
+        if run.get("label") == reference:
+            return run
+    try:
+        return history[int(reference)]
+    except (ValueError, IndexError):
+        raise ValueError("No run " + str(reference) + " in the history")
+
+
+def compareRuns(old, new, threshold=0.1):
+    """
+    Compares the best times of the benchmarks in both runs.
+    Returns a list of tuples (benchmark, board, old seconds, new seconds, ratio, verdict), where the verdict is
+    "REGRESSION" if the new time is more than (1 + threshold) times the old one, "improved" if it is less than
+    (1 - threshold) times, "" otherwise.
+    """
+    oldResults = dict([((r["benchmark"], r["board"]), r) for r in old["results"]])
+    comparison = []
+    for result in new["results"]:
+        key = (result["benchmark"], result["board"])
+        if key not in oldResults:
+            continue
+        before, after = oldResults[key]["best"], result["best"]
+        ratio = after / before if before > 0 else float("inf")
+        verdict = ""
+        if ratio > 1 + threshold:
+            verdict = "REGRESSION"
+        elif ratio < 1 - threshold:
+            verdict = "improved"
+        comparison.append((key[0], key[1], before, after, ratio, verdict))
+    return comparison
+
+
+def main(argv=None):
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description="Benchmarks of the game, on the shipped and on synthetic layouts.")
+    parser.add_argument("--sizes", default=",".join([str(s) for s in DEFAULT_SIZES]),
+                        help="nodes of the synthetic boards, separated by commas (empty: none)")
+    parser.add_argument("--only", default=None, help="names of the benchmarks to run, separated by commas")
+    parser.add_argument("--rounds", type=int, default=3, help="rounds of every benchmark")
+    parser.add_argument("--min-time", type=float, default=0.1, help="minimum seconds of a round")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="the history file (JSON lines)")
+    parser.add_argument("--label", default=None, help="label of the run in the history")
+    parser.add_argument("--compare", nargs="*", default=None, metavar="RUN",
+                        help="compare two runs of the history (labels or indexes, default: -2 -1)")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown flagged as a regression")
+    args = parser.parse_args(argv)
+    
+    if args.compare is not None:
+        references = (args.compare + ["-2", "-1"][len(args.compare):])[-2:] # the last run by default
+        history = loadHistory(args.history)
+        old, new = findRun(history, references[0]), findRun(history, references[1])
+        regressions = 0
+        for name, board, before, after, ratio, verdict in compareRuns(old, new, args.threshold):
+            print "%-30s %-12s %12.3f us %12.3f us %7.2fx  %s" % (name, board, before * 1e6, after * 1e6,
+                                                                   ratio, verdict)
+            regressions += verdict == "REGRESSION"
+        print "%d regressions" % regressions
+        sys.exit(1 if regressions else 0)
+    
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    only = None if args.only is None else args.only.split(",")
+    results = runBenchmarks(sizes, only, args.rounds, args.min_time)
+    appendRun(results, args.history, args.label)
+
+
+if __name__ == '__main__':
+    main()
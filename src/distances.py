@@ -0,0 +1,156 @@
+'''
+Precomputed distance tables: the minimum number of moves between every couple of nodes,
+whatever the tickets and with a single type of ticket.
+
+The tables are computed once per layout (a BFS from all the sources at once, with numpy)
+and cached on disk, keyed by the hash of the layout file: the next time they are only loaded
+(memory-mapped, so many processes share them).
+
+NOTE : the tables are (number of nodes)^2, they are meant for boards up to some thousands of nodes
+(see MAX_TABLE_NODES: on bigger boards the agents compute the distances from a node with a BFS).
+Every table is computed (or loaded) the first time it is used.
+
+Usage:
+oracle = DistanceOracle.forLayout(Settings.getLayout())
+oracle.distance(1, 44)                                   # any ticket
+oracle.distance(1, 44, TicketType.BUS)                   # only BUS tickets
+oracle.minDistances(gameState.getCopPosition())          # from the closest cop to every node
+'''
+
+import hashlib
+import os
+
+import numpy as np
+
+from rules import TicketType
+
+
+CACHE_VERSION = 1
+ANY = "ANY" # the table of the moves with any ticket (as the BLACK ticket)
+TABLES = [ANY, TicketType.TAXI, TicketType.BUS, TicketType.UNDERGROUND]
+MAX_TABLE_NODES = 2000 # the biggest board for which the agents use the tables (some seconds to compute one)
+
+
+class DistanceOracle:
+    """
+    All-pairs shortest move counts of a layout, one table for every element of TABLES.
+    A table is a matrix (uint8, or uint16 if some distance does not fit) where table[a, b] is the number
+    of moves from a to b, getUnreachable() if there is no way.
+    """
+    
+    def __init__(self, layout, cacheDirectory=None):
+        """
+        The tables are loaded from the cache (by default the directory .cache next to the layout file)
+        or computed and stored there, when they are used the first time.
+        """
+        self.layout = layout
+        self.size = len(layout.getAdjacency()[0]) - 1 # nodes are indexes in [0, size)
+        if cacheDirectory is None:
+            cacheDirectory = os.path.join(os.path.dirname(os.path.abspath(layout.fileName)), ".cache")
+        self.cacheDirectory = cacheDirectory
+        self.key = _hashFile(layout.fileName)
+        self.tables = {} # element of TABLES --> table, see _table
+    
+    def _loadTable(self, table):
+        fileName = os.path.join(self.cacheDirectory, "distances-%s-%s.npy" % (self.key, table))
+        if os.path.exists(fileName):
+            return np.load(fileName, mmap_mode='r')
+        offsets, ends = self.layout.getAdjacency(None if table == ANY else table)
+        distances = _allPairsDistances(np.frombuffer(offsets, dtype=np.int32), np.frombuffer(ends, dtype=np.int32))
+        try:
+            if not os.path.isdir(self.cacheDirectory):
+                os.makedirs(self.cacheDirectory)
+            temporary = fileName + ".%d.tmp" % os.getpid() # other processes may be writing the same file
+            with open(temporary, "wb") as out_file:
+                np.save(out_file, distances)
+            os.rename(temporary, fileName)
+        except (IOError, OSError):
+            pass # the cache is optional
+        return distances
+    
+    def _table(self, ticket):
+        if ticket is None or ticket == TicketType.BLACK:
+            ticket = ANY
+        if ticket not in self.tables:
+            self.tables[ticket] = self._loadTable(ticket)
+        return self.tables[ticket]
+    
+    def getUnreachable(self, ticket=None):
+        """
+        Returns the value of the distance between two nodes not connected (with the ticket).
+        """
+        return np.iinfo(self._table(ticket).dtype).max
+    
+    def distance(self, start, end, ticket=None):
+        """
+        Returns the minimum number of moves from start to end using only the given TicketType
+        (any ticket if ticket is None or BLACK).
+        """
+        return int(self._table(ticket)[start, end])
+    
+    def distancesFrom(self, sources, ticket=None):
+        """
+        Returns the matrix of the distances from every node of sources (a list) to every node:
+        result[i, n] is the distance from sources[i] to n.
+        """
+        return self._table(ticket)[np.asarray(sources, dtype=np.int64)]
+    
+    def minDistances(self, sources, ticket=None):
+        """
+        Returns the array of the distances from the closest node of sources to every node
+        (es: how far is the closest cop).
+        """
+        return self.distancesFrom(sources, ticket).min(axis=0)
+    
+    def forLayout(layout):
+        """
+        Returns the oracle of the layout, it is built once for every layout (see Layout.getShared).
+        """
+        return layout.getShared(DistanceOracle)
+    forLayout = staticmethod(forLayout)
+
+
+def _hashFile(fileName):
+    digest = hashlib.sha1("v%d" % CACHE_VERSION)
+    in_file = open(fileName, "rb")
+    for chunk in iter(lambda: in_file.read(1 << 20), ""):
+        digest.update(chunk)
+    in_file.close()
+    return digest.hexdigest()
+
+
+def _allPairsDistances(offsets, ends, batchCells=1 << 25):
+    """
+    BFS from every node at the same time (in batches of sources) over the CSR adjacency (offsets, ends).
+    A level of the BFS is vectorized: a node is reached if any of its neighbours is in the frontier.
+    """
+    size = len(offsets) - 1
+    degree = np.diff(offsets)
+    withEdges = np.flatnonzero(degree)
+    unreachable = np.iinfo(np.uint16).max
+    result = np.empty((size, size), dtype=np.uint16)
+    
+    batch = max(1, batchCells // max(len(ends), 1))
+    for first in range(0, size, batch):
+        sources = np.arange(first, min(first + batch, size))
+        distances = np.full((len(sources), size), unreachable, dtype=np.uint16)
+        frontier = np.zeros((len(sources), size), dtype=bool)
+        frontier[np.arange(len(sources)), sources] = True
+        reached = frontier.copy()
+        level = 0
+        while frontier.any():
+            distances[frontier] = level
+            level += 1
+            following = np.zeros_like(frontier)
+            if len(withEdges) > 0:
+                following[:, withEdges] = np.logical_or.reduceat(frontier[:, ends], offsets[withEdges], axis=1)
+            frontier = following & ~reached
+            reached |= frontier
+        result[first:first + len(sources)] = distances
+    
+    finite = result[result != unreachable]
+    if len(finite) == 0 or finite.max() < np.iinfo(np.uint8).max:
+        small = result.astype(np.uint8)
+        small[result == unreachable] = np.iinfo(np.uint8).max
+        return small
+    return result
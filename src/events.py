@@ -0,0 +1,95 @@
+'''
+The events of a game: GameState publishes them on its EventBus (if it has one, see GameState.setEventBus)
+as the game goes on, so that displays, loggers, recorders and metrics only process what changed
+in every turn instead of the whole state.
+
+Usage:
+bus = EventBus()
+gameState.setEventBus(bus)
+bus.subscribe(lambda event: counter.update([event.ticket]), [EventType.TICKET_SPENT])
+'''
+
+
+class EventType:
+    """
+    Enumeration representing the possible types of Event, with the fields of the events of each type.
+    """
+    MOVE_APPLIED = "MOVE_APPLIED"    # agentIndex, action, numMoves (of Mr.X, after the move)
+    MOVE_UNDONE = "MOVE_UNDONE"      # agentIndex, action, numMoves (of Mr.X, after the undo)
+    TICKET_SPENT = "TICKET_SPENT"    # agentIndex, ticket, remaining (tickets of that type)
+    MrX_REVEALED = "MrX_REVEALED"    # numMoves, position
+    TURN_SKIPPED = "TURN_SKIPPED"    # agentIndex, position (the agent has no legal action)
+    GAME_OVER = "GAME_OVER"          # winner (AgentRole), reason (EndReason), message
+    
+    def asList():
+        """
+        Return all the possible types of event.
+        """
+        return [EventType.MOVE_APPLIED, EventType.MOVE_UNDONE, EventType.TICKET_SPENT,
+                EventType.MrX_REVEALED, EventType.TURN_SKIPPED, EventType.GAME_OVER]
+    asList = staticmethod(asList)
+
+
+class Event:
+    """
+    Something which happened in the game: the type (EventType) and the fields of the type as attributes
+    (es: event.agentIndex, event.action).
+    """
+    
+    def __init__(self, eventType, **fields):
+        self.type = eventType
+        self.__dict__.update(fields)
+    
+    def asDict(self):
+        """
+        Returns the event as a dictionary (es: to be serialized), the action is a string.
+        """
+        result = dict(self.__dict__)
+        if "action" in result:
+            result["action"] = str(result["action"])
+        return result
+    
+    def __repr__(self):
+        fields = ", ".join(["%s=%s" % (key, value) for key, value in sorted(self.__dict__.items()) if key != "type"])
+        return "%s(%s)" % (self.type, fields)
+
+
+class EventBus:
+    """
+    Delivers the events to the subscribers, in the order of subscription.
+    A subscriber is a function which takes an Event, it is called synchronously by publish.
+    """
+    
+    def __init__(self):
+        self.subscribers = dict([(eventType, []) for eventType in EventType.asList()])
+    
+    def subscribe(self, subscriber, eventTypes=None):
+        """
+        Registers the subscriber for the given types of event (all of them if eventTypes is None).
+        """
+        if eventTypes is None:
+            eventTypes = EventType.asList()
+        for eventType in eventTypes:
+            self.subscribers[eventType].append(subscriber)
+    
+    def unsubscribe(self, subscriber):
+        for subscribers in self.subscribers.values():
+            while subscriber in subscribers:
+                subscribers.remove(subscriber)
+    
+    def hasSubscribers(self, eventType):
+        """
+        Returns True if someone is interested in the type of event: the publishers can skip building the events
+        nobody listens to.
+        """
+        return self.subscribers[eventType] != []
+    
+    def publish(self, eventType, **fields):
+        """
+        Builds the event and delivers it to the subscribers of its type (nothing is built if there is none).
+        """
+        subscribers = self.subscribers[eventType]
+        if subscribers:
+            event = Event(eventType, **fields)
+            for subscriber in subscribers[:]:
+                subscriber(event)
@@ -5,9 +5,23 @@ Created on 07/set/2016
 '''
 
 from agents import AgentRole
-from rules import Rules
-from settings import Settings
+from events import EventType
+import gamelog
+from hashing import ZOBRIST
+from rules import Rules, MoveTable
+from settings import Settings, getConfig
 
+log = gamelog.getLogger("game")
+
+
+class EndReason:
+    """
+    Enumeration representing the possible reasons of the end of a game.
+    """
+    CAUGHT = "CAUGHT"            # a cop is in the same position of Mr.X
+    MAX_MOVES = "MAX_MOVES"      # the maximum number of moves has been reached
+    MrX_STUCK = "MrX_STUCK"      # Mr.X can not move
+    COPS_STUCK = "COPS_STUCK"    # no cop can move
 
 
 class GameStateData:
@@ -16,14 +30,24 @@ class GameStateData:
     It will be passed to the graphic object to initialize/update the GUI.
     """
     
-    def __init__(self, layout, agents):
+    def __init__(self, layout, agents, config=None):
         """
         Initialize the data of a game state: layout (see Layout.py), a list of agent (Agent in agents.py)
         Mr. X in the agent at index 0. The remainder are the cops.
+        config is the configuration of the game (GameConfig in settings.py), the default one if it is None.
         """
         assert len(agents)>=2, "Too few agents!"
         self.layout = layout
+        self.config = getConfig(config)
         self.agents = agents
+        self._undoStack = [] # list of tuples --> (agentIndex, action, previous hash, previous flags), see applyAction
+        self._hash = ZOBRIST.hashAgents(agents)
+        
+        # end of game flags, kept up to date by applyAction, undoAction and placeAgent
+        self._copPositions = [a.getAgentState().getPosition() for a in agents[1:]]
+        self._copSet = frozenset(self._copPositions) # the nodes occupied by a cop
+        self._caughtBy = self._findCaughtBy()
+        self._canMove = [None] * len(agents) # "has a legal action" of every agent, None if it must be computed
     
     def getNumMoves(self):
         """
@@ -52,16 +76,158 @@ class GameStateData:
         """
         return len(self.agents) - 1
     
+    def getCopPositions(self):
+        """
+        Returns the list of the positions of the cops (the cop at index i is at position i-1).
+        The list is updated in place by applyAction: it must NOT be modified.
+        """
+        return self._copPositions
+    
+    def getCopSet(self):
+        """
+        Returns the set (frozenset) of the nodes occupied by a cop.
+        """
+        return self._copSet
+    
+    def getFreeMoves(self, agentIndex):
+        """
+        Returns the set of the nodes where the agent at index agentIndex can move with its tickets,
+        without the ones occupied by a cop (es: the free neighbours of Mr.X).
+        """
+        agentState = self.getAgentState(agentIndex)
+        ends = MoveTable.forLayout(self.layout).getMoveEnds(agentState.getPosition(),
+                                                            agentState.getTicketsAsDict())
+        return ends - self._copSet
+    
+    def getCopFrontier(self):
+        """
+        Returns the set of the nodes which can be reached in one move by at least one cop.
+        """
+        frontier = set()
+        for i in range(self.numberOfCops()):
+            frontier |= self.getFreeMoves(i + 1)
+        return frontier
+    
+    def getCaughtBy(self):
+        """
+        Returns the index of the (first) cop in the same position of Mr.X, None if Mr.X has not been caught.
+        """
+        return self._caughtBy
+    
+    def hasLegalAction(self, agentIndex):
+        """
+        Returns True if the agent at index agentIndex has at least one legal action (see Rules.hasLegalAction).
+        The answer is cached until a move which can change it: a move of the agent itself or
+        a move of a cop from or to a neighbour of the agent.
+        """
+        canMove = self._canMove[agentIndex]
+        if canMove is None:
+            canMove = Rules.hasLegalAction(self.agents[agentIndex], self)
+            self._canMove[agentIndex] = canMove
+        return canMove
+    
+    def _findCaughtBy(self):
+        mrXposition = self.agents[0].getAgentState().getPosition()
+        if mrXposition in self._copSet:
+            return self._copPositions.index(mrXposition) + 1
+        return None
+    
+    def _moved(self, agentIndex, start, end):
+        """
+        Updates the end of game flags after the agent at index agentIndex moved from start to end.
+        """
+        canMove = self._canMove
+        canMove[agentIndex] = None
+        if agentIndex > 0:
+            self._copPositions[agentIndex - 1] = end
+            self._copSet = frozenset(self._copPositions)
+            # the cop freed start and occupied end: only the agents next to them are affected
+            for i, agent in enumerate(self.agents):
+                if canMove[i] is not None:
+                    neighbours = self.layout.getNeighbours(agent.getAgentState().getPosition())
+                    if start in neighbours or end in neighbours:
+                        canMove[i] = None
+        self._caughtBy = self._findCaughtBy()
+    
+    def applyAction(self, agentIndex, action, trusted=False):
+        """
+        Performs the action of the agent at index agentIndex IN PLACE and pushes it on the undo stack.
+        The action is checked with Rules.isLegalAction unless trusted is True: use it only for the
+        actions returned by Rules.getLegalActions for the current state.
+        """
+        agent = self.getAgent(agentIndex)
+        if not trusted and not Rules.isLegalAction(agent, action, self):
+            raise Exception("Illegal action! " + str(action))
+        
+        agentState = agent.getAgentState()
+        ticket = action.getTicketType()
+        count = agentState.getTicketsAsDict()[ticket]
+        previousHash = self._hash
+        
+        agent.performAction(action)
+        self._undoStack.append((agentIndex, action, previousHash, self._caughtBy, self._canMove[:], self._copSet))
+        self._moved(agentIndex, action.getStart(), action.getEnd())
+        
+        # update the hash of the features changed by the action
+        h = previousHash ^ ZOBRIST.position(agentIndex, action.getStart()) \
+                         ^ ZOBRIST.position(agentIndex, action.getEnd()) \
+                         ^ ZOBRIST.tickets(agentIndex, ticket, count) \
+                         ^ ZOBRIST.tickets(agentIndex, ticket, count - 1)
+        if agentIndex == 0:
+            numMoves = len(agentState.getMovesHistory())
+            h ^= ZOBRIST.moveNumber(numMoves - 1) ^ ZOBRIST.moveNumber(numMoves)
+            if (numMoves - 1 in agent.notHiddenMoves) != (numMoves in agent.notHiddenMoves):
+                h ^= ZOBRIST.revealed()
+        self._hash = h
+    
+    def undoAction(self):
+        """
+        Undoes the last action applied with applyAction: position, tickets and revealed moves of the agent
+        are restored exactly.
+        Returns the tuple (agentIndex, action) of the undone action.
+        """
+        agentIndex, action, self._hash, self._caughtBy, self._canMove, self._copSet = self._undoStack.pop()
+        self.getAgent(agentIndex).undoAction(action)
+        if agentIndex > 0:
+            self._copPositions[agentIndex - 1] = action.getStart()
+        return agentIndex, action
+    
+    def placeAgent(self, agentIndex, position):
+        """
+        Moves the agent to position WITHOUT an action: nothing is recorded in the moves history nor
+        in the undo stack. It is meant for the search agents, to fix the hidden position of Mr.X in
+        their own copy of the state.
+        """
+        agentState = self.getAgentState(agentIndex)
+        self._hash ^= ZOBRIST.position(agentIndex, agentState.getPosition()) ^ ZOBRIST.position(agentIndex, position)
+        start = agentState.getPosition()
+        agentState.position = position
+        self._moved(agentIndex, start, position)
+    
+    def getHash(self):
+        """
+        Returns the Zobrist hash of the state (see hashing.py): positions, tickets, number of moves of Mr.X
+        and whether he is revealed.
+        It is updated incrementally by applyAction and undoAction: the agents must NOT be modified directly.
+        """
+        return self._hash
+    
     def deepCopy(self):
         """
         Returns a copy of the Game State Data.
         """
         agents_copy = [a.deepCopy() for a in self.agents]
-        return GameStateData(self.layout, agents_copy)
+        data = GameStateData(self.layout, agents_copy, self.config)
+        data._undoStack = self._undoStack[:]
+        data._canMove = self._canMove[:]
+        return data
     
     def __eq__(self, other):
         return self.agents==other.agents and self.layout==other.layout
     
+    def __hash__(self):
+        return self._hash
+    
     def __str__(self):
         return "\n\n".join([a.__repr__() for a in self.agents])
 
@@ -75,6 +241,17 @@ class GameState:
         Initializes the game state with the supplied instance of GameStateData.
         """
         self.data = data
+        self.eventBus = None
+    
+    def setEventBus(self, eventBus):
+        """
+        The state publishes the events of the game (see events.py) on eventBus, None to stop.
+        NOTE : the copies of the state (deepCopy, generateSuccessor) do NOT publish any event.
+        """
+        self.eventBus = eventBus
+    
+    def getEventBus(self):
+        return self.eventBus
     
     def getNumMoves(self):
         """
@@ -102,7 +279,7 @@ class GameState:
         if copIndex is not None:
             return self.data.getAgentState(copIndex).getPosition()
         else:
-            return [self.getCopPosition(i+1) for i in range(self.numberOfCops())]
+            return self.data.getCopPositions()[:]
     
     def getCopState(self, copIndex):
         """
@@ -117,6 +294,26 @@ class GameState:
         """
         return self.data.numberOfCops()
 
+    def getCopSet(self):
+        """
+        Returns the set of the nodes occupied by a cop (see GameStateData.getCopSet).
+        """
+        return self.data.getCopSet()
+    
+    def getFreeMoves(self, agentIndex):
+        """
+        Returns the set of the free nodes where the agent can move (see GameStateData.getFreeMoves).
+        AgentIndex is an integer in the interval [0, numberOfCops]. Index 0 is Mr. X.
+        """
+        return self.data.getFreeMoves(agentIndex)
+    
+    def getCopFrontier(self):
+        """
+        Returns the set of the nodes which can be reached in one move by the cops
+        (see GameStateData.getCopFrontier).
+        """
+        return self.data.getCopFrontier()
+    
     def getLegalCopActions(self, copIndex):
         """
         Returns the list of the legal actions of the cop at the specified index.
@@ -124,16 +321,17 @@ class GameState:
         """
         return Rules.getLegalActions(self.data.getAgent(copIndex), self.data)
      
-    def getMrXEvidences(self):
+    def getMrXEvidences(self, verbose=True):
         """
         Returns the evidences collected up to this point and the positions where Mr.X was seen.
+        If verbose is True the state and the evidences are logged (INFO level).
         """
         not_hidden_moves = self.data.agents[0].notHiddenMoves
-        moves_history = self.data.agents[0].getAgentState().getMovesHistory()
-        ticket_history = [action.getTicketType() for action in moves_history]
-        print "\n\n" + "="*30
-        print self
-        print "\n" + str(not_hidden_moves) + "\n" + "="*30
+        ticket_history = self.data.agents[0].getTicketHistory()
+        if verbose and log.isEnabledFor(gamelog.INFO):  # nothing is formatted if INFO is disabled
+            log.info("\n\n%s\n%s\n\n%s\n%s", "="*30, self, not_hidden_moves, "="*30,
+                     extra={"data": {"numMoves": self.getNumMoves(), "notHiddenMoves": dict(not_hidden_moves),
+                                     "tickets": list(ticket_history)}})
         return ticket_history, not_hidden_moves 
           
     
@@ -147,13 +345,61 @@ class GameState:
         assert not self.isEndState(turn)[0] # check the first boolean element of the tuple
         
         new_state = self.deepCopy()
-        agent = new_state.data.getAgent(agentIndex)
-        if not Rules.isLegalAction(agent, action, self.data):
-            raise Exception("Illegal action!" + action.__str__())
-        
-        agent.performAction(action)
+        new_state.applyAction(agentIndex, action)
         return new_state
     
+    def applyAction(self, agentIndex, action, trusted=False):
+        """
+        Like generateSuccessor, but the action is performed IN PLACE (without copying the state)
+        and it can be undone with undoAction.
+        trusted=True skips the legality check: use it only for the actions returned by Rules.getLegalActions.
+        """
+        self.data.applyAction(agentIndex, action, trusted)
+        
+        bus = self.eventBus
+        if bus is not None:
+            numMoves = self.getNumMoves()
+            bus.publish(EventType.MOVE_APPLIED, agentIndex=agentIndex, action=action, numMoves=numMoves)
+            ticket = action.getTicketType()
+            bus.publish(EventType.TICKET_SPENT, agentIndex=agentIndex, ticket=ticket,
+                        remaining=self.data.getAgentState(agentIndex).getTicketsAsDict()[ticket])
+            if agentIndex == 0 and numMoves in self.data.agents[0].notHiddenMoves:
+                bus.publish(EventType.MrX_REVEALED, numMoves=numMoves, position=action.getEnd())
+    
+    def undoAction(self):
+        """
+        Undoes the last action performed with applyAction (or generateSuccessor).
+        Returns the tuple (agentIndex, action) of the undone action.
+        """
+        agentIndex, action = self.data.undoAction()
+        if self.eventBus is not None:
+            self.eventBus.publish(EventType.MOVE_UNDONE, agentIndex=agentIndex, action=action,
+                                  numMoves=self.getNumMoves())
+        return agentIndex, action
+    
+    def skipTurn(self, agentIndex):
+        """
+        The agent at index agentIndex has no legal action: nothing changes, the event is published.
+        """
+        if self.eventBus is not None:
+            self.eventBus.publish(EventType.TURN_SKIPPED, agentIndex=agentIndex,
+                                  position=self.data.getAgentState(agentIndex).getPosition())
+    
+    def endGame(self, turn):
+        """
+        Publishes the end of the game (it must be an end state, see isEndState).
+        """
+        over, winner, message, reason = self._checkEndState(turn)
+        assert over
+        if self.eventBus is not None:
+            self.eventBus.publish(EventType.GAME_OVER, winner=winner, reason=reason, message=message)
+    
+    def placeAgent(self, agentIndex, position):
+        """
+        Moves the agent to position without an action (see GameStateData.placeAgent).
+        """
+        self.data.placeAgent(agentIndex, position)
+    
     def isEndState(self, turn):
         """
         Returns a tuple of 3 elements.
@@ -162,31 +408,48 @@ class GameState:
         
         The input parameter turn (AgentRole) determines whose turn.
         """
+        return self._checkEndState(turn)[:3]
+    
+    def getEndReason(self, turn):
+        """
+        Returns the reason (EndReason) of the end of the game, None if the game is NOT over.
+        The input parameter turn (AgentRole) determines whose turn.
+        """
+        return self._checkEndState(turn)[3]
+    
+    def _checkEndState(self, turn):
+        """
+        Same as isEndState, the fourth element of the tuple is the EndReason (None if the game is NOT over).
+        """
+        # the flags are kept up to date by GameStateData, thus the checks are O(1) (but the first
+        # check of whether an agent can move after a move next to it)
+        data = self.data
+        
         # check for an overlap between Mr.X position and the cops' ones
-        mrXposition = self._getMrXPosition()
-        copPositions = self.getCopPosition()
-        if mrXposition in copPositions:
+        caughtBy = data.getCaughtBy()
+        if caughtBy is not None:
             return (True, AgentRole.COP, "Mr. X has been caught from COP n." + \
-                    str(copPositions.index(mrXposition)+1) + ".\nThe winners are the COPS.\n")
+                    str(caughtBy) + ".\nThe winners are the COPS.\n", EndReason.CAUGHT)
         
         # check if the the maximum number of moves have been reached
-        if self.getNumMoves() == Settings.getMaxNumMoves() and turn == AgentRole.Mr_X:
-            return (True, AgentRole.Mr_X, "Maximum number of moves reached (" + str(Settings.getMaxNumMoves()) + \
-                    ").\nThe winner is Mr. X.\n")
+        maxNumMoves = data.config.getMaxNumMoves()
+        if self.getNumMoves() == maxNumMoves and turn == AgentRole.Mr_X:
+            return (True, AgentRole.Mr_X, "Maximum number of moves reached (" + str(maxNumMoves) + \
+                    ").\nThe winner is Mr. X.\n", EndReason.MAX_MOVES)
         
         # check if Mr.X has no legal moves available
-        if len(self._getLegalMrXActions())==0 and turn == AgentRole.Mr_X:
+        if turn == AgentRole.Mr_X and not data.hasLegalAction(0):
             return (True, AgentRole.COP, "Mr. X can not move from his position " + \
-                    str(mrXposition) + ".\nThe winners are the COPS.\n")
+                    str(self._getMrXPosition()) + ".\nThe winners are the COPS.\n", EndReason.MrX_STUCK)
               
         # check if the cops have run out of tickets (legalMoves)
         if turn == AgentRole.COP:
             for i in range(self.numberOfCops()):
-                if self.getLegalCopActions(i+1) != []:
-                    return (False, None, "")
-            return (True, AgentRole.Mr_X, "The cops can not move.\nThe winner is Mr. X.\n")
+                if data.hasLegalAction(i+1):
+                    return (False, None, "", None)
+            return (True, AgentRole.Mr_X, "The cops can not move.\nThe winner is Mr. X.\n", EndReason.COPS_STUCK)
         
-        return (False, None, "")
+        return (False, None, "", None)
     
     def _getMrXPosition(self):
         return self.data.getAgentState(0).getPosition()
@@ -194,8 +457,17 @@ class GameState:
     def _getLegalMrXActions(self):
         return Rules.getLegalActions(self.data.getAgent(0), self.data)
     
+    def getHash(self):
+        """
+        Returns the Zobrist hash of the state (see GameStateData.getHash).
+        """
+        return self.data.getHash()
+    
     def __eq__(self, other):
         return self.data == other.data
+    
+    def __hash__(self):
+        return self.data.getHash()
         
     def __repr__(self):
         return self.data.__str__()    
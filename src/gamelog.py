@@ -0,0 +1,195 @@
+'''
+Logging of the game, built on the standard logging module (levels, loggers, handlers).
+
+The messages are formatted lazily: the arguments are converted to strings only if the level of the message
+is enabled, so a disabled message costs just a method call (pass the objects, not their strings):
+log.debug("state:\n%s", gameState)          # str(gameState) only if DEBUG is enabled
+log.info("most likely: %s", Lazy(beliefs.argMax))  # the function is called only if INFO is enabled
+
+The sinks:
+- the console (only the message, as the prints it replaces)
+- JsonLinesHandler : a file with a JSON object per record, written by a background thread
+- RecordBuffer : the last records in memory (es: to inspect them in a test or after a game)
+
+Structured fields can be attached to a record with extra={"data": {...}}.
+
+Usage:
+log = gamelog.getLogger("game")
+gamelog.configure("INFO", "game.jsonl")    # in the main of an application, see Settings.getLogLevel()
+'''
+
+import json
+import logging
+import os
+import sys
+import threading
+import Queue
+from collections import deque
+
+
+ROOT = "scotlandyard" # the name of the logger of all the modules
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+logging.getLogger(ROOT).addHandler(logging.NullHandler()) # nothing is printed until configure is called
+
+
+def getLogger(name):
+    """
+    Returns the logger of a module of the game.
+    """
+    return logging.getLogger(ROOT + "." + name)
+
+
+class Lazy:
+    """
+    An argument of a log message computed only when the message is formatted: str(Lazy(f)) is str(f()).
+    """
+    
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+    
+    def __str__(self):
+        return str(self.function(*self.args))
+
+
+def recordToDict(record):
+    """
+    Returns the dictionary of a log record: time, level, logger, message and the structured fields (data).
+    """
+    result = {"time": record.created, "level": record.levelname, "logger": record.name,
+              "message": record.getMessage()}
+    data = getattr(record, "data", None)
+    if data is not None:
+        result["data"] = data
+    return result
+
+
+class RecordBuffer(logging.Handler):
+    """
+    Keeps in memory the dictionaries (see recordToDict) of the last capacity records.
+    """
+    
+    def __init__(self, capacity=10000, level=logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self.records = deque(maxlen=capacity)
+    
+    def emit(self, record):
+        self.records.append(recordToDict(record))
+    
+    def getRecords(self):
+        return list(self.records)
+
+
+class JsonLinesHandler(logging.Handler):
+    """
+    Appends the records to a file, a JSON object per line (see recordToDict).
+    The message is formatted when the record is emitted (the arguments may change later: the game state
+    is updated in place), encoding and writing are done by a background thread, in batches.
+    If the buffer (capacity records) is full the new records are dropped and counted.
+    
+    The handler survives a fork (es: the workers of batch.py): the child starts its own thread and appends
+    to the same file, every batch is a single write of whole lines.
+    """
+    
+    def __init__(self, fileName, capacity=10000, level=logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self.fileName = fileName
+        self.capacity = capacity
+        self.fd = os.open(fileName, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0644)
+        self.dropped = 0
+        self.pid = None
+        self._start()
+    
+    def _start(self):
+        self.pid = os.getpid()
+        self.queue = Queue.Queue(self.capacity)
+        self.thread = threading.Thread(target=self._write, name="JsonLinesHandler")
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def emit(self, record):
+        if self.pid != os.getpid():
+            self._start() # the thread of the parent process does not exist in a forked child
+        try:
+            self.queue.put_nowait(recordToDict(record))
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+    
+    def _write(self):
+        queue = self.queue
+        while True:
+            batch = [queue.get()]
+            while True:
+                try:
+                    batch.append(queue.get_nowait())
+                except Queue.Empty:
+                    break
+            stop = None in batch # None is the sentinel of close
+            lines = "".join([json.dumps(item, sort_keys=True, default=str) + "\n" for item in batch if item is not None])
+            while lines:
+                lines = lines[os.write(self.fd, lines):]
+            for _ in batch:
+                queue.task_done()
+            if stop:
+                return
+    
+    def flush(self):
+        """
+        Waits until all the records emitted so far are written.
+        """
+        if self.pid == os.getpid() and self.thread.is_alive():
+            self.queue.join()
+    
+    def close(self):
+        if self.pid == os.getpid() and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        logging.Handler.close(self)
+
+
+_handlers = [] # the handlers added by configure
+
+
+def configure(level="INFO", fileName=None, console=True, stream=None):
+    """
+    Configures the logging of the game: the level (a name as "DEBUG", "INFO", "WARNING" or a number),
+    the messages are printed on the console (if console is True, on stream: sys.stdout by default)
+    and written as JSON lines to fileName (if it is not None).
+    The handlers of a previous configuration are removed.
+    """
+    logger = logging.getLogger(ROOT)
+    for handler in _handlers:
+        logger.removeHandler(handler)
+        handler.close()
+    del _handlers[:]
+    
+    if not isinstance(level, int):
+        level = logging.getLevelName(str(level).upper())
+    logger.setLevel(level)
+    
+    if console:
+        handler = logging.StreamHandler(sys.stdout if stream is None else stream)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _handlers.append(handler)
+    if fileName is not None:
+        _handlers.append(JsonLinesHandler(fileName))
+    for handler in _handlers:
+        logger.addHandler(handler)
+
+
+def flush():
+    """
+    Waits until the records emitted so far are written by the handlers added by configure.
+    """
+    for handler in _handlers:
+        handler.flush()
@@ -6,7 +6,6 @@ Created on 14/set/2016
 
 from layout import EdgeType
 from math import sqrt
-from settings import Settings
 from agents import AgentRole
 import pygame
 import pygame.locals
@@ -36,35 +35,9 @@ SETTINGS_PANEL_COLOR = BLACK
 MOVES_PANEL_COLOR = BLACK
 
 # SIZE SETTINGS
-N = Settings.getLayout().getNumNodes()
-Ny = int(sqrt(N))
-Nx = int(N/Ny if N%Ny==0 else N/Ny + 1)
-
 BLOCK_SIZE = 70, 70
-
-BOARD_SIZE = BLOCK_SIZE[0]*Nx,BLOCK_SIZE[1]*Ny
-
 H = 200
-INFO_PANEL_SIZE = BOARD_SIZE[0] / 2, H
-SETTINGS_PANEL_SIZE = BOARD_SIZE[0] / 2, H
-
-MOVES_PANEL_SIZE = 150, BOARD_SIZE[1] + INFO_PANEL_SIZE[1]
-
-SCREEN_SIZE = BOARD_SIZE[0] + MOVES_PANEL_SIZE[0], MOVES_PANEL_SIZE[1]
-
-# POSITION SETTINGS
-BOARD_UPPER_LEFT = 0, INFO_PANEL_SIZE[1]
-BOARD_RECT = pygame.Rect(BOARD_UPPER_LEFT, BOARD_SIZE)
-
-INFO_UPPER_LEFT =  0, 0
-INFO_RECT = pygame.Rect(INFO_UPPER_LEFT, INFO_PANEL_SIZE)  # upper left panel
-
-SETTINGS_PANEL_UPPER_LEFT =  INFO_PANEL_SIZE[0], 0
-SETTINGS_PANEL_RECT = pygame.Rect(SETTINGS_PANEL_UPPER_LEFT, SETTINGS_PANEL_SIZE)  # upper center panel
-
-MOVES_PANEL_UPPER_LEFT = INFO_PANEL_SIZE[0] + SETTINGS_PANEL_SIZE[0], 0
-MOVES_PANEL_RECT = pygame.Rect(MOVES_PANEL_UPPER_LEFT, MOVES_PANEL_SIZE)  # right panel
-
+MOVES_PANEL_WIDTH = 150
 
 # EDGE SETTINGS
 EDGE_WIDTH = 5
@@ -80,100 +53,130 @@ EDGE_COLORS = {EdgeType.TAXI : YELLOW,
               EdgeType.FERRY: GREEN # botton left, NO UNDERGROUND and FERRY at the same time!!
               }
  
-
-NODES = Settings.getLayout().getNodesStations() # dict --> numNodes : set(EdgeType)
-
-def hasStation(edge_type, n):
-    if n not in NODES:
-        return False
-    return edge_type in NODES[n]
-
-def getCenter(n):
-    x, y = (n-1)%Nx, (n-1)/Nx
-    topLeftCorner = x*BLOCK_SIZE[0], y*BLOCK_SIZE[1]
-    shift = BLOCK_SIZE[0] / 2, BLOCK_SIZE[1] / 2
-    return topLeftCorner[0]+shift[0], topLeftCorner[1]+shift[1]
-
 def getColor(edge_type):
     return EDGE_COLORS[edge_type]
 
-def drawNodes(board):
-    stop = False
-    for j in range(Ny):
-        if stop : 
-            break
-        for i in range(Nx):
-            number = i + 1 + Nx*j
-            if number>N:
-                stop=True
-                break
-            center = getCenter(number)
-            
-            r=min(BLOCK_SIZE)/4
+
+class BoardGeometry:
+    """
+    The sizes and the positions of the board and of the panels for a layout (the nodes are drawn on a grid
+    of Nx * Ny blocks), and the drawing of the board.
+    It is built by every display for the layout of its game, so the layout is not read at import time.
+    """
+    
+    def __init__(self, layout):
+        self.layout = layout
+        self.N = N = layout.getNumNodes()
+        self.Ny = Ny = int(sqrt(N))
+        self.Nx = int(N/Ny if N%Ny==0 else N/Ny + 1)
+        self.NODES = layout.getNodesStations() # dict --> numNodes : set(EdgeType)
+        
+        self.BOARD_SIZE = BLOCK_SIZE[0]*self.Nx, BLOCK_SIZE[1]*Ny
+        self.INFO_PANEL_SIZE = self.BOARD_SIZE[0] / 2, H
+        self.SETTINGS_PANEL_SIZE = self.BOARD_SIZE[0] / 2, H
+        self.MOVES_PANEL_SIZE = MOVES_PANEL_WIDTH, self.BOARD_SIZE[1] + self.INFO_PANEL_SIZE[1]
+        self.SCREEN_SIZE = self.BOARD_SIZE[0] + self.MOVES_PANEL_SIZE[0], self.MOVES_PANEL_SIZE[1]
+        
+        # POSITION SETTINGS
+        self.BOARD_UPPER_LEFT = 0, self.INFO_PANEL_SIZE[1]
+        self.BOARD_RECT = pygame.Rect(self.BOARD_UPPER_LEFT, self.BOARD_SIZE)
+        
+        self.INFO_UPPER_LEFT =  0, 0
+        self.INFO_RECT = pygame.Rect(self.INFO_UPPER_LEFT, self.INFO_PANEL_SIZE)  # upper left panel
+        
+        self.SETTINGS_PANEL_UPPER_LEFT =  self.INFO_PANEL_SIZE[0], 0
+        self.SETTINGS_PANEL_RECT = pygame.Rect(self.SETTINGS_PANEL_UPPER_LEFT, self.SETTINGS_PANEL_SIZE)  # upper center panel
+        
+        self.MOVES_PANEL_UPPER_LEFT = self.INFO_PANEL_SIZE[0] + self.SETTINGS_PANEL_SIZE[0], 0
+        self.MOVES_PANEL_RECT = pygame.Rect(self.MOVES_PANEL_UPPER_LEFT, self.MOVES_PANEL_SIZE)  # right panel
+    
+    def hasStation(self, edge_type, n):
+        if n not in self.NODES:
+            return False
+        return edge_type in self.NODES[n]
+    
+    def getCenter(self, n):
+        x, y = (n-1)%self.Nx, (n-1)/self.Nx
+        topLeftCorner = x*BLOCK_SIZE[0], y*BLOCK_SIZE[1]
+        shift = BLOCK_SIZE[0] / 2, BLOCK_SIZE[1] / 2
+        return topLeftCorner[0]+shift[0], topLeftCorner[1]+shift[1]
+    
+    def getBlockRect(self, n):
+        """
+        Returns the rectangle of the board (pygame.Rect) which contains the node n and its agent.
+        """
+        center = self.getCenter(n)
+        return pygame.Rect((center[0] - BLOCK_SIZE[0] / 2, center[1] - BLOCK_SIZE[1] / 2), BLOCK_SIZE)
+    
+    def drawNodes(self, board):
+        r=min(BLOCK_SIZE)/4
+        for number in range(1, self.N + 1):
+            center = self.getCenter(number)
             
             # TAXI station
-            color = getColor(EdgeType.TAXI) if hasStation(EdgeType.TAXI, number) else NO_STATION_COLOR
+            color = getColor(EdgeType.TAXI) if self.hasStation(EdgeType.TAXI, number) else NO_STATION_COLOR
             pygame.draw.circle(board, color, center, r)
             
             # BUS station
-            color = getColor(EdgeType.BUS) if hasStation(EdgeType.BUS, number) else NO_STATION_COLOR         
+            color = getColor(EdgeType.BUS) if self.hasStation(EdgeType.BUS, number) else NO_STATION_COLOR
             pygame.draw.circle(board, color, center, r-5)
             
             # FERRY or UNDERGROUND station
-            if hasStation(EdgeType.UNDERGROUND, number):
+            if self.hasStation(EdgeType.UNDERGROUND, number):
                 color = getColor(EdgeType.UNDERGROUND)
-            elif hasStation(EdgeType.FERRY, number):
+            elif self.hasStation(EdgeType.FERRY, number):
                 color = getColor(EdgeType.FERRY)
             else:
                 color = NO_STATION_COLOR
             pygame.draw.circle(board, color, center, r-10)
             
-    
-def drawNumbers(board):
-    font = pygame.font.Font(None, 20)
-    stop = False
-    for j in range(Ny):
-        if stop : 
-            break
-        for i in range(Nx):
-            number = i + 1 + Nx*j
-            if number>N:
-                stop=True
-                break
+    def drawNumbers(self, board):
+        font = pygame.font.Font(None, 20)
+        for number in range(1, self.N + 1):
             txt_surf = font.render(str(number), False, (0,0,0))
-            txt_rect = txt_surf.get_rect(center = getCenter(number))
+            txt_rect = txt_surf.get_rect(center = self.getCenter(number))
             board.blit(txt_surf, txt_rect)
             
-def drawEdges(board):
-    # edge format : (start, end, edgeType, path)
-    for start, end, edge_type, path in Settings.getLayout().getEdges():
-        point_list = [getCenter(start)] + [getCenter(i) for i in path] + [getCenter(end)]
-        dx, dy = EDGE_SHIFT[edge_type]
-        point_list = [(x + dx, y + dy) for x,y in point_list] 
-        pygame.draw.lines(board, getColor(edge_type), False, point_list, EDGE_WIDTH)
+    def drawEdges(self, board):
+        # edge format : (start, end, edgeType, path)
+        for start, end, edge_type, path in self.layout.getEdges():
+            point_list = [self.getCenter(start)] + [self.getCenter(i) for i in path] + [self.getCenter(end)]
+            dx, dy = EDGE_SHIFT[edge_type]
+            point_list = [(x + dx, y + dy) for x,y in point_list]
+            pygame.draw.lines(board, getColor(edge_type), False, point_list, EDGE_WIDTH)
+    
+    def drawAgent(self, board, agent):
+        color = GREEN if agent.getRole()==AgentRole.COP else RED
+        center = self.getCenter(agent.getAgentState().getPosition())
+        r = min(BLOCK_SIZE)/2
+        pygame.draw.circle(board, color, center, r, 15)
 
 def getSettingsPanelMessage(data):
     message = "current move : " + str(data.getNumMoves()) + "\n" + \
-              "max number of moves : " + str(Settings.getMaxNumMoves()) + "\n" + \
-              "not hidden moves: " + str(Settings.getNotHiddenMovesNumbers())
-    if Settings.isDebug():
+              "max number of moves : " + str(data.config.getMaxNumMoves()) + "\n" + \
+              "not hidden moves: " + str(data.config.getNotHiddenMovesNumbers())
+    if data.config.isDebug():
         message += "\n\n DEBUG MODE ON"
     
     return message
 
+MOVES_PANEL_FIRST_LINE = 2 # the move n is at the line (MOVES_PANEL_FIRST_LINE + n - 1) of the moves panel
+
 def getMovesPanelMessage(data):
     message = "  Mr.X info\n"
-    not_hidden_moves = Settings.getNotHiddenMovesNumbers()
     for i in range(data.getNumMoves()):
-        n_move = i + 1
-        mrx_state = data.getAgentState(0)
-        ticket = mrx_state.getMovesHistory()[i].getTicketType()
-        message += "\n  " + str(n_move) + " : " + str(ticket)
-        if n_move in not_hidden_moves:
-            mrx_position = mrx_state.getPosition()
-            message += "   " + str(mrx_position)
+        message += "\n" + getMovesPanelLine(data, i + 1)
     return message
             
+def getMovesPanelLine(data, n_move):
+    """
+    Returns the line of the moves panel of the move number n_move of Mr.X (1 is the first one).
+    """
+    action = data.getAgentState(0).getMovesHistory()[n_move - 1]
+    line = "  " + str(n_move) + " : " + str(action.getTicketType())
+    if n_move in data.config.getNotHiddenMovesNumbers():
+        line += "   " + str(action.getEnd())
+    return line
         
             
 
@@ -189,20 +192,6 @@ def load_image(name):
     return img
  
 
-def drawAgent(board, agent):
-#     if agent.getRole() == AgentRole.Mr_X:
-#         img = load_image("mrx2.jpg")
-#     else:
-#         img = load_image("tmp1.png")
-#      
-#     position = agent.getAgentState().getPosition()
-#     img_rect = img.get_rect(center = getCenter(position))   
-#     board.blit(img, img_rect)
-    color = GREEN if agent.getRole()==AgentRole.COP else RED
-    center = getCenter(agent.getAgentState().getPosition())
-    r = min(BLOCK_SIZE)/2
-    pygame.draw.circle(board, color, center, r, 15)
-
 if __name__ == '__main__':
     pass
 
@@ -7,8 +7,8 @@ Created on 12/set/2016
 import util
 import GUI_util as gu
 import pygame
-from settings import Settings
 from agents import AgentRole
+from events import EventType
 
 
 class Display:
@@ -34,6 +34,14 @@ class Display:
         """
         pass
 
+    def onEvent(self, event):
+        """
+        Receives the events of the game (see events.py) which the display is subscribed to.
+        By default the whole display is updated when the state changes.
+        """
+        if event.type in (EventType.MOVE_APPLIED, EventType.MOVE_UNDONE, EventType.TURN_SKIPPED):
+            self.update(self.data)
+
     def wait(self, ms=None):
         """
         Wait for a user event.
@@ -125,25 +133,28 @@ class GUIDisplay(Display):
 
     def __init__(self, gameStateData):
         Display.__init__(self, gameStateData)
+        self.geometry = gu.BoardGeometry(gameStateData.layout)
         # screen
-        self.screen = pygame.display.set_mode(gu.SCREEN_SIZE)
+        self.screen = pygame.display.set_mode(self.geometry.SCREEN_SIZE)
         pygame.display.set_caption("Scotland Yard")
         # game board
-        self.board = pygame.Surface(gu.BOARD_SIZE)
+        self.board = pygame.Surface(self.geometry.BOARD_SIZE)
         self.board = self.board.convert()
         self.board.fill(gu.BG_COLOR)
         # info panel
-        self.infoPanel = pygame.Surface(gu.INFO_PANEL_SIZE)
+        self.infoPanel = pygame.Surface(self.geometry.INFO_PANEL_SIZE)
         self.infoPanel = self.infoPanel.convert()
         self.infoPanel.fill(gu.INFO_PANEL_COLOR)
         # settings panel
-        self.settingsPanel = pygame.Surface(gu.SETTINGS_PANEL_SIZE)
+        self.settingsPanel = pygame.Surface(self.geometry.SETTINGS_PANEL_SIZE)
         self.settingsPanel = self.settingsPanel.convert()
         self.settingsPanel.fill(gu.SETTINGS_PANEL_COLOR)
         # moves panel
-        self.movesPanel = pygame.Surface(gu.MOVES_PANEL_SIZE)
+        self.movesPanel = pygame.Surface(self.geometry.MOVES_PANEL_SIZE)
         self.movesPanel = self.movesPanel.convert()
         self.movesPanel.fill(gu.MOVES_PANEL_COLOR)
+        self.font = pygame.font.Font(None, 25)
+        self.mrXDrawnAt = None # the position where Mr.X is drawn, None if he is not visible
         
 
     def start(self):
@@ -153,10 +164,30 @@ class GUIDisplay(Display):
         self._drawGameBoardAndInfo()
         self.STATIC_BOARD = self.board.copy() # create a copy for later
         self._drawPlayers()
-        self.screen.blit(self.board, gu.BOARD_RECT)
+        self.screen.blit(self.board, self.geometry.BOARD_RECT)
         pygame.display.update()
         self.wait(1000)
 
+    def onEvent(self, event):
+        """
+        Redraws only what the event changed: the blocks of the board where the agent was and is
+        and, for the moves of Mr.X, the settings panel and the new line of the moves panel.
+        """
+        if event.type == EventType.MOVE_APPLIED:
+            action = event.action
+            dirty = self._redrawBlocks([action.getStart(), action.getEnd()])
+            if event.agentIndex == 0:
+                self.showMessage(gu.getSettingsPanelMessage(self.data), self.settingsPanel,
+                                 bg_color = gu.SETTINGS_PANEL_COLOR,
+                                 rect = self.geometry.SETTINGS_PANEL_RECT)
+                line = gu.MOVES_PANEL_FIRST_LINE + event.numMoves - 1
+                self._drawLine(self.movesPanel, line, gu.getMovesPanelLine(self.data, event.numMoves))
+                self.screen.blit(self.movesPanel, self.geometry.MOVES_PANEL_RECT)
+                dirty.append(self.geometry.MOVES_PANEL_RECT)
+            pygame.display.update(dirty)
+        elif event.type == EventType.MOVE_UNDONE:
+            self.update(self.data)
+
     def update(self, new_gameStateData):
         """
         Update the display with the new data supplied.
@@ -166,15 +197,15 @@ class GUIDisplay(Display):
         # update board
         self.board = self.STATIC_BOARD.copy()
         self._drawPlayers()
-        self.screen.blit(self.board, gu.BOARD_RECT)
+        self.screen.blit(self.board, self.geometry.BOARD_RECT)
         # update settings panel
         self.showMessage(gu.getSettingsPanelMessage(self.data), self.settingsPanel, 
                          bg_color = gu.SETTINGS_PANEL_COLOR, 
-                         rect = gu.SETTINGS_PANEL_RECT)
+                         rect = self.geometry.SETTINGS_PANEL_RECT)
         # update Mr.X moves panel
         self.showMessage(gu.getMovesPanelMessage(self.data), self.movesPanel, 
                          bg_color = gu.MOVES_PANEL_COLOR, 
-                         rect = gu.MOVES_PANEL_RECT)
+                         rect = self.geometry.MOVES_PANEL_RECT)
         pygame.display.update()
         
 
@@ -208,17 +239,12 @@ class GUIDisplay(Display):
         if bg_color is None:
             bg_color = gu.INFO_PANEL_COLOR
         if rect is None:
-            rect = gu.INFO_RECT
+            rect = self.geometry.INFO_RECT
             
         surface.fill(bg_color)  # clear from previous messages
         
-        lines = message.split("\n")
-        font = pygame.font.Font(None, 25)
-        dy = 20
-        for i, line in enumerate(lines):
-            txt_surf = font.render(line, False, gu.WHITE)
-            new_rect = txt_surf.get_rect().move(0, i*dy)
-            surface.blit(txt_surf, new_rect)
+        for i, line in enumerate(message.split("\n")):
+            self._drawLine(surface, i, line)
         
         self.screen.blit(surface, rect)
         self.wait()
@@ -229,7 +255,7 @@ class GUIDisplay(Display):
         Ask the user to perform an action.
         """
         message = str(role) + " -> " + str(index)
-        if role == AgentRole.COP or Settings.isDebug():
+        if role == AgentRole.COP or self.data.config.isDebug():
             message += "\nCurrent position : " + str(currPos)
             message += "\nPossible actions :\n   " + "\n   ".join([a.__repr__() for a in possActions])
         self.showMessage(message, surface=self.infoPanel, bg_color=gu.INFO_PANEL_COLOR)
@@ -247,26 +273,63 @@ class GUIDisplay(Display):
         """
         pygame.quit()
 
+    def _drawLine(self, surface, i, line):
+        """
+        Draws the line of text at the line number i of the surface.
+        """
+        dy = 20
+        txt_surf = self.font.render(line, False, gu.WHITE)
+        surface.blit(txt_surf, txt_surf.get_rect().move(0, i*dy))
+
     def _drawGameBoardAndInfo(self):
-        gu.drawEdges(self.board)
-        gu.drawNodes(self.board)
-        gu.drawNumbers(self.board)
+        self.geometry.drawEdges(self.board)
+        self.geometry.drawNodes(self.board)
+        self.geometry.drawNumbers(self.board)
         
         self.showMessage("Starting a new Game...", self.infoPanel, 
                          bg_color = gu.INFO_PANEL_COLOR, 
-                         rect = gu.INFO_RECT)
+                         rect = self.geometry.INFO_RECT)
         self.showMessage(gu.getSettingsPanelMessage(self.data), self.settingsPanel, 
                          bg_color = gu.SETTINGS_PANEL_COLOR, 
-                         rect = gu.SETTINGS_PANEL_RECT)
+                         rect = self.geometry.SETTINGS_PANEL_RECT)
         self.showMessage("Mr.X info", self.movesPanel, 
                          bg_color = gu.MOVES_PANEL_COLOR, 
-                         rect = gu.MOVES_PANEL_RECT)
+                         rect = self.geometry.MOVES_PANEL_RECT)
+
+    def _isMrXVisible(self):
+        config = self.data.config
+        return config.isDebug() or self.data.getNumMoves() in config.getNotHiddenMovesNumbers()
 
     def _drawPlayers(self):
-        if Settings.isDebug() or self.data.getNumMoves() in Settings.getNotHiddenMovesNumbers():
-            gu.drawAgent(self.board, self.data.getAgent(0))
+        if self._isMrXVisible():
+            self.geometry.drawAgent(self.board, self.data.getAgent(0))
+            self.mrXDrawnAt = self.data.getAgentState(0).getPosition()
+        else:
+            self.mrXDrawnAt = None
         for i in range(self.data.numberOfCops()):
-            gu.drawAgent(self.board, self.data.getAgent(i+1))
+            self.geometry.drawAgent(self.board, self.data.getAgent(i+1))
+
+    def _redrawBlocks(self, nodes):
+        """
+        Redraws the blocks of the board of the given nodes (and the one where Mr.X was drawn, if he is
+        not visible anymore) with the agents in them, returns the list of the rectangles of the screen to update.
+        """
+        visible = self._isMrXVisible()
+        if self.mrXDrawnAt is not None and self.mrXDrawnAt not in nodes:
+            nodes = nodes + [self.mrXDrawnAt]
+        self.mrXDrawnAt = self.data.getAgentState(0).getPosition() if visible else None
+        
+        dirty = []
+        for node in nodes:
+            rect = self.geometry.getBlockRect(node)
+            self.board.blit(self.STATIC_BOARD, rect, rect)
+            for i, agent in enumerate(self.data.agents):
+                if agent.getAgentState().getPosition() == node and (i > 0 or visible):
+                    self.geometry.drawAgent(self.board, agent)
+            screenRect = rect.move(self.geometry.BOARD_UPPER_LEFT)
+            self.screen.blit(self.board, screenRect, rect)
+            dirty.append(screenRect)
+        return dirty
         
         
         
@@ -274,6 +337,7 @@ if __name__ == '__main__':
     #from agents import  MrX, KeyboardMrX, KeyboardCop, Cop
     from game import GameStateData
     from scotlandYard import createAgents
+    from settings import Settings
     agents_list = createAgents()
     print agents_list
     layout = Settings.getLayout()
@@ -0,0 +1,188 @@
+'''
+Zobrist hashing of the game states and a bounded transposition table for the search agents.
+
+The hash of a GameStateData (see GameStateData.getHash) is the XOR of one random 64 bit key
+for every feature which matters for the play:
+- the position of every agent
+- the number of tickets of every type of every agent
+- the number of moves of Mr.X
+- whether Mr.X is revealed (his last move is a not hidden move)
+so that it is updated in O(1) when an action is applied or undone.
+'''
+
+from collections import OrderedDict
+
+from rules import TicketType
+
+
+MASK_64 = (1 << 64) - 1
+
+# kinds of features
+_POSITION = 1
+_TICKETS = 2
+_MOVE_NUMBER = 3
+_REVEALED = 4
+_TURN = 5
+
+
+def _mix(x):
+    """
+    The splitmix64 finalizer: a deterministic "random" 64 bit key for the integer x.
+    The keys are the same in every process, thus the hashes can be compared across processes.
+    """
+    x = (x + 0x9E3779B97F4A7C15) & MASK_64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return x ^ (x >> 31)
+
+
+class ZobristKeys:
+    """
+    The random keys of the features of a game state (memoized).
+    """
+    
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.keys = {}
+    
+    def _key(self, kind, agentIndex, subfeature, value):
+        feature = (((kind << 16 | agentIndex) << 8 | subfeature) << 32) | value
+        key = self.keys.get(feature)
+        if key is None:
+            key = _mix(feature ^ _mix(self.seed))
+            self.keys[feature] = key
+        return key
+    
+    def position(self, agentIndex, node):
+        return self._key(_POSITION, agentIndex, 0, node)
+    
+    def tickets(self, agentIndex, ticket, count):
+        return self._key(_TICKETS, agentIndex, TicketType.asList().index(ticket), count)
+    
+    def moveNumber(self, numMoves):
+        return self._key(_MOVE_NUMBER, 0, 0, numMoves)
+    
+    def revealed(self):
+        return self._key(_REVEALED, 0, 0, 0)
+    
+    def turn(self, agentIndex):
+        """
+        The key of the agent which has to move: it is NOT part of the hash of a state, the search agents
+        XOR it with the hash to tell apart the same state searched for different agents.
+        """
+        return self._key(_TURN, agentIndex, 0, 0)
+    
+    def hashAgents(self, agents):
+        """
+        Computes from scratch the hash of a list of agents (Mr.X at index 0).
+        """
+        result = 0
+        for index, agent in enumerate(agents):
+            agentState = agent.getAgentState()
+            result ^= self.position(index, agentState.getPosition())
+            for ticket, count in agentState.getTicketsAsDict().items():
+                result ^= self.tickets(index, ticket, count)
+        numMoves = len(agents[0].getAgentState().getMovesHistory())
+        result ^= self.moveNumber(numMoves)
+        if numMoves in agents[0].notHiddenMoves:
+            result ^= self.revealed()
+        return result
+
+
+ZOBRIST = ZobristKeys() # the keys shared by all the game states
+
+
+class TranspositionTable:
+    """
+    A bounded table of search results indexed by the hash of the game states.
+    Every entry is a tuple (depth, value, flag, bestAction), flag tells whether value is
+    exact or a bound (EXACT, LOWER_BOUND, UPPER_BOUND).
+    
+    When a key is stored again the replacement policy decides whether the new entry wins:
+    - "depth" : only if it was searched at least as deep as the old one
+    - "always" : always
+    When the table is full a key is evicted according to the eviction policy:
+    - "lru" : the least recently stored or probed
+    - "fifo" : the least recently inserted
+    
+    NOTE : search agents can share a table with TranspositionTable.shared(name), but the keys do not
+    tell the layout and the settings: the table must be cleared when another game starts.
+    """
+    
+    EXACT = "EXACT"
+    LOWER_BOUND = "LOWER_BOUND"
+    UPPER_BOUND = "UPPER_BOUND"
+    
+    _tables = {} # name --> TranspositionTable, see shared
+    
+    def __init__(self, capacity=100000, replacement="depth", eviction="lru"):
+        assert capacity > 0
+        assert replacement in ("depth", "always"), replacement
+        assert eviction in ("lru", "fifo"), eviction
+        self.capacity = capacity
+        self.replacement = replacement
+        self.eviction = eviction
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def probe(self, key, depth=0, exact=False):
+        """
+        Returns the entry (depth, value, flag, bestAction) of the key if it was searched
+        at least at the given depth (exactly at the given depth if exact, for the values which
+        depend on the depth), None otherwise.
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth or (exact and entry[0] != depth):
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.eviction == "lru":
+            del self.entries[key]
+            self.entries[key] = entry
+        return entry
+    
+    def getBestAction(self, key):
+        """
+        Returns the best action stored for the key (whatever its depth), None if there is none.
+        It is meant for move ordering.
+        """
+        entry = self.entries.get(key)
+        return None if entry is None else entry[3]
+    
+    def store(self, key, depth, value, flag=EXACT, bestAction=None):
+        """
+        Stores the result of the search of a state, according to the replacement and eviction policies.
+        """
+        old = self.entries.get(key)
+        if old is not None:
+            if self.replacement == "depth" and depth < old[0]:
+                return
+            del self.entries[key]
+        elif len(self.entries) >= self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        self.entries[key] = (depth, value, flag, bestAction)
+    
+    def clear(self):
+        self.entries.clear()
+    
+    def getStats(self):
+        """
+        Returns a dictionary with the statistics of the table.
+        """
+        return {"size": len(self.entries), "capacity": self.capacity, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def shared(name="default", capacity=100000, replacement="depth", eviction="lru"):
+        """
+        Returns the table with the given name, it is created (with the given parameters) the first time.
+        """
+        if name not in TranspositionTable._tables:
+            TranspositionTable._tables[name] = TranspositionTable(capacity, replacement, eviction)
+        return TranspositionTable._tables[name]
+    shared = staticmethod(shared)
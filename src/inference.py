@@ -5,38 +5,38 @@ Created on 23/set/2016
 '''
 import util
 import rules
-from settings import Settings
+from settings import getConfig
+
+try:
+    import numpy as np
+except ImportError:  # numpy is needed only by the vectorized inference modules
+    np = None
 
 def distributionFrom(old_pos, ticket_used, gameState):
     """
     Returns a distribution which stores the probabilities of being in a position, given the previous
     position the ticket_used used and the current gameState.
     """
-    def getWeight(end, gameState):
-        cops_pos = gameState.getCopPosition()
-        if end in cops_pos:
+    def getWeight(end, cops):
+        if end in cops:
             return 0
         # IMPROVEMENT: consider the positions of the cops
         return 1
     
     result = util.Counter()
     
-    edges = Settings.getLayout().getEdgesFromNode(old_pos)  # (int, int, EdgeType, [])
+    layout = gameState.data.layout
     
     if ticket_used == rules.TicketType.BLACK:
         # all edges are possible
-        ends = [edge[1] for edge in edges]
-        for end in ends:
-            result[end] = getWeight(end, gameState)
-        result.normalize()
-        return result
-        
-    # else   
-    for edge in edges:
-        start, end, edge_ticket, _ = edge
-        assert start == old_pos and end!=start
-        if ticket_used == edge_ticket:
-            result[end] = getWeight(end, gameState)
+        ends = layout.getNeighbours(old_pos)
+    else:
+        ends = layout.getNeighbours(old_pos, ticket_used)
+    
+    cops = gameState.getCopSet()
+    for end in ends:
+        assert end != old_pos
+        result[end] = getWeight(end, cops)
     
     result.normalize()
     return result
@@ -49,15 +49,16 @@ class ExactInference:
     The exact dynamic inference module uses forward-algorithm updates to
     compute the exact belief function at each time step.
     """
-    def __init__(self, beliefs = None):
+    def __init__(self, beliefs = None, config = None):
         """
         Initializes the belief distribution uniformly.
+        config is the configuration of the game (GameConfig in settings.py), the default one if it is None.
         """
         self.nextMoveToObserve = 0
         
         if beliefs is None:     
             self.beliefs = util.Counter()
-            for pos in Settings.getLegalPositions():
+            for pos in getConfig(config).getLegalPositions():
                 self.beliefs[pos] = 1
             self.beliefs.normalize()
         else:
@@ -88,7 +89,8 @@ class ExactInference:
             for old_pos in self.beliefs.keys():
                 new_pos_dist = distributionFrom(old_pos, ticket, gameState)
                 for new_pos, prob in new_pos_dist.items():
-                    new_beliefs[new_pos] += self.beliefs[old_pos] * prob
+                    if prob > 0: # the positions of the cops are not stored at all
+                        new_beliefs[new_pos] += self.beliefs[old_pos] * prob
 
             new_beliefs.normalize()
             self.beliefs = new_beliefs
@@ -96,6 +98,20 @@ class ExactInference:
         self.nextMoveToObserve += 1
             
             
+    def removePositions(self, positions):
+        """
+        Conditions the beliefs on Mr.X NOT being in any of positions (es: the positions of the cops).
+        NOTE : the beliefs are a new Counter, the distributions already returned do not change.
+        """
+        excluded = set(positions)
+        new_beliefs = util.Counter()
+        for pos, prob in self.beliefs.items():
+            if pos not in excluded:
+                new_beliefs[pos] = prob
+        new_beliefs.normalize()
+        self.beliefs = new_beliefs
+    
+    
     def getBeliefsDistribution(self):
         """
         Returns the current beliefs distribution.
@@ -103,6 +119,324 @@ class ExactInference:
         return self.beliefs
     
 
+class TransitionModel:
+    """
+    The transition matrices of Mr.X movements, one for every TicketType, stored as sparse
+    (CSR) numpy arrays: rows[k] -> cols[k] is a possible move with the ticket.
+    The BLACK matrix is the union of all the types of edges.
+    Parallel edges are merged, as in distributionFrom.
+    
+    NOTE : use TransitionModel.forLayout(layout), the matrices are built once for every layout.
+    """
+    
+    def __init__(self, layout):
+        if np is None:
+            raise ImportError("numpy is required by " + self.__class__.__name__)
+        self.size = len(layout.getAdjacency()[0]) - 1 # nodes are indexes in [0, size)
+        self.matrices = {}
+        for ticket in rules.TicketType.asList():
+            edgeType = None if ticket == rules.TicketType.BLACK else ticket
+            self.matrices[ticket] = self._buildMatrix(*layout.getAdjacency(edgeType))
+    
+    def _buildMatrix(self, offsets, ends):
+        offsets = np.frombuffer(offsets, dtype=np.int32)
+        cols = np.frombuffer(ends, dtype=np.int32)
+        rows = np.repeat(np.arange(self.size, dtype=np.int64), np.diff(offsets))
+        keys = np.unique(rows * self.size + cols)  # sorted by row, without parallel edges
+        rows, cols = keys // self.size, keys % self.size
+        offsets = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.size), out=offsets[1:])
+        return rows, cols, offsets
+    
+    def getMatrix(self, ticket):
+        """
+        Returns the tuple of arrays (rows, cols) of the moves allowed by the ticket.
+        """
+        return self.matrices[ticket][:2]
+    
+    def getOffsets(self, ticket):
+        """
+        Returns the CSR offsets of the matrix of the ticket: the moves from node n are the
+        positions [offsets[n], offsets[n+1]) of rows and cols.
+        """
+        return self.matrices[ticket][2]
+    
+    def forLayout(layout):
+        return layout.getShared(TransitionModel)
+    forLayout = staticmethod(forLayout)
+
+
+class VectorizedExactInference:
+    """
+    The same forward-algorithm updates of ExactInference, computed with numpy.
+    The beliefs are a dense vector indexed by node and every hidden move is a couple of
+    sparse matrix-vector products over the transition matrix of the ticket used (see TransitionModel).
+    
+    As in distributionFrom, Mr.X moves uniformly towards the nodes not occupied by a cop:
+    freeDegree = T * free           (free[n] = 0 if a cop is in n, 1 otherwise)
+    newBeliefs = T' * (beliefs / freeDegree) .* free
+    then newBeliefs is normalized.
+    """
+    def __init__(self, beliefs = None, nextMoveToObserve = 0, config = None):
+        """
+        Initializes the belief distribution uniformly.
+        config is the configuration of the game (GameConfig in settings.py), the default one if it is None.
+        """
+        self.config = getConfig(config)
+        self.model = TransitionModel.forLayout(self.config.getLayout())
+        self.nextMoveToObserve = nextMoveToObserve
+        
+        if beliefs is None:
+            self.beliefs = np.zeros(self.model.size)
+            self.beliefs[self.config.getLegalPositions()] = 1
+            self.beliefs /= self.beliefs.sum()
+        else:
+            self.beliefs = beliefs
+    
+    def deepCopy(self):
+        return VectorizedExactInference(self.beliefs.copy(), self.nextMoveToObserve, self.config)
+    
+    def updateBeliefs(self, ticketList, notHiddenMoves, gameState):
+        """
+        Updates the beliefs distribution according to the new evidences.
+        ticketList is the list of the tickets used by Mr.X
+        notHiddenMoves is a dictionary in the format { numberOfMove : position }
+        """
+        assert len(ticketList) == (self.nextMoveToObserve + 1), \
+                (len(ticketList), self.nextMoveToObserve + 1)
+        
+        if self.nextMoveToObserve+1 in notHiddenMoves:
+            self.beliefs = np.zeros(self.model.size)
+            self.beliefs[notHiddenMoves[self.nextMoveToObserve+1]] = 1  # we are sure about the position of Mr.X
+        else:
+            rows, cols = self.model.getMatrix(ticketList[self.nextMoveToObserve])
+            free = np.ones(self.model.size)
+            free[gameState.getCopPosition()] = 0
+            
+            freeDegree = np.bincount(rows, weights=free[cols], minlength=self.model.size)
+            moving = np.zeros(self.model.size)
+            np.divide(self.beliefs, freeDegree, out=moving, where=freeDegree > 0)
+            new_beliefs = np.bincount(cols, weights=moving[rows], minlength=self.model.size) * free
+            
+            total = new_beliefs.sum()
+            if total > 0:
+                new_beliefs /= total
+            self.beliefs = new_beliefs
+        
+        self.nextMoveToObserve += 1
+    
+    def removePositions(self, positions):
+        """
+        Conditions the beliefs on Mr.X NOT being in any of positions (es: the positions of the cops).
+        """
+        self.beliefs[[pos for pos in positions if pos < self.model.size]] = 0
+        total = self.beliefs.sum()
+        if total > 0:
+            self.beliefs /= total
+    
+    def getBeliefsDistribution(self):
+        """
+        Returns (a copy of) the current beliefs distribution (util.Distribution).
+        """
+        return util.Distribution(self.beliefs.copy())
+
+
+class ApproximateInference:
+    """
+    A particle filter for the boards too big for the exact inference modules:
+    the beliefs are approximated by a fixed number of particles (GameConfig.getNumParticles()),
+    so memory and time of every update do not depend on the size of the board.
+    
+    Every hidden move each particle follows a random edge compatible with the ticket used,
+    it is weighted according to the positions of the cops (the same model of distributionFrom)
+    and then the particles are resampled.
+    """
+    def __init__(self, particles = None, nextMoveToObserve = 0, seed = None, config = None):
+        """
+        Initializes the particles uniformly over the legal positions.
+        config is the configuration of the game (GameConfig in settings.py), the default one if it is None.
+        """
+        self.config = getConfig(config)
+        self.layout = self.config.getLayout()
+        self.model = TransitionModel.forLayout(self.layout)
+        self.random = np.random.RandomState(seed)
+        self.nextMoveToObserve = nextMoveToObserve
+        
+        if particles is None:
+            self.particles = self._uniformParticles(self.config.getNumParticles(), self.config.getInitialCopsPositions())
+        else:
+            self.particles = particles
+    
+    def _uniformParticles(self, numParticles, excluded):
+        """
+        Samples numParticles nodes which have a station and are not in excluded (rejection sampling,
+        the legal positions are never listed).
+        Raises ValueError if there is no such node.
+        """
+        stations = np.frombuffer(self.layout.stations, dtype=np.uint8)
+        excluded = np.unique(np.asarray(excluded, dtype=np.int64))
+        excluded = excluded[(excluded >= 0) & (excluded < len(stations))]
+        if np.count_nonzero(stations) <= np.count_nonzero(stations[excluded]):
+            raise ValueError("no node with a station is free for the particles")
+        result = np.zeros(0, dtype=np.int64)
+        while len(result) < numParticles:
+            nodes = self.random.randint(0, self.model.size, numParticles)
+            nodes = nodes[(stations[nodes] > 0) & ~np.in1d(nodes, excluded)]
+            result = np.concatenate((result, nodes))
+        return result[:numParticles]
+    
+    def deepCopy(self):
+        return ApproximateInference(self.particles.copy(), self.nextMoveToObserve, config=self.config)
+    
+    def updateBeliefs(self, ticketList, notHiddenMoves, gameState):
+        """
+        Updates the particles according to the new evidences.
+        ticketList is the list of the tickets used by Mr.X
+        notHiddenMoves is a dictionary in the format { numberOfMove : position }
+        """
+        assert len(ticketList) == (self.nextMoveToObserve + 1), \
+                (len(ticketList), self.nextMoveToObserve + 1)
+        
+        if self.nextMoveToObserve+1 in notHiddenMoves:
+            self.particles[:] = notHiddenMoves[self.nextMoveToObserve+1]  # we are sure about the position of Mr.X
+        else:
+            ticket = ticketList[self.nextMoveToObserve]
+            cops = np.array(gameState.getCopPosition(), dtype=np.int64)
+            weights = self._propagate(ticket, cops)
+            total = weights.sum()
+            if total > 0:
+                self._resample(weights / total)
+            else:
+                # no particle survived: start again from the uniform distribution
+                self.particles = self._uniformParticles(len(self.particles), cops)
+        
+        self.nextMoveToObserve += 1
+    
+    def removePositions(self, positions):
+        """
+        Conditions the beliefs on Mr.X NOT being in any of positions (es: the positions of the cops):
+        the particles there are resampled among the others.
+        """
+        excluded = np.array(positions, dtype=np.int64)
+        keep = ~np.in1d(self.particles, excluded)
+        if keep.all():
+            return
+        if keep.any():
+            self._resample(keep / float(keep.sum()))
+        else:
+            self.particles = self._uniformParticles(len(self.particles), excluded)
+    
+    def _propagate(self, ticket, cops):
+        """
+        Moves every particle along a random edge of the ticket and returns the importance weights.
+        The particles move uniformly among all the edges, while Mr.X moves uniformly among the edges
+        towards a free node: the weight of a particle which ends on a free node is degree/freeDegree
+        of the node it comes from, 0 otherwise.
+        """
+        rows, cols = self.model.getMatrix(ticket)
+        offsets = self.model.getOffsets(ticket)
+        
+        starts = offsets[self.particles]
+        degree = offsets[self.particles + 1] - starts
+        
+        # the matrix is symmetric: the number of cops next to a node is the number of times
+        # the node appears among the neighbours of the cops
+        copNeighbours = np.sort(np.concatenate([cols[offsets[c]:offsets[c + 1]] for c in cops] +
+                                               [np.zeros(0, dtype=cols.dtype)]))
+        blocked = np.searchsorted(copNeighbours, self.particles, side='right') - \
+                  np.searchsorted(copNeighbours, self.particles, side='left')
+        freeDegree = degree - blocked
+        
+        canMove = degree > 0
+        choice = starts + (self.random.random_sample(len(self.particles)) * degree).astype(np.int64)
+        self.particles = np.where(canMove, cols[np.minimum(choice, len(cols) - 1)], self.particles)
+        
+        weights = np.zeros(len(self.particles))
+        valid = canMove & (freeDegree > 0) & ~np.in1d(self.particles, cops)
+        weights[valid] = degree[valid] / freeDegree[valid].astype(float)
+        return weights
+    
+    def _resample(self, weights):
+        """
+        Systematic resampling of the particles, according to the (normalized) weights.
+        """
+        numParticles = len(self.particles)
+        positions = (self.random.random_sample() + np.arange(numParticles)) / numParticles
+        indexes = np.searchsorted(np.cumsum(weights), positions)
+        self.particles = self.particles[np.minimum(indexes, numParticles - 1)]
+    
+    def getBeliefsDistribution(self):
+        """
+        Returns the current beliefs distribution (util.Distribution): the fraction of particles in every position.
+        """
+        counts = np.bincount(self.particles, minlength=self.model.size)
+        return util.Distribution(counts / float(len(self.particles)))
+
+
+def createInference(config=None):
+    """
+    Creates the inference module of the type specified in the configuration (INFERENCE_TYPE),
+    by default the Settings.
+    """
+    config = getConfig(config)
+    inference_type = config.getInferenceType() + "Inference"
+    return globals()[inference_type](config=config)
+
+
+class BeliefService:
+    """
+    The beliefs about the position of Mr.X of the whole team of cops: the game owns one service and
+    hands it to every cop (see Cop.setBeliefService), so that the beliefs are computed once for all of them.
+    - the inference module is updated once for every new move of Mr.X;
+    - the moves of the cops in between only remove their new positions from the beliefs (if Mr.X was
+      there he would have been caught);
+    - the cops get the same distribution, a read-only view which must NOT be modified.
+    No copy of the game state is needed: the inference only reads the evidences and the positions of the cops.
+    """
+    
+    def __init__(self, inference=None, config=None):
+        """
+        inference is the inference module (by default the one specified in config, see createInference).
+        """
+        if inference is None:
+            inference = createInference(config)
+        self.inference = inference
+        self.copSet = None # the positions of the cops already removed from the beliefs
+        self.distribution = None
+        self.stats = {"updates": 0, "remasks": 0}
+    
+    def getBeliefs(self, gameState):
+        """
+        Brings the beliefs up to date with the evidences and the positions of the cops in gameState
+        and returns the distribution (the same object until the beliefs change).
+        """
+        ticketList, notHiddenMoves = gameState.getMrXEvidences(verbose=False)
+        copSet = gameState.getCopSet()
+        changed = False
+        while self.inference.nextMoveToObserve < len(ticketList):
+            observed = self.inference.nextMoveToObserve + 1
+            self.inference.updateBeliefs(ticketList[:observed], notHiddenMoves, gameState)
+            self.stats["updates"] += 1
+            changed = True
+        if not changed and copSet != self.copSet:
+            self.inference.removePositions(sorted(copSet))
+            self.stats["remasks"] += 1
+            changed = True
+        self.copSet = copSet
+        
+        if changed or self.distribution is None:
+            self.distribution = self.inference.getBeliefsDistribution()
+            if isinstance(self.distribution, util.Distribution):
+                self.distribution.getArray().flags.writeable = False
+        return self.distribution
+    
+    def getStats(self):
+        """
+        Returns a dictionary with the number of forward updates and of re-masks.
+        """
+        return self.stats
+    
+
 if __name__ == "__main__":
     ei = ExactInference()
     # print ei.getBeliefsDistribution()
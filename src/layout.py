@@ -4,6 +4,12 @@ Created on 07/set/2016
 @author: Lorenzo Selvatici
 '''
 
+try:
+    import numpy as np
+except ImportError:  # numpy only speeds up the building of the adjacency index
+    np = None
+
+
 class EdgeType:
     """
     Enum representing the possible types of Edge.
@@ -22,23 +28,72 @@ class EdgeType:
     asList = staticmethod(asList)
 
 
+# compiled layout format (see compileLayout)
+COMPILED_EXTENSION = ".sylayout"
+COMPILED_MAGIC = "SYLAYOUT"
+COMPILED_VERSION = 1
+COMPILED_HEADER = "<8sIiiii" + "i"*len(EdgeType.asList()) # magic, version, numNodes, size, numEdges,
+                                                           # pathPoolSize, half-edges of every EdgeType
+
+
+class LayoutError(ValueError):
+    """
+    Raised when a layout file is malformed, errors is the list of all the malformed lines:
+    couples (line number, message).
+    """
+    
+    MAX_REPORTED = 20 # the number of errors in the message
+    
+    def __init__(self, fileName, errors):
+        lines = ["line %d : %s" % error for error in errors[:LayoutError.MAX_REPORTED]]
+        if len(errors) > LayoutError.MAX_REPORTED:
+            lines.append("... and %d more" % (len(errors) - LayoutError.MAX_REPORTED))
+        ValueError.__init__(self, "%s : %d malformed lines\n%s" % (fileName, len(errors), "\n".join(lines)))
+        self.fileName = fileName
+        self.errors = errors
+
+
+def _openText(fileName):
+    """
+    Opens a text file for reading, it is decompressed if its name ends with ".gz".
+    """
+    if fileName.endswith(".gz"):
+        import gzip
+        import io
+        return io.BufferedReader(gzip.open(fileName, "rb")) # buffered: much faster to read by lines
+    return open(fileName, "r")
+
+
 class Layout:
     
     """
     A layout stores all the static informations of the game: Node, edges, type of edges.
     
-    NOTE : you should use Settings.getLayout() static method rather than build it directly.
+    NOTE : you should use the getLayout method of the game configuration (GameConfig.getLayout, or the
+    static Settings.getLayout()) rather than build it directly: the layouts are shared.
     
     **IMPORTANT** : the edges do NOT have a specific direction (a Layout represents an undirected graph)
     
-    File format:
+    File format (the file can be gzip compressed, with the extension ".gz"):
+    <number of nodes>
     <EdgeType>; <start> : [<path>] : <end>
     <path> = integers separated by whitespaces    
+    A malformed file raises LayoutError, with all its malformed lines.
+    
+    A layout can also be loaded from a compiled file (COMPILED_EXTENSION, see compileLayout):
+    the file is memory-mapped, so it is neither parsed nor copied and many processes
+    can share the same physical copy of the map.
+    
+    Internally the layout is stored in flat typed buffers (indexed by node or by edge number):
+    - stations : the bitmask of the EdgeTypes of the stations of every node
+    - edgeStarts, edgeEnds, edgeTypes : the edges (the type is its index in EdgeType.asList())
+    - pathOffsets, pathPool : the path of edge i is pathPool[pathOffsets[i] : pathOffsets[i+1]]
+    - the adjacency index (see _buildIndex)
     """
     
     def __init__(self, layoutFileName):
         """
-        Builds a layout from the content of a .txt file.       
+        Builds a layout from the content of a .txt file (or of a compiled layout file).
         """
         import os
         assert type(layoutFileName) == type("string")
@@ -47,67 +102,278 @@ class Layout:
             baseDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
             layoutFileName = baseDirectory + os.sep + "Files" + os.sep + "layout.txt"
 
-        if not layoutFileName.endswith(".txt"):
+        if not layoutFileName.endswith((".txt", ".gz", COMPILED_EXTENSION)):
             layoutFileName = layoutFileName + ".txt"
         
         if not os.path.exists(layoutFileName):
             raise ValueError(layoutFileName + " does not exist.")
         
-        in_file = open(layoutFileName, "r")
-        lines = in_file.readlines()
-        
-        self.numNodes = int(lines[0])
-        self.edges = [] # list of tuples --> (start, end, type, path)
-        self.edge_types = set()
-        self.nodes = {} # dict --> numNodes : set(EdgeType)
-                        # store the information (stations) for every node
-        
-        for line in lines[1:]:
-            new_edge = self._processLine(line) # (int, int, EdgeType, [])
-            self.edges.append(new_edge)
-            # update the nodes dict
-            start, end, edge_type, _ = new_edge
-            if start not in self.nodes:
-                self.nodes[start] = set()
-            self.nodes[start].add(edge_type)
-            if end not in self.nodes:
-                self.nodes[end] = set()
-            self.nodes[end].add(edge_type)
-            
+        self.fileName = layoutFileName
+        self._nodes = None  # lazily built by getNodesStations
+        self._shared = {}  # the indexes built on the layout by other modules, see getShared
+        
+        if layoutFileName.endswith(COMPILED_EXTENSION):
+            self._loadCompiled(layoutFileName)
+        else:
+            self._loadText(layoutFileName)
+            self._buildIndex()
+    
+    def _loadText(self, layoutFileName):
+        """
+        Parses a layout text file (gzip compressed if its name ends with ".gz") line by line.
+        All the malformed lines are collected and reported at the end in a LayoutError.
+        """
+        from array import array
+        
+        self.edgeStarts = array('i')
+        self.edgeEnds = array('i')
+        self.edgeTypes = array('B')
+        self.pathOffsets = array('i', [0])
+        self.pathPool = array('i')
+        
+        codes = dict([(edge_type, code) for code, edge_type in enumerate(EdgeType.asList())])
+        seen = set() # the keys of the edges already loaded, to detect duplicates
+        errors = [] # (line number, message)
+        
+        in_file = _openText(layoutFileName)
+        try:
+            header = in_file.readline()
+            try:
+                self.numNodes = int(header)
+            except ValueError:
+                errors.append((1, "the first line must be the number of nodes : " + header.strip()))
+                self.numNodes = 0
+            maxNode = self.numNodes if self.numNodes > 0 else None # the nodes are not checked without a header
             
+            # the methods of the loop are looked up once (it runs once for every edge)
+            processLine, addSeen = self._processLine, seen.add
+            appendStart, appendEnd, appendType = self.edgeStarts.append, self.edgeEnds.append, self.edgeTypes.append
+            appendOffset, pathPool = self.pathOffsets.append, self.pathPool
+            for lineNumber, line in enumerate(in_file, 2):
+                try:
+                    start, end, code, path = processLine(line, codes, maxNode)
+                except ValueError, message:
+                    if line.strip() != "": # the blank lines are ignored
+                        errors.append((lineNumber, "%s : %s" % (message, line.strip())))
+                    continue
+                # an edge without path (most of them) is identified by an integer, which is smaller than a tuple
+                key = (start, end, code, path) if path else (start << 32 | end) << 3 | code
+                if key in seen:
+                    errors.append((lineNumber, "duplicated edge : " + line.strip()))
+                    continue
+                addSeen(key)
+                appendStart(start)
+                appendEnd(end)
+                appendType(code)
+                if path:
+                    pathPool.extend(path)
+                appendOffset(len(pathPool))
+        finally:
+            in_file.close()
         
-        in_file.close()
+        if errors:
+            raise LayoutError(layoutFileName, errors)
         
-    def _processLine(self, line):
-        if ';' not in line:
-            raise ValueError("Wrong line format (missing ;) : " + line)
-        edge_type, descr = line.strip().split(";")
-        edge_type = edge_type.upper()
-        if edge_type not in EdgeType.asList():
-            raise ValueError("Wrong edge edge_type: " + edge_type.upper())
+        # the size of the arrays indexed by node (nodes are numbered from 1)
+        self.size = max([self.numNodes] + [max(self.edgeEnds or [0])]) + 1  # end > start
+        if np is not None:
+            starts, ends, types = self._getEdgeArrays()
+            stations = np.zeros(self.size, np.uint8)
+            for code in range(len(EdgeType.asList())):
+                ofType = types == code
+                stations[starts[ofType]] |= 1 << code
+                stations[ends[ofType]] |= 1 << code
+            self.stations = _toArray(stations, 'B')
+            return
+        self.stations = array('B', [0]) * self.size
+        for i in range(len(self.edgeStarts)):
+            bit = 1 << self.edgeTypes[i]
+            self.stations[self.edgeStarts[i]] |= bit
+            self.stations[self.edgeEnds[i]] |= bit
+    
+    def _processLine(self, line, codes, maxNode=None):
+        """
+        Parses a line of a layout file, returns the edge (start, end, code of the EdgeType, path) with start < end.
+        The nodes must be in [1, maxNode] (maxNode is the number of nodes of the header, None not to check it).
+        Raises ValueError if the line is malformed.
+        """
+        edge_type, separator, descr = line.partition(";")
+        if separator == "":
+            raise ValueError("wrong line format (missing ;)")
+        code = codes.get(edge_type.strip().upper())
+        if code is None:
+            raise ValueError("wrong edge type " + edge_type.strip())
         
-        self.edge_types.add(edge_type)
+        fields = descr.split(":")
+        if len(fields) != 3:
+            raise ValueError("wrong edge format (<start> : [<path>] : <end>)")
+        try:
+            start, end = int(fields[0]), int(fields[2])
+            path = fields[1].split()
+            if path:
+                path = tuple([int(x) for x in path])
+        except ValueError:
+            raise ValueError("the nodes must be integers")
         
-        start, path, end = descr.strip().split(":")
-        start, end = int(start), int(end)
-        path = path.strip()
-        if path == "":
-            path = []
+        if start < 1 or end < 1:
+            raise ValueError("the nodes are numbered from 1")
+        if maxNode is not None and max(start, end) > maxNode:
+            raise ValueError("the nodes are numbered up to %d (the number of nodes)" % maxNode)
+        if start == end:
+            raise ValueError("the start and the end are the same node")
+        if path:
+            if min(path) < 1:
+                raise ValueError("the nodes are numbered from 1")
+            if maxNode is not None and max(path) > maxNode:
+                raise ValueError("the nodes are numbered up to %d (the number of nodes)" % maxNode)
+            if start in path or end in path:
+                raise ValueError("the start or the end is in the path")
         else:
-            path = [int(x) for x in path.split(" ")]
+            path = ()
         
-        assert (start not in path and end not in path)
-        assert (not start == end)
-        
-        if start>end:
+        if start > end:
             start, end = end, start
-            
-        edge = (start, end, edge_type, path)
+        return start, end, code, path
+    
+    def _buildIndex(self):
+        """
+        Builds the adjacency index of the layout, so that the queries about the neighbourhood of a node
+        cost O(degree) instead of a scan of all the edges.
+        
+        The index is stored in CSR style (flat arrays of integers):
+        the half-edges leaving node n are at positions [offsets[n], offsets[n+1]) of the arrays
+        ends (the node on the other side) and edgeIds (the number of the edge).
+        One index contains all the edges (in the same order of the file), then there is one index
+        for every EdgeType.
+        """
+        if np is not None:
+            return self._buildIndexNumpy()
+        
+        from array import array
+        
+        size = self.size
+        
+        def build(edgeIds):
+            degrees = array('i', [0]) * (size + 1)
+            for i in edgeIds:
+                degrees[self.edgeStarts[i] + 1] += 1
+                degrees[self.edgeEnds[i] + 1] += 1
+            offsets = degrees # prefix sums, in place
+            for n in range(1, size + 1):
+                offsets[n] += offsets[n - 1]
+            ends = array('i', [0]) * offsets[size]
+            ids = array('i', [0]) * offsets[size]
+            nextFree = offsets[:size]
+            for i in edgeIds:
+                start, end = self.edgeStarts[i], self.edgeEnds[i]
+                for a, b in ((start, end), (end, start)):
+                    ends[nextFree[a]] = b
+                    ids[nextFree[a]] = i
+                    nextFree[a] += 1
+            return offsets, ends, ids
+        
+        numEdges = len(self.edgeStarts)
+        self._index = build(range(numEdges))
+        self._typeIndex = {}
+        for code, edge_type in enumerate(EdgeType.asList()):
+            ids = [i for i in range(numEdges) if self.edgeTypes[i] == code]
+            self._typeIndex[edge_type] = build(ids)
+    
+    def _getEdgeArrays(self):
+        """
+        Returns the numpy arrays of the starts, the ends and the types (codes) of the edges.
+        """
+        return (np.frombuffer(self.edgeStarts.tostring(), np.int32), np.frombuffer(self.edgeEnds.tostring(), np.int32),
+                np.frombuffer(self.edgeTypes.tostring(), np.uint8))
+    
+    def _buildIndexNumpy(self):
+        """
+        Builds the same index of _buildIndex (the half-edges in the same order) with numpy.
+        """
+        size = self.size
+        starts, ends, types = self._getEdgeArrays()
         
-        assert edge not in self.edges
+        def build(edgeIds):
+            sources = np.empty(2 * len(edgeIds), np.int32) # the half-edges of edge i are at 2i (start) and 2i+1 (end)
+            sources[0::2], sources[1::2] = starts[edgeIds], ends[edgeIds]
+            targets = np.empty(2 * len(edgeIds), np.int32)
+            targets[0::2], targets[1::2] = ends[edgeIds], starts[edgeIds]
+            order = np.argsort(sources, kind="mergesort") # stable: by node, then by edge
+            offsets = np.zeros(size + 1, np.int32)
+            offsets[1:] = np.cumsum(np.bincount(sources, minlength=size))
+            return (_toArray(offsets, 'i'), _toArray(targets[order], 'i'),
+                    _toArray(np.repeat(edgeIds, 2)[order], 'i'))
         
-        return edge
+        self._index = build(np.arange(len(starts), dtype=np.int32))
+        self._typeIndex = {}
+        for code, edge_type in enumerate(EdgeType.asList()):
+            self._typeIndex[edge_type] = build(np.flatnonzero(types == code).astype(np.int32))
+    
+    def _loadCompiled(self, layoutFileName):
+        """
+        Maps a compiled layout file in memory, the buffers are ctypes arrays over the mapped pages.
+        The mapping is copy-on-write (ACCESS_COPY) and the layout never writes to it, thus all the
+        processes which load the same file share its pages.
+        """
+        import ctypes
+        import mmap
+        import struct
+        
+        in_file = open(layoutFileName, "rb")
+        self._mmap = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_COPY)
+        in_file.close()  # the mapping stays valid
+        
+        header = struct.unpack_from(COMPILED_HEADER, self._mmap, 0)
+        magic, version, self.numNodes, self.size, numEdges, poolSize = header[:6]
+        if magic != COMPILED_MAGIC or version != COMPILED_VERSION:
+            raise ValueError(layoutFileName + " is not a compiled layout (version " +
+                             str(COMPILED_VERSION) + ").")
+        halfEdges = header[6:]
+        
+        self._offset = _align(struct.calcsize(COMPILED_HEADER))
+        def view(ctype, length):
+            buf = (ctype * length).from_buffer(self._mmap, self._offset)
+            self._offset = _align(self._offset + ctypes.sizeof(buf))
+            return buf
+        
+        size = self.size
+        self.stations = view(ctypes.c_uint8, size)
+        self.edgeStarts = view(ctypes.c_int32, numEdges)
+        self.edgeEnds = view(ctypes.c_int32, numEdges)
+        self.edgeTypes = view(ctypes.c_uint8, numEdges)
+        self.pathOffsets = view(ctypes.c_int32, numEdges + 1)
+        self.pathPool = view(ctypes.c_int32, poolSize)
+        self._index = (view(ctypes.c_int32, size + 1), view(ctypes.c_int32, 2*numEdges),
+                       view(ctypes.c_int32, 2*numEdges))
+        self._typeIndex = {}
+        for edge_type, count in zip(EdgeType.asList(), halfEdges):
+            self._typeIndex[edge_type] = (view(ctypes.c_int32, size + 1), view(ctypes.c_int32, count),
+                                          view(ctypes.c_int32, count))
+        del self._offset
+    
+    def _getIndex(self, edgeType):
+        if edgeType is None:
+            return self._index
+        return self._typeIndex[edgeType]
+        
+    def _getEdge(self, i):
+        """
+        Returns the edge number i as a tuple (start, end, edgeType, path)
+        """
+        path = list(self.pathPool[self.pathOffsets[i]:self.pathOffsets[i+1]])
+        return (self.edgeStarts[i], self.edgeEnds[i], EdgeType.asList()[self.edgeTypes[i]], path)
         
+    def getShared(self, key, build=None):
+        """
+        Returns the object of the key built on the layout (es: its MoveTable, see MoveTable.forLayout),
+        it is built by build(layout) the first time (by default key is the class of the object).
+        The objects are stored in the layout, thus they live as long as the layout.
+        """
+        shared = self._shared.get(key)
+        if shared is None:
+            shared = self._shared[key] = (build or key)(self)
+        return shared
+    
     def getNumNodes(self):
         """
         Returns the number of nodes.
@@ -119,13 +385,25 @@ class Layout:
         Returns the dict which associates a node with its type of stations.
         example --> 5 : (TAXI, BUS) 
         """
-        return self.nodes
+        if self._nodes is None:
+            self._nodes = {} # dict --> numNodes : set(EdgeType)
+            types = EdgeType.asList()
+            for n in range(self.size):
+                if self.stations[n]:
+                    self._nodes[n] = set([t for k, t in enumerate(types) if self.stations[n] >> k & 1])
+        return self._nodes
     
     def getEdgeTypes(self):
         """
         Returns the different types of the Edges as a set.
         """
-        return self.edge_types
+        return set([edge_type for edge_type in EdgeType.asList() if len(self._typeIndex[edge_type][1]) > 0])
+    
+    def getNumEdges(self):
+        """
+        Returns the number of edges.
+        """
+        return len(self.edgeStarts)
     
     def getEdges(self):
         """
@@ -133,30 +411,134 @@ class Layout:
         Each element is a tuple in the following format: 
         (start, end, edgeType, path) - (int, int, EdgeType, [])
         """
-        return self.edges
+        return [self._getEdge(i) for i in range(self.getNumEdges())]
     
-    def getEdgesFromNode(self, nodeNumber):
+    def getEdgesFromNode(self, nodeNumber, edgeType=None):
         """
-        Returns the edges from a given node.
+        Returns the edges from a given node (optionally only the ones of the given EdgeType).
+        Each edge is oriented so that nodeNumber is its start: (nodeNumber, end, edgeType, path)
         """
-        edges = [edge for edge in self.edges if edge[0]==nodeNumber or edge[1]==nodeNumber]
-        for i, edge in enumerate(edges):
-            if edges[i][0] != nodeNumber:  # swap start and end
-                edges[i] = edges[i][1], edges[i][0], edges[i][2], edges[i][3]
+        offsets, ends, ids = self._getIndex(edgeType)
+        if not 0 <= nodeNumber < len(offsets) - 1:
+            return []
+        edges = []
+        for k in range(offsets[nodeNumber], offsets[nodeNumber + 1]):
+            _, _, edge_type, path = self._getEdge(ids[k])
+            edges.append((nodeNumber, ends[k], edge_type, path))
         return edges
     
+    def getNeighbours(self, nodeNumber, edgeType=None):
+        """
+        Returns the list of the nodes linked to nodeNumber by an edge of the given EdgeType
+        (any type if edgeType is None).
+        A node appears once for every edge which links it to nodeNumber.
+        """
+        offsets, ends, _ = self._getIndex(edgeType)
+        if not 0 <= nodeNumber < len(offsets) - 1:
+            return []
+        return list(ends[offsets[nodeNumber]:offsets[nodeNumber + 1]])
+    
+    def getAdjacency(self, edgeType=None):
+        """
+        Returns the adjacency index (of the edges of the given EdgeType, all the edges if edgeType is None)
+        as a tuple of two flat buffers of integers (offsets, ends): the neighbours of node n are
+        ends[offsets[n] : offsets[n+1]].
+        It is meant for the modules which process the whole graph at once (es: inference),
+        the buffers must NOT be modified.
+        """
+        offsets, ends, _ = self._getIndex(edgeType)
+        return offsets, ends
+    
+    def getDegree(self, nodeNumber, edgeType=None):
+        """
+        Returns the number of edges (of the given EdgeType, any type if edgeType is None) of nodeNumber.
+        """
+        offsets = self._getIndex(edgeType)[0]
+        if not 0 <= nodeNumber < len(offsets) - 1:
+            return 0
+        return offsets[nodeNumber + 1] - offsets[nodeNumber]
+    
+    def __getinitargs__(self):
+        # a layout is pickled (es: sent to a worker process) as the name of its file
+        return (self.fileName,)
+    
+    def __getstate__(self):
+        return {}
+    
+    def __setstate__(self, state):
+        pass
+    
     def __eq__(self, other):
-        return self.numNodes == other.numNodes and self.edges==other.edges
-        
-        
+        if self is other:
+            return True
+        return self.numNodes == other.numNodes and self.getEdges()==other.getEdges()
 
 
-if __name__ == '__main__':
-    layout = Layout("C:\Users\Selvatici\Desktop\Python\Projects\Scotland Yard - Project\ScotlandYard\Files\layout.txt")
-    #print layout.getNumNodes()
-    #print layout.getEdgeTypes()
-    print layout.getEdges()
-    #print layout.getEdgesFromNode(5)
+def _toArray(values, typecode):
+    """
+    Returns a numpy array as an array.array of the given typecode ('i' for int32, 'B' for uint8).
+    """
+    from array import array
+    result = array(typecode)
+    result.fromstring(values.astype({'i': np.int32, 'B': np.uint8}[typecode]).tostring())
+    return result
+
 
+def _align(offset, alignment=8):
+    return (offset + alignment - 1) // alignment * alignment
 
 
+def compileLayout(layoutFileName, compiledFileName=None):
+    """
+    Compiles a layout text file (or a compressed one) into the binary format loaded by Layout with mmap.
+    Returns the name of the compiled file (by default the name of the text file with COMPILED_EXTENSION).
+    
+    The file contains a header (COMPILED_HEADER) followed by the flat buffers of the layout
+    (little endian, every buffer aligned to 8 bytes):
+    stations (uint8), edgeStarts, edgeEnds (int32), edgeTypes (uint8), pathOffsets, pathPool (int32),
+    then the adjacency index (offsets, ends, edgeIds as int32) of all the edges and of every EdgeType.
+    """
+    import struct
+    import sys
+    from array import array
+    
+    layout = Layout(layoutFileName)
+    if compiledFileName is None:
+        baseName = layout.fileName[:-len(".gz")] if layout.fileName.endswith(".gz") else layout.fileName
+        compiledFileName = (baseName[:-len(".txt")] if baseName.endswith(".txt") else baseName) + COMPILED_EXTENSION
+    
+    buffers = [layout.stations, layout.edgeStarts, layout.edgeEnds, layout.edgeTypes,
+               layout.pathOffsets, layout.pathPool]
+    buffers.extend(layout._index)
+    for edge_type in EdgeType.asList():
+        buffers.extend(layout._typeIndex[edge_type])
+    halfEdges = [len(layout._typeIndex[edge_type][1]) for edge_type in EdgeType.asList()]
+    
+    out_file = open(compiledFileName, "wb")
+    header = struct.pack(COMPILED_HEADER, COMPILED_MAGIC, COMPILED_VERSION, layout.numNodes, layout.size,
+                         layout.getNumEdges(), len(layout.pathPool), *halfEdges)
+    out_file.write(header)
+    written = len(header)
+    for buf in buffers:
+        out_file.write("\0" * (_align(written) - written))
+        written = _align(written)
+        buf = array(buf.typecode, buf)
+        if sys.byteorder != "little":
+            buf.byteswap()
+        data = buf.tostring()
+        out_file.write(data)
+        written += len(data)
+    out_file.close()
+    return compiledFileName
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1: # python layout.py <layout.txt> [<compiled file>]
+        print "Compiled layout: " + compileLayout(*sys.argv[1:3])
+    else:
+        layout = Layout("DEFAULT")
+        #print layout.getNumNodes()
+        #print layout.getEdgeTypes()
+        print layout.getEdges()
+        #print layout.getEdgesFromNode(5)
@@ -0,0 +1,257 @@
+'''
+Generator of synthetic layouts (see the file format in layout.py), to measure how the game scales
+on boards from a thousand to a million nodes.
+
+The kinds of board:
+- "grid" : a mesh of TAXI edges between adjacent nodes (numbered row by row from 1), with BUS and UNDERGROUND
+           lines along a fraction (the density) of the rows and of the columns, stopping every few nodes
+           (their path is the nodes in between)
+- "geometric" : a random geometric graph, nodes scattered in the unit square: TAXI edges between the nodes
+                closer than a radius, BUS and UNDERGROUND edges between the nodes which are stops
+                (a fraction, the density, of them) closer than a multiple of the radius
+Both can have some FERRY links between random nodes, with a path across the board.
+
+The edges are written to the file as they are generated, the graph is never kept in memory
+(only O(sqrt(numNodes)) nodes are). The same seed (and options) gives the same file.
+A file name ending with ".gz" is compressed.
+
+NOTE : some nodes of a sparse board may have no edge at all (thus no station).
+
+Command line usage:
+python layoutgen.py grid 10000 grid.txt --seed 1 --bus 0.3 --underground 0.1 --ferries 5
+python layoutgen.py geometric 1000000 big.txt.gz --degree 4
+'''
+
+import math
+import random
+
+
+def _route(points):
+    """
+    Returns the list of the nodes of points without repetitions, in order.
+    """
+    seen = set()
+    return [n for n in points if n not in seen and not seen.add(n)]
+
+
+def _ferryEdges(count, numNodes, route, rng):
+    """
+    Yields count FERRY edges between random nodes, route(start, end) gives the nodes the ferry passes by.
+    """
+    linked = set()
+    attempts = 0
+    while len(linked) < count and attempts < 100 * count:
+        attempts += 1
+        start, end = rng.randint(1, numNodes), rng.randint(1, numNodes)
+        if start == end or (min(start, end), max(start, end)) in linked:
+            continue
+        linked.add((min(start, end), max(start, end)))
+        yield "FERRY", start, [n for n in _route(route(start, end)) if n != start and n != end], end
+
+
+def gridEdges(numNodes, width=None, taxiDensity=1.0, busDensity=0.3, undergroundDensity=0.1,
+              busStep=3, undergroundStep=8, ferries=0, seed=0):
+    """
+    Yields the edges (edgeType, start, path, end) of a grid board of numNodes nodes, width nodes per row
+    (the square root of numNodes by default).
+    taxiDensity is the fraction of the TAXI edges of the mesh which are kept, busDensity (undergroundDensity)
+    the fraction of the rows and of the columns with a BUS (UNDERGROUND) line, which stops every busStep
+    (undergroundStep) nodes.
+    """
+    rng = random.Random(seed)
+    if width is None:
+        width = int(math.ceil(math.sqrt(numNodes)))
+    height = (numNodes + width - 1) // width
+    
+    def node(row, column):
+        number = row * width + column + 1
+        if row >= height or column >= width or number > numNodes:
+            return None
+        return number
+    
+    # the rows and the columns with a line: [(edgeType, step, rows with the line, columns with the line)]
+    lines = [(edgeType, step, set([r for r in range(height) if rng.random() < density]),
+              set([c for c in range(width) if rng.random() < density]))
+             for edgeType, step, density in (("BUS", busStep, busDensity),
+                                             ("UNDERGROUND", undergroundStep, undergroundDensity))]
+    
+    for row in range(height):
+        for column in range(width):
+            start = node(row, column)
+            if start is None:
+                break
+            for end in (node(row, column + 1), node(row + 1, column)):
+                if end is not None and (taxiDensity >= 1 or rng.random() < taxiDensity):
+                    yield "TAXI", start, [], end
+            for edgeType, step, rows, columns in lines:
+                if row in rows and column % step == 0 and node(row, column + step) is not None:
+                    yield edgeType, start, [node(row, column + i) for i in range(1, step)], node(row, column + step)
+                if column in columns and row % step == 0 and node(row + step, column) is not None:
+                    yield edgeType, start, [node(row + i, column) for i in range(1, step)], node(row + step, column)
+    
+    def route(start, end):  # along the row of start, then along the column of end
+        (r1, c1), (r2, c2) = divmod(start - 1, width), divmod(end - 1, width)
+        dc, dr = (1 if c2 >= c1 else -1), (1 if r2 >= r1 else -1)
+        return [node(r1, c) for c in range(c1, c2 + dc, dc)] + [node(r, c2) for r in range(r1, r2 + dr, dr)]
+    
+    for edge in _ferryEdges(ferries, numNodes, route, rng):
+        yield edge
+
+
+class _Cells:
+    """
+    The nodes of a geometric board, in a side x side grid of square cells: cell i has the nodes
+    (numbered consecutively, cell by cell) firstNode(i) ... firstNode(i+1)-1.
+    The points of a cell are drawn from a generator seeded by the cell, so they can be computed again
+    at any time instead of being stored.
+    """
+    
+    def __init__(self, numNodes, side, seed, busDensity, undergroundDensity):
+        self.side = side
+        self.base, self.extra = divmod(numNodes, side * side) # the first extra cells have base+1 nodes
+        self.seed = seed
+        self.densities = (busDensity, undergroundDensity)
+    
+    def firstNode(self, cell):
+        return cell * self.base + min(cell, self.extra) + 1
+    
+    def cellOf(self, node):
+        big = self.extra * (self.base + 1) # the nodes of the bigger cells
+        if node - 1 < big:
+            return (node - 1) // (self.base + 1)
+        return self.extra + (node - 1 - big) // self.base
+    
+    def points(self, cell):
+        """
+        Returns the list of the points (node, x, y, is a BUS stop, is an UNDERGROUND stop) of a cell.
+        """
+        rng = random.Random(self.seed * 1000003 + cell)
+        row, column = divmod(cell, self.side)
+        first = self.firstNode(cell)
+        busDensity, undergroundDensity = self.densities
+        return [(first + i, (column + rng.random()) / self.side, (row + rng.random()) / self.side,
+                 rng.random() < busDensity, rng.random() < undergroundDensity)
+                for i in range(self.firstNode(cell + 1) - first)]
+
+
+def geometricEdges(numNodes, averageDegree=4.0, busDensity=0.2, undergroundDensity=0.03,
+                   busReach=2, undergroundReach=4, ferries=0, seed=0):
+    """
+    Yields the edges (edgeType, start, path, end) of a random geometric board of numNodes nodes.
+    The radius of the TAXI edges is such that a node has about averageDegree of them,
+    busDensity (undergroundDensity) is the fraction of the nodes which are BUS (UNDERGROUND) stops,
+    two stops are linked if they are closer than busReach (undergroundReach) radiuses.
+    """
+    side = max(1, int(round(math.sqrt(numNodes * math.pi / averageDegree)))) # about averageDegree/pi nodes per cell
+    radius = 1.0 / side # the side of a cell
+    cells = _Cells(numNodes, side, seed, busDensity, undergroundDensity)
+    kinds = [("TAXI", 1, None)] # (edgeType, reach in cells, index of the stop flag in the points)
+    if busDensity > 0:
+        kinds.append(("BUS", busReach, 3))
+    if undergroundDensity > 0:
+        kinds.append(("UNDERGROUND", undergroundReach, 4))
+    maxReach = max([reach for _, reach, _ in kinds])
+    
+    def pointsByKind(cell):
+        points = cells.points(cell)
+        return [[p for p in points if flag is None or p[flag]] for _, _, flag in kinds]
+    
+    window = {} # row of cells --> for every cell, the points of every kind (only the rows which can still be linked)
+    for row in range(side):
+        for r in range(row, min(row + maxReach + 1, side)):
+            if r not in window:
+                window[r] = [pointsByKind(r * side + c) for c in range(side)]
+        window.pop(row - 1, None)
+        for column in range(side):
+            for k, (edgeType, reach, _) in enumerate(kinds):
+                own = window[row][column][k]
+                if not own:
+                    continue
+                limit = (reach * radius) ** 2
+                # the cells after this one: the rest of the row, then the next reach rows
+                others = [p for c in range(column + 1, min(column + reach + 1, side)) for p in window[row][c][k]]
+                others += [p for r in range(row + 1, min(row + reach + 1, side))
+                           for c in range(max(0, column - reach), min(column + reach + 1, side))
+                           for p in window[r][c][k]]
+                for i, (start, x, y, _, _) in enumerate(own):
+                    for end, x2, y2, _, _ in own[i + 1:] + others:
+                        if (x - x2) ** 2 + (y - y2) ** 2 <= limit:
+                            yield edgeType, start, [], end
+    
+    def route(start, end):  # a node of every cell the straight line crosses
+        (_, x1, y1, _, _), (_, x2, y2, _, _) = [[p for p in cells.points(cells.cellOf(n)) if p[0] == n][0]
+                                                for n in (start, end)]
+        steps = int(math.hypot(x2 - x1, y2 - y1) / radius) + 1
+        crossed = [min(int((y1 + (y2 - y1) * i / steps) * side), side - 1) * side +
+                   min(int((x1 + (x2 - x1) * i / steps) * side), side - 1) for i in range(steps + 1)]
+        return [cells.firstNode(cell) for cell in crossed if cells.firstNode(cell + 1) > cells.firstNode(cell)]
+    
+    for edge in _ferryEdges(ferries, numNodes, route, random.Random(seed)):
+        yield edge
+
+
+GENERATORS = {"grid": gridEdges, "geometric": geometricEdges}
+
+
+def writeLayout(fileName, numNodes, edges):
+    """
+    Writes a layout file (compressed if fileName ends with ".gz") with the edges (edgeType, start, path, end)
+    as they are yielded. Returns the number of edges.
+    """
+    if fileName.endswith(".gz"):
+        import gzip
+        out_file = gzip.open(fileName, "wb", 6)
+    else:
+        out_file = open(fileName, "w")
+    numEdges = 0
+    try:
+        out_file.write("%d\n" % numNodes)
+        for edgeType, start, path, end in edges:
+            middle = " " + " ".join([str(n) for n in path]) + " " if path else " "
+            out_file.write("%s; %d :%s: %d\n" % (edgeType, start, middle, end))
+            numEdges += 1
+    finally:
+        out_file.close()
+    return numEdges
+
+
+def generate(fileName, kind, numNodes, seed=0, **options):
+    """
+    Writes a synthetic layout of the given kind ("grid" or "geometric") with numNodes nodes,
+    the options are the ones of gridEdges or geometricEdges. Returns the number of edges.
+    """
+    return writeLayout(fileName, numNodes, GENERATORS[kind](numNodes, seed=seed, **options))
+
+
+def main(argv=None):
+    import argparse
+    import sys
+    import time
+    
+    parser = argparse.ArgumentParser(description="Writes a synthetic layout file.")
+    parser.add_argument("kind", choices=sorted(GENERATORS.keys()), help="the kind of board")
+    parser.add_argument("nodes", type=int, help="number of nodes")
+    parser.add_argument("output", help="the layout file (.txt, or .gz to compress it)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generator")
+    parser.add_argument("--bus", type=float, default=None, help="density of the BUS lines (or stops)")
+    parser.add_argument("--underground", type=float, default=None, help="density of the UNDERGROUND lines (or stops)")
+    parser.add_argument("--ferries", type=int, default=0, help="number of FERRY links")
+    parser.add_argument("--degree", type=float, default=None, help="average TAXI degree (geometric boards)")
+    args = parser.parse_args(argv)
+    if args.degree is not None and args.kind != "geometric":
+        parser.error("--degree is an option of the geometric boards")
+    
+    options = {"ferries": args.ferries}
+    if args.bus is not None:
+        options["busDensity"] = args.bus
+    if args.underground is not None:
+        options["undergroundDensity"] = args.underground
+    if args.degree is not None:
+        options["averageDegree"] = args.degree
+    startTime = time.time()
+    numEdges = generate(args.output, args.kind, args.nodes, args.seed, **options)
+    sys.stderr.write("%d nodes, %d edges in %.2f s\n" % (args.nodes, numEdges, time.time() - startTime))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+'''
+Opt-in profiling of the phases of a game: the calls, the total time and the latency percentiles
+(p50, p99) of every phase, also per agent.
+
+Nothing is measured (and nothing costs anything) until enable is called: enable replaces the profiled
+methods (see PHASES) with timed wrappers, disable puts the original methods back.
+The agents' thinking (getAction) and the rendering (the display's onEvent) are timed by Game.run
+when a profiler is active.
+
+NOTE : the times are exclusive (self times): the time of the timed calls nested in a call is recorded in their
+phase only, es: the getLegalActions called by a search agent are not part of its getAction and the applyAction
+of generateSuccessor is not part of generateSuccessor. Thus the phases add up to (at most) the time of the game.
+
+Usage:
+profiler = profiling.enable()
+Game(...).run()
+profiling.disable()
+profiler.dump("profile.json")     # or profiler.getSummary()
+'''
+
+import json
+from array import array
+from timeit import default_timer as clock
+
+from game import GameState
+from inference import ExactInference, VectorizedExactInference, ApproximateInference
+from rules import Rules
+
+
+def _agentOfAgent(args):
+    return args[0].index # (agent, gameStateData)
+
+
+def _agentOfIndex(args):
+    return args[1] # (self, agentIndex, action)
+
+
+def _noAgent(args):
+    return None
+
+
+# the profiled methods: (class, name of the method, phase, function returning the agent index from the arguments)
+PHASES = [(GameState, "generateSuccessor", "generateSuccessor", _agentOfIndex),
+          (GameState, "applyAction", "applyAction", _agentOfIndex),
+          (GameState, "isEndState", "isEndState", _noAgent),
+          (Rules, "getLegalActions", "getLegalActions", _agentOfAgent),
+          (ExactInference, "updateBeliefs", "updateBeliefs", _noAgent),
+          (VectorizedExactInference, "updateBeliefs", "updateBeliefs", _noAgent),
+          (ApproximateInference, "updateBeliefs", "updateBeliefs", _noAgent)]
+
+
+def percentile(sortedSamples, p):
+    """
+    Returns the p-th percentile (0 <= p <= 100, nearest rank) of a sorted list of samples, None if it is empty.
+    """
+    if len(sortedSamples) == 0:
+        return None
+    rank = int(round(p / 100.0 * (len(sortedSamples) - 1)))
+    return sortedSamples[rank]
+
+
+class Profiler:
+    """
+    Collects the durations (in seconds) of the calls of every phase, for every agent
+    (the agent is None for the phases which do not belong to an agent, es: isEndState).
+    """
+    
+    def __init__(self):
+        self.samples = {} # (phase, agentIndex) --> array of durations
+        self.nested = [0.0] # the time of the timed calls nested in every running timed call (see start)
+    
+    def record(self, phase, seconds, agentIndex=None):
+        key = (phase, agentIndex)
+        samples = self.samples.get(key)
+        if samples is None:
+            samples = self.samples[key] = array("d")
+        samples.append(seconds)
+    
+    def start(self):
+        """
+        Starts timing a call, returns the start time to pass to stop.
+        """
+        self.nested.append(0.0)
+        return clock()
+    
+    def stop(self, phase, startTime, agentIndex=None):
+        """
+        Records the call started at startTime (see start) in the phase: its duration but the time
+        of the timed calls nested in it.
+        """
+        duration = clock() - startTime
+        nested = self.nested.pop()
+        self.nested[-1] += duration
+        self.record(phase, duration - nested, agentIndex)
+    
+    def wrap(self, function, phase, agentIndex=None):
+        """
+        Returns a version of function whose calls are recorded in the phase.
+        """
+        start, stop = self.start, self.stop
+        def timed(*args, **kwargs):
+            startTime = start()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stop(phase, startTime, agentIndex)
+        return timed
+    
+    def _stats(self, samples):
+        samples = sorted(samples)
+        total = sum(samples)
+        return {"calls": len(samples), "total": total, "mean": total / len(samples),
+                "p50": percentile(samples, 50), "p99": percentile(samples, 99), "max": samples[-1]}
+    
+    def getSummary(self):
+        """
+        Returns a dictionary (it can be dumped as JSON):
+        - "phases" : phase --> statistics of all its calls
+        - "agents" : agent index (a string) --> phase --> statistics of the calls of the agent
+        The statistics are a dictionary with the keys "calls", "total", "mean", "p50", "p99", "max" (seconds).
+        """
+        phases = {}
+        agents = {}
+        for (phase, agentIndex), samples in self.samples.items():
+            phases.setdefault(phase, array("d")).extend(samples)
+            if agentIndex is not None:
+                agents.setdefault(str(agentIndex), {})[phase] = self._stats(samples)
+        return {"phases": dict([(phase, self._stats(samples)) for phase, samples in phases.items()]),
+                "agents": agents}
+    
+    def dump(self, fileName):
+        """
+        Writes the summary (see getSummary) to a JSON file.
+        """
+        with open(fileName, "w") as out_file:
+            json.dump(self.getSummary(), out_file, indent=2, sort_keys=True)
+
+
+_profiler = None # the active profiler
+_originals = [] # (class, name, original attribute) of the wrapped methods
+
+
+def _install(owner, name, phase, agentOf):
+    original = owner.__dict__[name]
+    if isinstance(original, staticmethod):
+        function = original.__get__(None, owner)
+    else:
+        function = original
+    
+    def timed(*args, **kwargs):
+        profiler = _profiler
+        startTime = profiler.start()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.stop(phase, startTime, agentOf(args))
+    timed.__name__ = name
+    timed.__doc__ = function.__doc__
+    
+    if isinstance(original, staticmethod):
+        setattr(owner, name, staticmethod(timed))
+    else:
+        setattr(owner, name, timed)
+    _originals.append((owner, name, original))
+
+
+def enable():
+    """
+    Starts profiling with a new profiler, which is returned.
+    """
+    global _profiler
+    _profiler = Profiler()
+    if not _originals:
+        for owner, name, phase, agentOf in PHASES:
+            _install(owner, name, phase, agentOf)
+    return _profiler
+
+
+def disable():
+    """
+    Stops profiling: the original methods are restored. Returns the profiler which was active (None if none was).
+    """
+    global _profiler
+    for owner, name, original in reversed(_originals):
+        setattr(owner, name, original)
+    del _originals[:]
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def getProfiler():
+    """
+    Returns the active profiler, None if profiling is disabled.
+    """
+    return _profiler
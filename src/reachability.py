@@ -0,0 +1,201 @@
+'''
+Ticket-budgeted reachability: which nodes an agent can reach, and in how many moves, with the
+tickets it has left (the plain distances of distances.py ignore that the tickets run out).
+
+The answers come from a breadth first dynamic program over the couples (node, remaining tickets):
+a couple is pruned when the same node was already reached, in no more moves, with at least as many
+tickets of every type (it is dominated: it can not reach anything new). The expansions are memoized
+by (start, tickets) and resumed when a later query asks for more moves.
+
+SearchCop (agents.py) uses it to prune the moves after which a cop can not meet Mr.X anymore.
+
+NOTE : the positions of the other agents are ignored (the board is static).
+
+Usage:
+engine = TicketReachability.forLayout(Settings.getLayout())
+agentState = gameState.getCopState(1)
+engine.reachable(agentState.getPosition(), agentState.getTicketsAsDict(), 3)  # {node: moves} within 3 moves
+engine.minMoves(agentState.getPosition(), agentState.getTicketsAsDict(), 44)  # None if it can not be reached
+engine.minMovesFromAgents([gameState.getCopState(i+1) for i in range(gameState.numberOfCops())])
+'''
+
+from collections import OrderedDict
+
+from layout import EdgeType
+from rules import TicketType
+
+
+TICKETS = TicketType.asList() # the order of the elements of the ticket vectors
+_BLACK = TICKETS.index(TicketType.BLACK)
+
+
+def ticketVector(tickets):
+    """
+    Returns the ticket vector (a tuple, in the order of TICKETS) of a dictionary TicketType --> number.
+    A vector is returned as it is.
+    """
+    if isinstance(tickets, tuple):
+        return tickets
+    return tuple([tickets.get(ticket, 0) for ticket in TICKETS])
+
+
+def _dominated(vectors, vector):
+    """
+    Returns True if one of vectors has at least as many tickets of every type as vector.
+    """
+    for other in vectors:
+        for have, need in zip(other, vector):
+            if have < need:
+                break
+        else:
+            return True
+    return False
+
+
+class _Expansion:
+    """
+    The (resumable) breadth first expansion from a start node with a ticket vector.
+    """
+    
+    def __init__(self, start, tickets):
+        self.distances = {start: 0} # node --> minimum number of moves
+        self.seen = {start: [tickets]} # node --> the ticket vectors (not dominated) it was reached with
+        self.frontier = [(start, tickets)]
+        self.depth = 0
+        self.states = 1
+    
+    def isDone(self):
+        return self.frontier == []
+    
+    def expand(self, moves, maxMoves):
+        """
+        Expands the layers up to maxMoves moves (None means until the tickets run out).
+        """
+        while self.frontier and (maxMoves is None or self.depth < maxMoves):
+            self.depth += 1
+            following = []
+            for node, tickets in self.frontier:
+                for end, ticket in moves(node):
+                    if tickets[ticket] == 0:
+                        continue
+                    left = tickets[:ticket] + (tickets[ticket] - 1,) + tickets[ticket + 1:]
+                    vectors = self.seen.get(end)
+                    if vectors is None:
+                        self.seen[end] = [left]
+                        self.distances[end] = self.depth
+                    elif _dominated(vectors, left):
+                        continue
+                    else:
+                        vectors.append(left)
+                    following.append((end, left))
+            self.frontier = following
+            self.states += len(following)
+
+
+class TicketReachability:
+    """
+    Reachability queries on a layout under a ticket budget, the tickets are given as a dictionary
+    TicketType --> number (es: AgentState.getTicketsAsDict()) or as a vector (see ticketVector).
+    The BLACK ticket can be used on every edge, FERRY edges only with the BLACK ticket (see Rules).
+    The expansions are memoized, at most capacity of them are kept (the least recently used is evicted).
+    """
+    
+    def __init__(self, layout, capacity=4096):
+        assert capacity > 0
+        self.layout = layout
+        self.capacity = capacity
+        self.expansions = OrderedDict() # (start, ticket vector) --> _Expansion
+        self._moves = {} # node --> [(end, index of the ticket in TICKETS), ...]
+        self.hits = 0
+        self.misses = 0
+    
+    def _getMoves(self, node):
+        """
+        Returns the list of the moves from node: the couples (end, index of the ticket in TICKETS).
+        """
+        moves = self._moves.get(node)
+        if moves is None:
+            moves = set()
+            for _, end, edgeType, _ in self.layout.getEdgesFromNode(node):
+                if edgeType != EdgeType.FERRY:
+                    moves.add((end, TICKETS.index(edgeType)))
+                moves.add((end, _BLACK))
+            moves = sorted(moves)
+            self._moves[node] = moves
+        return moves
+    
+    def _expansion(self, start, tickets, maxMoves):
+        key = (start, ticketVector(tickets))
+        expansion = self.expansions.get(key)
+        if expansion is None:
+            self.misses += 1
+            if len(self.expansions) >= self.capacity:
+                self.expansions.popitem(last=False)
+            expansion = _Expansion(start, key[1])
+        else:
+            self.hits += 1
+            del self.expansions[key]
+        self.expansions[key] = expansion
+        expansion.expand(self._getMoves, maxMoves)
+        return expansion
+    
+    def reachable(self, start, tickets, maxMoves=None):
+        """
+        Returns a dictionary node --> minimum number of moves of the nodes which can be reached from start
+        within maxMoves moves (None means any number of moves) with the tickets. start is at 0 moves.
+        """
+        distances = self._expansion(start, tickets, maxMoves).distances
+        if maxMoves is None:
+            return dict(distances)
+        return dict([(node, moves) for node, moves in distances.items() if moves <= maxMoves])
+    
+    def minMoves(self, start, tickets, end, maxMoves=None):
+        """
+        Returns the minimum number of moves from start to end with the tickets,
+        None if end can not be reached (within maxMoves moves, if it is not None).
+        """
+        expansion = self.expansions.get((start, ticketVector(tickets)))
+        if expansion is not None and end in expansion.distances:
+            self.hits += 1 # already known: nothing to expand
+            moves = expansion.distances[end]
+        else:
+            moves = self._expansion(start, tickets, maxMoves).distances.get(end)
+        if moves is None or (maxMoves is not None and moves > maxMoves):
+            return None
+        return moves
+    
+    def canReach(self, start, tickets, end, maxMoves=None):
+        """
+        Returns True if end can be reached from start with the tickets (within maxMoves moves).
+        """
+        return self.minMoves(start, tickets, end, maxMoves) is not None
+    
+    def minMovesFromAgents(self, agentStates, maxMoves=None):
+        """
+        Bulk query for a team (es: all the cops): returns a dictionary node --> minimum number of moves
+        of the closest agent (AgentState) which can reach the node with its own tickets (within maxMoves moves).
+        """
+        result = {}
+        for agentState in agentStates:
+            for node, moves in self.reachable(agentState.getPosition(), agentState.getTicketsAsDict(),
+                                              maxMoves).items():
+                if moves < result.get(node, moves + 1):
+                    result[node] = moves
+        return result
+    
+    def clear(self):
+        self.expansions.clear()
+    
+    def getStats(self):
+        """
+        Returns a dictionary with the statistics of the memoized expansions.
+        """
+        return {"expansions": len(self.expansions), "capacity": self.capacity, "hits": self.hits,
+                "misses": self.misses, "states": sum([e.states for e in self.expansions.values()])}
+    
+    def forLayout(layout):
+        """
+        Returns the engine of the layout, it is built once for every layout (see Layout.getShared).
+        """
+        return layout.getShared(TicketReachability)
+    forLayout = staticmethod(forLayout)
@@ -4,6 +4,8 @@ Created on 09/set/2016
 @author: Lorenzo Selvatici
 '''
 
+import weakref
+
 # from layout import EdgeType
 
 class Rules:
@@ -15,39 +17,39 @@ class Rules:
         """
         Returns the list of possible actions (Action) for the specified agent (Agent), given the game state data (GameStateData). 
         """
-        actions = []
         agentState = agent.getAgentState()
-        agentPosition = agentState.getPosition()
-        tickets = agentState.getTicketsAsDict()
-        edges = gameStateData.layout.getEdgesFromNode(agentPosition) # list of tuples: (agentPosition, end, edgeType, path)
-        
-        for start, end, edge_type, _ in edges:
-            assert start == agentPosition
-            
-            # the BLACK ticket can be used for all of the types of edges
-            # the only way to travel on a FERRY edge type is to use a BLACK ticket
-            if "BLACK" in tickets and tickets["BLACK"]>0: 
-                actions.append(Action(start, end, TicketType.BLACK))
-            
-            #if edge_type == EdgeType.FERRY: # already checked! the only way to take a ferry is by using a BLACK ticket
-            #    continue
-            
-            # edge_type is one of the following : TAXI, BUS, UNDERGROUND
-            if edge_type in tickets and tickets[edge_type] > 0:
-                actions.append(Action(start, end, edge_type))
+        candidates = MoveTable.forLayout(gameStateData.layout).getActions(agentState.getPosition(),
+                                                                          agentState.getTicketsAsDict())
          
         # filter the actions, deleting the ones with endState equals to the position of a cop
-        copPositions = [gameStateData.getAgentState(i + 1).getPosition() for i in range(gameStateData.numberOfCops())]
-        filtered_actions = filter(lambda action: action.getEnd() not in copPositions, actions)
-        return filtered_actions
+        cops = gameStateData.getCopSet()
+        return [action for action in candidates if action.end not in cops]
                
     getLegalActions = staticmethod(getLegalActions)
     
+    def hasLegalAction(agent, gameStateData):
+        """
+        Returns True if the agent has at least one legal action (see getLegalActions), without building them all.
+        """
+        agentState = agent.getAgentState()
+        cops = gameStateData.getCopSet()
+        for action in MoveTable.forLayout(gameStateData.layout).getActions(agentState.getPosition(),
+                                                                           agentState.getTicketsAsDict()):
+            if action.end not in cops:
+                return True
+        return False
+    
+    hasLegalAction = staticmethod(hasLegalAction)
+    
     def isLegalAction(agent, action, gameStateData):
         """
         Returns True if the action is legal, False otherwise.
         """
-        return action in Rules.getLegalActions(agent, gameStateData)
+        agentState = agent.getAgentState()
+        if action.getStart() != agentState.getPosition() or action.getEnd() in gameStateData.getCopSet():
+            return False
+        return action in MoveTable.forLayout(gameStateData.layout).getActionSet(agentState.getPosition(),
+                                                                                agentState.getTicketsAsDict())
     
     isLegalAction = staticmethod(isLegalAction)
     
@@ -63,11 +65,11 @@ class Rules:
         # now new_pos is a legal position for Mr.X
         
         """
-        cop_positions = [gameStateData.getAgentState(i+1).getPosition() for i in range(gameStateData.numberOfCops())]
+        cops = gameStateData.getCopSet()
         
         import random
         new_pos = random.choice(range(gameStateData.layout.getNumNodes())) + 1
-        while new_pos in cop_positions:
+        while new_pos in cops:
             new_pos = random.choice(range(gameStateData.layout.getNumNodes())) + 1
         return new_pos 
     
@@ -95,16 +97,30 @@ class TicketType:
     asList = staticmethod(asList)
 
 
-class Action:
+class Action(object):
     """
     Represents an action as a tuple: (startNode, endNode, ticketType) - (int, int, TicketType)
+    
+    The actions are immutable and interned: Action(start, end, ticket) always returns the same
+    instance for the same tuple, thus they can be compared and hashed cheaply.
     """
     
-    def __init__(self, start, end, ticket):
-        assert start!=end
-        self.start=start
-        self.end=end
-        self.ticket=ticket
+    __slots__ = ("start", "end", "ticket", "_hash", "__weakref__")
+    
+    _actions = weakref.WeakValueDictionary() # (start, end, ticket) --> Action, as long as it is used
+    
+    def __new__(cls, start, end, ticket):
+        key = (start, end, ticket)
+        action = Action._actions.get(key)
+        if action is None:
+            assert start!=end
+            action = object.__new__(cls)
+            object.__setattr__(action, "start", start)
+            object.__setattr__(action, "end", end)
+            object.__setattr__(action, "ticket", ticket)
+            object.__setattr__(action, "_hash", hash(key))
+            Action._actions[key] = action
+        return action
     
     def getStart(self):
         return self.start
@@ -115,16 +131,107 @@ class Action:
     def getTicketType(self):
         return self.ticket
     
+    def __setattr__(self, name, value):
+        raise AttributeError("Action is immutable")
+    
     def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Action):
+            return False
         return self.start==other.start and self.end==other.end and self.ticket==other.ticket
     
     def __ne__(self, other):
         return not self == other
     
+    def __hash__(self):
+        return self._hash
+    
+    def __reduce__(self):
+        # unpickled actions are interned as well
+        return (Action, (self.start, self.end, self.ticket))
+    
     def __repr__(self):
         return str(self.start) + " -> " + str(self.end) + " " + self.ticket
 
 
+class MoveTable:
+    """
+    The candidate actions of a layout: for every node and every mask of the available tickets
+    (bit i is set if there is at least one ticket of type TicketType.asList()[i]) the tuple of the
+    actions which can be taken, without considering the positions of the cops.
+    The table of a node is built the first time it is requested.
+    """
+    
+    def __init__(self, layout):
+        self.layout = layout
+        self.actions = {} # node --> list of the tuples of actions, indexed by the ticket mask
+        self.actionSets = {} # node --> list of the frozensets of actions, indexed by the ticket mask
+    
+    def ticketMask(tickets):
+        """
+        Returns the mask of the available tickets of a dictionary TicketType --> number.
+        """
+        mask = 0
+        for i, ticket in enumerate(TicketType.asList()):
+            if tickets.get(ticket, 0) > 0:
+                mask |= 1 << i
+        return mask
+    ticketMask = staticmethod(ticketMask)
+    
+    def _build(self, node):
+        ticketTypes = TicketType.asList()
+        black = 1 << ticketTypes.index(TicketType.BLACK)
+        moves = [] # (action, ticket mask bit), in the order of the edges
+        for start, end, edge_type, _ in self.layout.getEdgesFromNode(node):
+            # the BLACK ticket can be used for all of the types of edges
+            # the only way to travel on a FERRY edge type is to use a BLACK ticket
+            moves.append((Action(start, end, TicketType.BLACK), black))
+            # edge_type is one of the following : TAXI, BUS, UNDERGROUND
+            if edge_type in ticketTypes:
+                moves.append((Action(start, end, edge_type), 1 << ticketTypes.index(edge_type)))
+        
+        actions = []
+        for mask in range(1 << len(ticketTypes)):
+            candidates = []
+            for action, bit in moves:
+                if mask & bit and action not in candidates: # parallel edges give the same action once
+                    candidates.append(action)
+            actions.append(tuple(candidates))
+        self.actions[node] = actions
+        self.actionSets[node] = [frozenset(candidates) for candidates in actions]
+    
+    def getActions(self, node, tickets):
+        """
+        Returns the tuple of the actions from node with the tickets (a dictionary TicketType --> number).
+        """
+        if node not in self.actions:
+            self._build(node)
+        return self.actions[node][MoveTable.ticketMask(tickets)]
+    
+    def getActionSet(self, node, tickets):
+        """
+        Same as getActions, as a frozenset (for membership tests).
+        """
+        if node not in self.actionSets:
+            self._build(node)
+        return self.actionSets[node][MoveTable.ticketMask(tickets)]
+    
+    def getMoveEnds(self, node, tickets):
+        """
+        Returns the set (frozenset) of the nodes which can be reached from node in one move with the tickets:
+        the union of the neighbourhoods of the usable types of ticket. It is NOT cached.
+        """
+        return frozenset([action.end for action in self.getActions(node, tickets)])
+    
+    def forLayout(layout):
+        """
+        Returns the move table of the layout, it is built once for every layout (see Layout.getShared).
+        """
+        return layout.getShared(MoveTable)
+    forLayout = staticmethod(forLayout)
+
+
 if __name__ == '__main__':
     # action tests
 #     a = Action(1, 2, "A")
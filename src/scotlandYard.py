@@ -4,11 +4,15 @@ Created on 11/set/2016
 @author: Lorenzo Selvatici
 '''
 
-import agents
+import batch
 import graphic.display
 from agents import AgentRole
+from events import EventBus
 from game import GameState, GameStateData
-from settings import Settings
+import gamelog
+from inference import BeliefService
+import profiling
+from settings import Settings, getConfig
 import util
 
 
@@ -17,12 +21,23 @@ class Game:
     The core of the application.
     """
 
-    def __init__(self, layout, agents, display_class, turn=AgentRole.Mr_X):
-        self.gameState = GameState(GameStateData(layout, agents))
+    def __init__(self, layout, agents, display_class, turn=AgentRole.Mr_X, config=None):
+        """
+        config is the configuration of the game (GameConfig in settings.py), the default one if it is None.
+        """
+        self.gameState = GameState(GameStateData(layout, agents, config))
+        # the beliefs about Mr.X position are computed once for the whole team of cops
+        self.beliefService = BeliefService(config=self.gameState.data.config)
+        for cop in agents[1:]:
+            cop.setBeliefService(self.beliefService)
         self.turn = turn
         # create a new <type>+Display object
         self.display = display_class(self.gameState.data)
         self.MOD = len(agents)  # number of players
+        # the display (and any other subscriber) is updated by the events of the game state
+        self.eventBus = EventBus()
+        self.eventBus.subscribe(self.display.onEvent)
+        self.gameState.setEventBus(self.eventBus)
 
     def run(self):
         """
@@ -30,23 +45,27 @@ class Game:
         """
         self.display.start()
         counter = 0
+        getActions = [agent.getAction for agent in self.gameState.data.agents]
+        
+        profiler = profiling.getProfiler()
+        if profiler is not None:  # time the thinking of every agent and the rendering
+            getActions = [profiler.wrap(getAction, "getAction", i) for i, getAction in enumerate(getActions)]
+            self.eventBus.unsubscribe(self.display.onEvent)
+            self.eventBus.subscribe(profiler.wrap(self.display.onEvent, "render"))
+            startTime = profiling.clock()
 
         while self.gameState.isEndState(self.turn) == (False, None, ""):
             # ask for an action and create the new game state
             self.display.wait()
             
-            new_action = self.gameState.data.getAgent(
-                counter).getAction(self.gameState, self.display)
+            new_action = getActions[counter](self.gameState, self.display)
 
-            if not new_action is None:  # if there is a possible action, do it
-                self.gameState = self.gameState.generateSuccessor(
-                    counter, new_action)
+            if not new_action is None:  # if there is a possible action, do it (in place)
+                self.gameState.applyAction(counter, new_action)
             else:
+                self.gameState.skipTurn(counter)
                 self.display.wait()
 
-            # update the display
-            self.display.update(self.gameState.data)
-
             self.display.wait()
             # update the player turn
             counter += 1
@@ -54,34 +73,38 @@ class Game:
             self.turn = AgentRole.Mr_X if counter == 0 else AgentRole.COP
 
         # end of the main while loop
+        self.gameState.endGame(self.turn)
+        if profiler is not None:
+            profiler.record("game", profiling.clock() - startTime)
         self.display.showMessage(
             "GAME OVER\n\n" + self.gameState.isEndState(self.turn)[2])
         self.display.waitQuit()
         self.display.finish()
 
 
-def createAgents():
+def createAgents(config=None):
     """
-    Creates a list of agents according to the type of instances specified in the Settings.
+    Creates a list of agents according to the type of instances specified in the configuration
+    (GameConfig in settings.py), by default the Settings (see createAgents in batch.py).
     """
-    mrx_type = Settings.getMrXType() + "MrX"
-    cops_type = Settings.getCopsType() + "Cop"
-    mrx = (agents.__dict__)[mrx_type]()
-    cops = [(agents.__dict__)[cops_type](i + 1)
-            for i in range(Settings.getNumberOfCops())]
-    return [mrx] + cops
+    return batch.createAgents(config=config)
 
 
-def createDisplay():
+def createDisplay(config=None):
     """
-    Creates the display according to the type specified in the Settings.
+    Creates the display according to the type specified in the configuration, by default the Settings.
     """
-    display_type = Settings.getDisplayType() + "Display"
+    display_type = getConfig(config).getDisplayType() + "Display"
     return (graphic.display.__dict__)[display_type]  # an object
 # http://stackoverflow.com/questions/487971/is-there-a-standard-way-to-list-names-of-python-modules-in-a-package
 
 
 if __name__ == '__main__':
     
+    gamelog.configure(Settings.getLogLevel(), Settings.getLogFile())
+    if Settings.getProfileFile() is not None:
+        profiling.enable()
     new_game = Game(Settings.getLayout(), createAgents(), createDisplay())
     new_game.run()
+    if Settings.getProfileFile() is not None:
+        profiling.disable().dump(Settings.getProfileFile())
@@ -15,46 +15,84 @@ SETTINGS_FILE_NAME = "DEFAULT"
 SETTINGS_SEPARATOR = "->"
 
 
-class Settings:
+class GameConfig:
     """
-    The settings are stored as a dictionary, the keys represent the options' name.
+    The settings of a game, stored as a dictionary: the keys represent the options' name.
+    Every GameConfig is independent (es: one for every game of a batch, see derive) and it is passed to
+    the game state (GameStateData.config), the agents, the inference modules and the displays.
+    The layouts are immutable, thus they are shared by all the configurations with the same layout file
+    (with their indexes: move tables, transition models, ...).
+    
+    Possible keys:
+    *- "DEBUG_MODE" , True or False
+    *- "DISPLAY_TYPE" , the type of the display
+    *- "MrX_TYPE" , Mr.X type of instance : Keyboard, ..
+    *- "COPS_TYPE" , Cop type of instance : Keyboard, ..
+    *- "INFERENCE_TYPE" , the inference module of the smart agents : Exact, VectorizedExact, Approximate, ..
+    *- "NUM_PARTICLES" , the number of particles of the approximate inference module
+    *- "SEARCH_TIME_BUDGET" , the seconds a search agent can think about a move
+    *- "SEARCH_MAX_DEPTH" , the maximum depth of the search agents
+    *- "SEARCH_BELIEF_SAMPLES" , the number of likely Mr.X positions considered by the search cops
+    *- "MCTS_TIME_BUDGET" , the seconds a MCTS agent can think about a move
+    *- "MCTS_WORKERS" , the number of processes of the MCTS agents
+    *- "LOG_LEVEL" , the level of the messages of the game : DEBUG, INFO, WARNING, ERROR
+    *- "LOG_FILE" , the file the messages are appended to as JSON lines, NONE for no file
+    *- "PROFILE_FILE" , the JSON file of the profile of the game (see profiling.py), NONE for no profiling
+    *- "LAYOUT_FILENAME", the path of the layout file name (.txt)
+    *- "MAX_NUM_MOVES" , the max number of moves of Mr.X for one game
+    *- "INITIAL_MrX_POSITION" , an integer or the string "random"
+    *- "INITIAL_COPS_POSITION" , a list (size = "NUMBER_OF_COPS" ) of integer or the
+                                string "random" separated by commas (the order matters)
+    *- "NOT_HIDDEN_MOVES" , the numbers of not hidden moves : a list of integers separated by commas.
+    *- "MrX_TICKETS" , format: <TicketType>=<int> ; <TicketType>=<int>; ...
+    *- "COPS_TICKETS" , format: <TicketType>=<int> ; <TicketType>=<int>; ...
+     ...
     """
     
-    settings = {}
-    layout = None
-    positions = None
+    _layouts = {} # layout file name --> Layout, shared by all the configurations
+    _default = None # the configuration of the Settings
     
-    def _getSettingsAsDict():
+    def __init__(self, settings=None, fileName=SETTINGS_FILE_NAME, layout=None):
+        """
+        settings is a dictionary key --> value (strings, as in the settings file), if it is None
+        the settings are loaded from the file fileName.
+        layout is the Layout of the game, if it is None it is loaded from "LAYOUT_FILENAME" when needed.
+        """
+        if settings is None:
+            settings = GameConfig._loadSettings(fileName)
+        self.settings = dict(settings)
+        self.layout = layout
+        self.positions = None
+        self._occupied_positions = [] # avoid that two random initial positions overlap
+    
+    def getDefault():
         """
-        Returns the settings as a dictionary.
-        Possible keys:
-        *- "DEBUG_MODE" , True or False
-        *- "DISPLAY_TYPE" , the type of the display
-        *- "MrX_TYPE" , Mr.X type of instance : Keyboard, ..
-        *- "COPS_TYPE" , Cop type of instance : Keyboard, ..
-        *- "LAYOUT_FILENAME", the path of the layout file name (.txt)
-        *- "MAX_NUM_MOVES" , the max number of moves of Mr.X for one game
-        *- "INITIAL_MrX_POSITION" , an integer or the string "random"
-        *- "INITIAL_COPS_POSITION" , a list (size = "NUMBER_OF_COPS" ) of integer or the 
-                                    string "random" separated by commas (the order matters)
-        *- "NOT_HIDDEN_MOVES" , the numbers of not hidden moves : a list of integers separated by commas.
-        *- "MrX_TICKETS" , format: <TicketType>=<int> ; <TicketType>=<int>; ... 
-        *- "COPS_TICKETS" , format: <TicketType>=<int> ; <TicketType>=<int>; ...
-         ...
-        """
-        # initialize setting dictionary
-        if len(Settings.settings)==0:
-            Settings._loadSettings(SETTINGS_FILE_NAME)
-        
-        # initialize the layout
-        if Settings.layout is None:
-            Settings.layout = Layout(Settings.settings["LAYOUT_FILENAME"])
-        
-        #if Settings.positions is None:
-        #    Settings._assignPositions()
-            
-        return Settings.settings
-    _getSettingsAsDict=staticmethod(_getSettingsAsDict)
+        Returns the default configuration (the one of the settings file), used by the Settings accessors.
+        """
+        if GameConfig._default is None:
+            GameConfig._default = GameConfig()
+        return GameConfig._default
+    getDefault = staticmethod(getDefault)
+    
+    def loadLayout(fileName):
+        """
+        Returns the layout of the file fileName, it is loaded only once per process.
+        """
+        layout = GameConfig._layouts.get(fileName)
+        if layout is None:
+            layout = GameConfig._layouts[fileName] = Layout(fileName)
+        return layout
+    loadLayout = staticmethod(loadLayout)
+    
+    def derive(self, values=None):
+        """
+        Returns a new configuration with the settings of this one changed by values (see update),
+        es: config.derive({"MAX_NUM_MOVES": 12}). The layout is shared (unless "LAYOUT_FILENAME" changes).
+        """
+        config = GameConfig(self.settings, layout=self.layout)
+        if values:
+            config.update(values)
+        return config
     
     def _loadSettings(fileName):
         """
@@ -73,34 +111,34 @@ class Settings:
             fileName = fileName + ".txt"
         if not os.path.exists(fileName):
             raise ValueError(fileName + " does not exist.")
+        settings = {}
         in_file = open(fileName, "r")
         for line in in_file.readlines():
             key, val = line.strip().split(SETTINGS_SEPARATOR)
-            Settings.settings[key.strip()]=val.strip()
+            settings[key.strip()]=val.strip()
         in_file.close()
+        return settings
     _loadSettings=staticmethod(_loadSettings)
     
     ########################################
     #    ACCESSOR METHODS FOR SETTINGS     #
     ########################################
     
-    def isDebug():
+    def isDebug(self):
         """
         Returns True if debug mode is on, False otherwise.
         """
-        return Settings._getSettingsAsDict()["DEBUG_MODE"].upper()=="TRUE"
-    isDebug = staticmethod(isDebug)
+        return self.settings["DEBUG_MODE"].upper()=="TRUE"
     
-    def getLayout():
+    def getLayout(self):
         """
         Returns the layout (Layout in layout.py).
         """
-        if Settings.layout is None:
-            Settings.layout = Layout(Settings._getSettingsAsDict()["LAYOUT_FILENAME"])
-        return Settings.layout
-    getLayout = staticmethod(getLayout)
+        if self.layout is None:
+            self.layout = GameConfig.loadLayout(self.settings["LAYOUT_FILENAME"])
+        return self.layout
     
-    def getDisplayType():
+    def getDisplayType(self):
         """
         Returns the display type (see display.py).
         Possibilities:
@@ -108,145 +146,226 @@ class Settings:
         - GUI
         
         """
-        return Settings._getSettingsAsDict()["DISPLAY_TYPE"]
-    getDisplayType = staticmethod(getDisplayType)
+        return self.settings["DISPLAY_TYPE"]
     
-    def getMrXType():
+    def getMrXType(self):
         """
         Returns the type of instance for Mr.X.
         Possibilities:
         - Keyboard
+        - Random
+        - MCTS
         - ...
         
         """
-        return Settings._getSettingsAsDict()["MrX_TYPE"]
-    getMrXType = staticmethod(getMrXType)
+        return self.settings["MrX_TYPE"]
     
-    def getCopsType():
+    def getCopsType(self):
         """
         Returns the type of instance for the Cops.
         Possibilities:
         - Keyboard
-        - Smart
+        - SmartKeyboard
+        - Random
+        - Search
         
         """
-        return Settings._getSettingsAsDict()["COPS_TYPE"]
-    getCopsType = staticmethod(getCopsType)
+        return self.settings["COPS_TYPE"]
     
-    def getMaxNumMoves():
+    def getInferenceType(self):
+        """
+        Returns the type of inference module used by the smart agents to guess Mr.X position (see inference.py).
+        Possibilities:
+        - Exact
+        - VectorizedExact (needs numpy)
+        - Approximate (needs numpy)
+        
+        """
+        return self.settings.get("INFERENCE_TYPE", "Exact")
+    
+    def getNumParticles(self):
+        """
+        Returns the number of particles of the approximate inference module.
+        """
+        return int(self.settings.get("NUM_PARTICLES", 1000))
+    
+    def getSearchTimeBudget(self):
+        """
+        Returns the seconds a search agent can think about a single move.
+        """
+        return float(self.settings.get("SEARCH_TIME_BUDGET", 1.0))
+    
+    def getSearchMaxDepth(self):
+        """
+        Returns the maximum depth (number of single moves) of the search agents.
+        """
+        return int(self.settings.get("SEARCH_MAX_DEPTH", 8))
+    
+    def getSearchBeliefSamples(self):
+        """
+        Returns how many of the most likely positions of Mr.X the search cops consider.
+        """
+        return int(self.settings.get("SEARCH_BELIEF_SAMPLES", 8))
+    
+    def getMCTSTimeBudget(self):
+        """
+        Returns the seconds the MCTS agents can think about a single move.
+        """
+        return float(self.settings.get("MCTS_TIME_BUDGET", 1.0))
+    
+    def getMCTSWorkers(self):
+        """
+        Returns the number of processes which run the simulations of the MCTS agents.
+        """
+        return int(self.settings.get("MCTS_WORKERS", 1))
+    
+    def getLogLevel(self):
+        """
+        Returns the level of the log messages (see gamelog.py), es: "INFO".
+        """
+        return self.settings.get("LOG_LEVEL", "INFO").upper()
+    
+    def getLogFile(self):
+        """
+        Returns the file name of the JSON lines log, None if the messages are not written to a file.
+        """
+        fileName = self.settings.get("LOG_FILE", "NONE")
+        if fileName.upper() == "NONE":
+            return None
+        return fileName
+    
+    def getProfileFile(self):
+        """
+        Returns the file name of the profile of the game (see profiling.py), None if the game is not profiled.
+        """
+        fileName = self.settings.get("PROFILE_FILE", "NONE")
+        if fileName.upper() == "NONE":
+            return None
+        return fileName
+    
+    def getMaxNumMoves(self):
         """
         Returns the maximum number of moves which can be done in single game.
         """
-        return int(Settings._getSettingsAsDict()["MAX_NUM_MOVES"])
-    getMaxNumMoves=staticmethod(getMaxNumMoves)
+        return int(self.settings["MAX_NUM_MOVES"])
     
-    def getNumberOfCops():
+    def getNumberOfCops(self):
         """
         Returns the number of Cops
         """
-        if Settings.positions is None:
-            Settings._assignPositions()
-        return len(Settings.positions) - 1
-    getNumberOfCops = staticmethod(getNumberOfCops)
+        if self.positions is None:
+            self._assignPositions()
+        return len(self.positions) - 1
     
-    def getInitialMrXTickets():
+    def getInitialMrXTickets(self):
         """
         Returns the initial amount of tickets for Mr.X as a Dictionary.
         """
-        val = Settings._getSettingsAsDict()["MrX_TICKETS"]
-        return Settings._parseTicketDict(val)
-    getInitialMrXTickets = staticmethod(getInitialMrXTickets)
+        return GameConfig._parseTicketDict(self.settings["MrX_TICKETS"])
     
-    def getInitialCopsTickets():
+    def getInitialCopsTickets(self):
         """
         Returns the initial amount of tickets for the Cops as a Dictionary.
         """
-        val = Settings._getSettingsAsDict()["COPS_TICKETS"]
-        return Settings._parseTicketDict(val)
-    getInitialCopsTickets = staticmethod(getInitialCopsTickets)
-        
-    def getInitialMrXPosition():
+        return GameConfig._parseTicketDict(self.settings["COPS_TICKETS"])
+    
+    def getInitialMrXPosition(self):
         """
         Returns the initial Mr.X position.
         """
-        if Settings.positions is None:
-            Settings._assignPositions()
-        return Settings.positions[0]
-    getInitialMrXPosition = staticmethod(getInitialMrXPosition)
+        if self.positions is None:
+            self._assignPositions()
+        return self.positions[0]
     
-    def getInitialCopsPositions(index=None):
+    def getInitialCopsPositions(self, index=None):
         """
         Returns the position of the cop with the specified index (an integer in the interval [1, numberOfCops]
         """
-        if Settings.positions is None:
-            Settings._assignPositions()
+        if self.positions is None:
+            self._assignPositions()
         if index is not None:
-            return Settings.positions[index]
+            return self.positions[index]
         else:
-            return [Settings.getInitialCopsPositions(i+1) for i in range(Settings.getNumberOfCops())]
-    getInitialCopsPositions = staticmethod(getInitialCopsPositions)
+            return [self.getInitialCopsPositions(i+1) for i in range(self.getNumberOfCops())]
     
-    def getLegalPositions():
+    def getLegalPositions(self):
         """
         Returns the list of the legal positions.
         """
-        positions = Settings.getLayout().getNodesStations().keys()
-        cops = Settings.getInitialCopsPositions()
+        positions = self.getLayout().getNodesStations().keys()
+        cops = self.getInitialCopsPositions()
         return [pos for pos in positions if pos not in cops]
-    getLegalPositions = staticmethod(getLegalPositions)
-        
-    def getNotHiddenMovesNumbers():
+    
+    def reset(self):
+        """
+        Forgets the initial positions, so that the random ones are drawn again (es: before a new game).
+        """
+        self.positions = None
+        self._occupied_positions = []
+    
+    def update(self, values):
+        """
+        Changes some settings: values is a dictionary key --> value (es: {"MAX_NUM_MOVES": 12}), None removes
+        the key. The initial positions are drawn again.
+        Returns the previous values (None for the keys which were missing), to restore them with update.
+        """
+        previous = dict([(key, self.settings.get(key)) for key in values])
+        for key, value in values.items():
+            if value is None:
+                self.settings.pop(key, None)
+            else:
+                self.settings[key] = str(value)
+        if "LAYOUT_FILENAME" in values:
+            self.layout = None
+        self.reset()
+        return previous
+    
+    def getNotHiddenMovesNumbers(self):
         """
         Returns the list of moves in which Mr.x will show his own positions.
         """
-        return [int(x) for x in Settings._getSettingsAsDict()["NOT_HIDDEN_MOVES"].split(",")]
-    getNotHiddenMovesNumbers = staticmethod(getNotHiddenMovesNumbers)
+        return [int(x) for x in self.settings["NOT_HIDDEN_MOVES"].split(",")]
     
     #####################################################
     #    HELPER METHODS (do not call them directly)     #
     #####################################################
     
-    _occupied_positions = [] # avoid that two random initial positions overlap
-    
-    def _assignPositions():
-        mrx = Settings._getSettingsAsDict()["INITIAL_MrX_POSITION"]
-        cops  = Settings._getSettingsAsDict()["INITIAL_COPS_POSITION"].split(',')
+    def _assignPositions(self):
+        mrx = self.settings["INITIAL_MrX_POSITION"]
+        cops  = self.settings["INITIAL_COPS_POSITION"].split(',')
         
-        legal_pos = Settings.layout.getNodesStations()  # dict --> numNodes : stationsType..
+        legal_pos = self.getLayout().getNodesStations()  # dict --> numNodes : stationsType..
         # node number must be a key in legal pos dict
-        Settings.positions = [mrx] + cops
-        for i, p in enumerate(Settings.positions):
+        self.positions = [mrx] + cops
+        for i, p in enumerate(self.positions):
             if p.strip() != "random":
-                Settings.positions[i] = int(p)
+                self.positions[i] = int(p)
                 # check it is a legal position
                 assert int(p) in legal_pos, "No station for node " + p
             else:
-                Settings.positions[i] = p.strip()
+                self.positions[i] = p.strip()
         
         # first assign fixed positions
-        Settings._occupied_positions = [x for x in Settings.positions if type(x) == int]
+        self._occupied_positions = [x for x in self.positions if type(x) == int]
         # assert there are no duplicates
-        assert len(set(Settings._occupied_positions))==len(Settings._occupied_positions)
+        assert len(set(self._occupied_positions))==len(self._occupied_positions)
         
         # then deal with random positions
-        for i, p in enumerate(Settings.positions):
+        for i, p in enumerate(self.positions):
             if p == "random":
-                Settings.positions[i] = Settings._randomNode()
-        
-    _assignPositions = staticmethod(_assignPositions)
-       
-    def _randomNode():
+                self.positions[i] = self._randomNode()
+    
+    def _randomNode(self):
         """
         This is a private function, to generate a random nodes during the game use Rules.getRandomNode()
         """
-        legal_pos = Settings.layout.getNodesStations().keys()  # list of legal positions
+        legal_pos = self.getLayout().getNodesStations().keys()  # list of legal positions
         import random
         pos = random.choice(legal_pos)
-        while pos in Settings._occupied_positions:
+        while pos in self._occupied_positions:
             pos = random.choice(legal_pos)
-        Settings._occupied_positions.append(pos) # updates the occupied positions
+        self._occupied_positions.append(pos) # updates the occupied positions
         return pos
-    _randomNode = staticmethod(_randomNode)
     
     def _parseTicketDict(sDict):
         result = {}
@@ -256,12 +375,146 @@ class Settings:
         return result
     _parseTicketDict=staticmethod(_parseTicketDict)
 
-if __name__ == '__main__':
-    print Settings.getNotHiddenMovesNumbers()
-#     for key, val in Settings._getSettingsAsDict().items():
-#         print "%s : %s" % (key, val)
 
+def getConfig(config=None):
+    """
+    Returns config, or the default configuration (see GameConfig.getDefault) if it is None.
+    """
+    if config is None:
+        return GameConfig.getDefault()
+    return config
 
 
+class _SettingsAttributes(type):
+    """
+    The class attributes of Settings (settings, layout, positions): read-only aliases of the ones
+    of the default configuration.
+    """
+    settings = property(lambda cls: GameConfig.getDefault().settings)
+    layout = property(lambda cls: GameConfig.getDefault().layout)
+    positions = property(lambda cls: GameConfig.getDefault().positions)
 
 
+class Settings(object):
+    """
+    The static accessors of the default configuration (see GameConfig.getDefault), es:
+    Settings.getMaxNumMoves() is GameConfig.getDefault().getMaxNumMoves().
+    Settings.settings, Settings.layout and Settings.positions are the (read-only) ones of the default configuration.
+    
+    NOTE : the settings of a game are the ones of its configuration (GameStateData.config),
+    which is the default one only if no other configuration is given.
+    """
+    __metaclass__ = _SettingsAttributes
+    
+    
+    def _getSettingsAsDict():
+        """
+        Returns the settings as a dictionary (see GameConfig for the possible keys).
+        """
+        return GameConfig.getDefault().settings
+    _getSettingsAsDict=staticmethod(_getSettingsAsDict)
+    
+    def isDebug():
+        return GameConfig.getDefault().isDebug()
+    isDebug = staticmethod(isDebug)
+    
+    def getLayout():
+        return GameConfig.getDefault().getLayout()
+    getLayout = staticmethod(getLayout)
+    
+    def getDisplayType():
+        return GameConfig.getDefault().getDisplayType()
+    getDisplayType = staticmethod(getDisplayType)
+    
+    def getMrXType():
+        return GameConfig.getDefault().getMrXType()
+    getMrXType = staticmethod(getMrXType)
+    
+    def getCopsType():
+        return GameConfig.getDefault().getCopsType()
+    getCopsType = staticmethod(getCopsType)
+    
+    def getInferenceType():
+        return GameConfig.getDefault().getInferenceType()
+    getInferenceType = staticmethod(getInferenceType)
+    
+    def getNumParticles():
+        return GameConfig.getDefault().getNumParticles()
+    getNumParticles = staticmethod(getNumParticles)
+    
+    def getSearchTimeBudget():
+        return GameConfig.getDefault().getSearchTimeBudget()
+    getSearchTimeBudget = staticmethod(getSearchTimeBudget)
+    
+    def getSearchMaxDepth():
+        return GameConfig.getDefault().getSearchMaxDepth()
+    getSearchMaxDepth = staticmethod(getSearchMaxDepth)
+    
+    def getSearchBeliefSamples():
+        return GameConfig.getDefault().getSearchBeliefSamples()
+    getSearchBeliefSamples = staticmethod(getSearchBeliefSamples)
+    
+    def getMCTSTimeBudget():
+        return GameConfig.getDefault().getMCTSTimeBudget()
+    getMCTSTimeBudget = staticmethod(getMCTSTimeBudget)
+    
+    def getMCTSWorkers():
+        return GameConfig.getDefault().getMCTSWorkers()
+    getMCTSWorkers = staticmethod(getMCTSWorkers)
+    
+    def getLogLevel():
+        return GameConfig.getDefault().getLogLevel()
+    getLogLevel = staticmethod(getLogLevel)
+    
+    def getLogFile():
+        return GameConfig.getDefault().getLogFile()
+    getLogFile = staticmethod(getLogFile)
+    
+    def getProfileFile():
+        return GameConfig.getDefault().getProfileFile()
+    getProfileFile = staticmethod(getProfileFile)
+    
+    def getMaxNumMoves():
+        return GameConfig.getDefault().getMaxNumMoves()
+    getMaxNumMoves=staticmethod(getMaxNumMoves)
+    
+    def getNumberOfCops():
+        return GameConfig.getDefault().getNumberOfCops()
+    getNumberOfCops = staticmethod(getNumberOfCops)
+    
+    def getInitialMrXTickets():
+        return GameConfig.getDefault().getInitialMrXTickets()
+    getInitialMrXTickets = staticmethod(getInitialMrXTickets)
+    
+    def getInitialCopsTickets():
+        return GameConfig.getDefault().getInitialCopsTickets()
+    getInitialCopsTickets = staticmethod(getInitialCopsTickets)
+    
+    def getInitialMrXPosition():
+        return GameConfig.getDefault().getInitialMrXPosition()
+    getInitialMrXPosition = staticmethod(getInitialMrXPosition)
+    
+    def getInitialCopsPositions(index=None):
+        return GameConfig.getDefault().getInitialCopsPositions(index)
+    getInitialCopsPositions = staticmethod(getInitialCopsPositions)
+    
+    def getLegalPositions():
+        return GameConfig.getDefault().getLegalPositions()
+    getLegalPositions = staticmethod(getLegalPositions)
+    
+    def reset():
+        GameConfig.getDefault().reset()
+    reset = staticmethod(reset)
+    
+    def update(values):
+        return GameConfig.getDefault().update(values)
+    update = staticmethod(update)
+    
+    def getNotHiddenMovesNumbers():
+        return GameConfig.getDefault().getNotHiddenMovesNumbers()
+    getNotHiddenMovesNumbers = staticmethod(getNotHiddenMovesNumbers)
+
+if __name__ == '__main__':
+    print Settings.getNotHiddenMovesNumbers()
+#     for key, val in Settings._getSettingsAsDict().items():
+#         print "%s : %s" % (key, val)
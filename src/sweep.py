@@ -0,0 +1,188 @@
+'''
+Sweep of the settings of a scenario (es: MAX_NUM_MOVES, NOT_HIDDEN_MOVES, the number of cops, the tickets),
+to balance it: every configuration is played headless in a pool of processes (see batch.py) and
+the win rate of Mr.X is estimated with its confidence interval (see util.wilsonInterval).
+
+The configurations are the grid of all the combinations of the values of the swept keys,
+or a random sample of it. They are played in rounds of games on the same seeds: a configuration stops
+when the half width of its interval is at most the precision (its win rate is resolved), or after maxGames.
+
+The key NUMBER_OF_COPS is not a key of the settings file: it keeps the first NUMBER_OF_COPS positions of
+INITIAL_COPS_POSITION (of the configuration, or of the Settings) and places the other cops at random positions.
+
+Command line usage (the values of a key are separated by "|"):
+python sweep.py --mrx Random --cops Search --param "MAX_NUM_MOVES=10|15|20" --param "NUMBER_OF_COPS=2|3|4" -o sweep.csv
+python sweep.py --mrx MCTS --cops Random --param "NOT_HIDDEN_MOVES=2,4,13,18|3,8,13" --param "MrX_TICKETS=TAXI=10;BUS=15;UNDERGROUND=3;BLACK=2|TAXI=8;BUS=8;UNDERGROUND=2;BLACK=4" --random 4
+'''
+
+import itertools
+import random
+import sys
+
+import batch
+import util
+from agents import AgentRole
+from settings import GameConfig
+
+
+def gridConfigurations(parameters):
+    """
+    Returns the list of all the configurations (dictionaries key --> value) of parameters,
+    a list of couples (key, list of values).
+    """
+    keys = [key for key, _ in parameters]
+    return [dict(zip(keys, values)) for values in itertools.product(*[values for _, values in parameters])]
+
+
+def randomConfigurations(parameters, count, seed=0):
+    """
+    Returns count different configurations (at most all of them) drawn at random from the grid of parameters.
+    """
+    grid = gridConfigurations(parameters)
+    return random.Random(seed).sample(grid, min(count, len(grid)))
+
+
+def toSettings(configuration, config=None):
+    """
+    Returns the settings (see GameConfig.derive) of a configuration of the game configuration config
+    (by default the Settings): NUMBER_OF_COPS truncates the initial positions of the cops,
+    or adds "random" ones.
+    """
+    settings = dict(configuration)
+    if "NUMBER_OF_COPS" in settings:
+        numberOfCops = int(settings.pop("NUMBER_OF_COPS"))
+        positions = settings.get("INITIAL_COPS_POSITION")
+        if positions is None:
+            positions = (config or GameConfig.getDefault()).settings["INITIAL_COPS_POSITION"]
+        positions = [p.strip() for p in positions.split(",")][:numberOfCops]
+        positions += ["random"] * (numberOfCops - len(positions))
+        settings["INITIAL_COPS_POSITION"] = ", ".join(positions)
+    return settings
+
+
+class Configuration:
+    """
+    The games played with a configuration of the settings.
+    """
+    
+    def __init__(self, values):
+        self.values = values
+        self.games = 0
+        self.mrxWins = 0
+        self.numMoves = 0
+        self.done = False
+        self.reason = None
+    
+    def add(self, result):
+        self.games += 1
+        self.numMoves += result["numMoves"]
+        if result["winner"] == AgentRole.Mr_X:
+            self.mrxWins += 1
+    
+    def getInterval(self, z):
+        return util.wilsonInterval(self.mrxWins, self.games, z)
+    
+    def check(self, maxGames, precision, z):
+        low, high = self.getInterval(z)
+        if (high - low) / 2 <= precision:
+            self.done, self.reason = True, "precise"
+        elif self.games >= maxGames:
+            self.done, self.reason = True, "max games"
+        return self.done
+    
+    def asRow(self, keys, z):
+        low, high = self.getInterval(z)
+        return ([self.values[key] for key in keys] +
+                [self.games, self.mrxWins, float(self.mrxWins) / max(1, self.games), low, high,
+                 float(self.numMoves) / max(1, self.games), self.reason])
+
+
+COLUMNS = ["games", "mrxWins", "mrxWinRate", "low", "high", "meanMoves", "reason"]
+
+
+def runSweep(configurations, mrxType=None, copsType=None, maxGames=400, roundGames=20, precision=0.05,
+             z=1.96, seed=0, processes=None, verbose=True):
+    """
+    Plays the configurations (a list of dictionaries key --> value, see toSettings) until their win rates
+    are resolved (see the module documentation). The agents are the ones in the Settings if they are None.
+    Returns the list of the Configuration objects.
+    """
+    configurations = [Configuration(values) for values in configurations]
+    played = 0
+    while not all([c.done for c in configurations]):
+        numGames = min(roundGames, maxGames - played)
+        specs = []
+        for i, c in enumerate(configurations):
+            if not c.done:
+                for spec in batch.makeSpecs(numGames, mrxType, copsType, seed + played):
+                    spec["game"] += played
+                    spec["configuration"] = i
+                    spec["settings"] = toSettings(c.values)
+                    specs.append(spec)
+        for result in batch.runBatch(specs, processes):
+            configurations[result["configuration"]].add(result)
+        played += numGames
+        for c in configurations:
+            if not c.done and c.check(maxGames, precision, z) and verbose:
+                low, high = c.getInterval(z)
+                sys.stderr.write("%s : Mr.X wins %d / %d [%.3f, %.3f] (%s)\n" % (c.values, c.mrxWins, c.games,
+                                                                                low, high, c.reason))
+    return configurations
+
+
+def writeTable(configurations, keys, out_file, z=1.96):
+    """
+    Writes the results of the configurations as CSV: the values of the keys, then the COLUMNS.
+    """
+    import csv
+    writer = csv.writer(out_file)
+    writer.writerow(keys + COLUMNS)
+    for c in configurations:
+        writer.writerow(c.asRow(keys, z))
+
+
+def main(argv=None):
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Sweep of the settings, writes the win rates as CSV.")
+    parser.add_argument("--param", action="append", required=True, metavar="KEY=V1|V2|...",
+                        help="a key of the settings (or NUMBER_OF_COPS) and its values")
+    parser.add_argument("--random", type=int, default=None, metavar="N", help="play N random configurations")
+    parser.add_argument("--mrx", default=None, help="Mr.X type (default: MrX_TYPE in the settings)")
+    parser.add_argument("--cops", default=None, help="cops type (default: COPS_TYPE in the settings)")
+    parser.add_argument("--max-games", type=int, default=400, help="maximum number of games of a configuration")
+    parser.add_argument("--round", type=int, default=20, help="games of a configuration in every round")
+    parser.add_argument("--precision", type=float, default=0.05, help="target half width of the win rate interval")
+    parser.add_argument("--z", type=float, default=1.96, help="quantile of the confidence intervals")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game (and of the random search)")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("-o", "--output", default=None, help="CSV output file (default: stdout)")
+    args = parser.parse_args(argv)
+    try:
+        batch.checkSelfControlled(args.mrx, args.cops)
+    except ValueError, message:
+        parser.error(str(message))
+    
+    parameters = []
+    for param in args.param:
+        key, separator, values = param.partition("=")
+        if separator == "" or values == "":
+            parser.error("wrong parameter (KEY=V1|V2|...) : " + param)
+        parameters.append((key.strip(), [value.strip() for value in values.split("|")]))
+    keys = [key for key, _ in parameters]
+    
+    if args.random is None:
+        configurations = gridConfigurations(parameters)
+    else:
+        configurations = randomConfigurations(parameters, args.random, args.seed)
+    results = runSweep(configurations, args.mrx, args.cops, args.max_games, args.round, args.precision,
+                       args.z, args.seed, args.processes)
+    
+    out_file = sys.stdout if args.output is None else open(args.output, "wb")
+    writeTable(results, keys, out_file, args.z)
+    if out_file is not sys.stdout:
+        out_file.close()
+
+
+if __name__ == '__main__':
+    main()
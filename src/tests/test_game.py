@@ -0,0 +1,154 @@
+'''
+Tests of the game states.
+
+Run them from the src directory:
+python -m unittest discover -s tests
+'''
+import random
+import unittest
+
+from agents import AgentRole, KeyboardMrX, KeyboardCop
+from game import GameState, GameStateData
+from hashing import ZOBRIST
+from rules import Rules
+from settings import Settings
+
+
+def newGameState(seed):
+    """
+    Returns the initial state of a game (the Keyboard agents are only used for their states,
+    they are never asked for an action).
+    """
+    random.seed(seed)
+    agents = [KeyboardMrX()] + [KeyboardCop(i+1) for i in range(Settings.getNumberOfCops())]
+    return GameState(GameStateData(Settings.getLayout(), agents))
+
+
+def randomActions(gameState):
+    """
+    Plays random moves on gameState (in place) until the game is over,
+    it yields the tuple (agentIndex, action) of every move before performing it.
+    """
+    agentIndex = 0
+    while not gameState.isEndState(AgentRole.Mr_X if agentIndex == 0 else AgentRole.COP)[0]:
+        actions = Rules.getLegalActions(gameState.data.getAgent(agentIndex), gameState.data)
+        if actions != []:
+            action = random.choice(actions)
+            yield agentIndex, action
+            gameState.applyAction(agentIndex, action)
+        agentIndex = (agentIndex + 1) % len(gameState.data.agents)
+
+
+def snapshot(gameState):
+    """
+    Returns a copy of the positions, tickets and moves of the agents and of the revealed moves of Mr.X.
+    """
+    agentStates = [agent.getAgentState() for agent in gameState.data.agents]
+    return ([(state.getPosition(), dict(state.getTicketsAsDict()), list(state.getMovesHistory()))
+             for state in agentStates],
+            dict(gameState.data.getAgent(0).notHiddenMoves))
+
+
+class UndoActionTest(unittest.TestCase):
+    
+    def testUndoRestoresTheState(self):
+        for seed in range(5):
+            gameState = newGameState(seed)
+            history = []
+            for agentIndex, action in randomActions(gameState):
+                history.append((snapshot(gameState), agentIndex, action))
+            self.assertTrue(len(history) > 0)
+            while history != []:
+                expected, agentIndex, action = history.pop()
+                self.assertEqual(gameState.undoAction(), (agentIndex, action))
+                self.assertEqual(snapshot(gameState), expected)
+    
+    def testSameStateOfGenerateSuccessor(self):
+        for seed in range(5):
+            gameState = newGameState(seed)
+            for agentIndex, action in randomActions(gameState):
+                successor = gameState.generateSuccessor(agentIndex, action)
+                gameState.applyAction(agentIndex, action)
+                self.assertEqual(snapshot(gameState), snapshot(successor))
+                gameState.undoAction()
+
+
+class HashTest(unittest.TestCase):
+    
+    def testIncrementalHash(self):
+        for seed in range(5):
+            gameState = newGameState(seed)
+            self.assertEqual(gameState.getHash(), ZOBRIST.hashAgents(gameState.data.agents))
+            numActions = 0
+            for agentIndex, action in randomActions(gameState):
+                successor = gameState.generateSuccessor(agentIndex, action)
+                self.assertEqual(successor.getHash(), ZOBRIST.hashAgents(successor.data.agents))
+                numActions += 1
+            self.assertEqual(gameState.getHash(), ZOBRIST.hashAgents(gameState.data.agents))
+            for _ in range(numActions):
+                gameState.undoAction()
+                self.assertEqual(gameState.getHash(), ZOBRIST.hashAgents(gameState.data.agents))
+
+
+class EndOfGameFlagsTest(unittest.TestCase):
+    
+    def assertSameFlags(self, data):
+        """
+        Checks the flags kept by data against the ones computed from scratch.
+        """
+        positions = [agent.getAgentState().getPosition() for agent in data.agents]
+        self.assertEqual(data.getCopPositions(), positions[1:])
+        self.assertEqual(data.getCopSet(), frozenset(positions[1:]))
+        caughtBy = None
+        if positions[0] in positions[1:]:
+            caughtBy = positions[1:].index(positions[0]) + 1
+        self.assertEqual(data.getCaughtBy(), caughtBy)
+        for i, agent in enumerate(data.agents):
+            self.assertEqual(data.hasLegalAction(i), Rules.getLegalActions(agent, data) != [])
+    
+    def testIncrementalFlags(self):
+        for seed in range(5):
+            gameState = newGameState(seed)
+            self.assertSameFlags(gameState.data)
+            numActions = 0
+            for agentIndex, action in randomActions(gameState):
+                self.assertSameFlags(gameState.data)
+                numActions += 1
+            self.assertSameFlags(gameState.data)
+            for _ in range(numActions):
+                gameState.undoAction()
+                self.assertSameFlags(gameState.data)
+    
+    def testPlaceAgent(self):
+        gameState = newGameState(0)
+        nodes = Settings.getLegalPositions()
+        for _ in range(20):
+            agentIndex = random.randrange(len(gameState.data.agents))
+            gameState.placeAgent(agentIndex, random.choice(nodes))
+            self.assertSameFlags(gameState.data)
+            self.assertEqual(gameState.getHash(), ZOBRIST.hashAgents(gameState.data.agents))
+    
+    def testSurrounded(self):
+        gameState = newGameState(0)
+        data = gameState.data
+        layout = data.layout
+        numCops = data.numberOfCops()
+        nodes = [n for n in Settings.getLegalPositions() if len(set(layout.getNeighbours(n))) <= numCops]
+        self.assertTrue(nodes != [])
+        for node in nodes:
+            others = [n for n in Settings.getLegalPositions() if n != node and n not in layout.getNeighbours(node)]
+            for i in range(numCops):
+                gameState.placeAgent(i+1, others[i])
+            gameState.placeAgent(0, node)
+            self.assertSameFlags(data)
+            # the cops close the way out of Mr.X one at a time, then one of them leaves
+            for i, neighbour in enumerate(sorted(set(layout.getNeighbours(node)))):
+                gameState.placeAgent(i+1, neighbour)
+                self.assertSameFlags(data)
+            self.assertFalse(data.hasLegalAction(0))
+            gameState.placeAgent(1, others[0])
+            self.assertSameFlags(data)
+
+
+if __name__ == "__main__":
+    unittest.main()
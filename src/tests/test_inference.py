@@ -0,0 +1,104 @@
+'''
+Tests of the inference modules.
+
+Run them from the src directory:
+python -m unittest discover -s tests
+'''
+import random
+import unittest
+
+from agents import AgentRole, KeyboardMrX, KeyboardCop
+from game import GameState, GameStateData
+from inference import ExactInference, VectorizedExactInference, ApproximateInference, BeliefService
+from rules import Rules
+from settings import Settings
+
+
+def randomGame(seed, cops=False):
+    """
+    Plays a game of random moves and yields its states after every move of Mr.X, and of the cops too
+    if cops is True (the Keyboard agents are only used for their states, they are never asked for an action).
+    """
+    random.seed(seed)
+    agents = [KeyboardMrX()] + [KeyboardCop(i+1) for i in range(Settings.getNumberOfCops())]
+    state = GameState(GameStateData(Settings.getLayout(), agents))
+    while not state.isEndState(AgentRole.Mr_X)[0]:
+        action = random.choice(Rules.getLegalActions(state.data.getAgent(0), state.data))
+        state = state.generateSuccessor(0, action)
+        yield state
+        for i in range(state.numberOfCops()):
+            if state.isEndState(AgentRole.COP)[0]:
+                return
+            actions = Rules.getLegalActions(state.data.getAgent(i+1), state.data)
+            if actions != []:
+                state = state.generateSuccessor(i+1, random.choice(actions))
+                if cops and not state.isEndState(AgentRole.COP)[0]:
+                    yield state
+
+
+def getEvidences(state):
+    """
+    Returns the tickets used by Mr.X and the positions where he was seen (see GameState.getMrXEvidences).
+    """
+    mrx = state.data.getAgent(0)
+    tickets = [action.getTicketType() for action in mrx.getAgentState().getMovesHistory()]
+    return tickets, mrx.notHiddenMoves
+
+
+class VectorizedExactInferenceTest(unittest.TestCase):
+    
+    def assertSameBeliefs(self, expected, actual):
+        for pos in set(expected.keys()) | set(actual.keys()):
+            self.assertAlmostEqual(expected[pos], actual[pos], places=9, msg="position %d" % pos)
+    
+    def testSameBeliefsOfExactInference(self):
+        for seed in range(5):
+            exact = ExactInference()
+            vectorized = VectorizedExactInference()
+            self.assertSameBeliefs(exact.getBeliefsDistribution(), vectorized.getBeliefsDistribution())
+            for state in randomGame(seed):
+                tickets, notHiddenMoves = getEvidences(state)
+                exact.updateBeliefs(tickets, notHiddenMoves, state)
+                vectorized.updateBeliefs(tickets, notHiddenMoves, state)
+                self.assertSameBeliefs(exact.getBeliefsDistribution(), vectorized.getBeliefsDistribution())
+
+
+class ApproximateInferenceTest(unittest.TestCase):
+    
+    def testParticlesOnPossiblePositions(self):
+        for seed in range(5):
+            exact = ExactInference()
+            approximate = ApproximateInference(seed=seed)
+            for state in randomGame(seed):
+                tickets, notHiddenMoves = getEvidences(state)
+                exact.updateBeliefs(tickets, notHiddenMoves, state)
+                approximate.updateBeliefs(tickets, notHiddenMoves, state)
+                beliefs = exact.getBeliefsDistribution()
+                for pos in approximate.getBeliefsDistribution().keys():
+                    self.assertTrue(beliefs[pos] > 0, "particle in the impossible position %d" % pos)
+    
+    def testNoFreeNode(self):
+        approximate = ApproximateInference(seed=0)
+        self.assertRaises(ValueError, approximate._uniformParticles, 10, range(approximate.model.size))
+
+
+class BeliefServiceTest(unittest.TestCase):
+    
+    def testHeldBeliefsDoNotChange(self):
+        for inference in (ExactInference, VectorizedExactInference):
+            for seed in range(5):
+                service = BeliefService(inference())
+                held = [] # (distribution returned by the service, copy of it)
+                for state in randomGame(seed, cops=True):
+                    beliefs = service.getBeliefs(state)
+                    self.assertAlmostEqual(sum(beliefs.values()), 1)
+                    for pos in state.getCopSet():
+                        self.assertEqual(beliefs[pos], 0)
+                    held.append((beliefs, dict(beliefs.items())))
+                self.assertTrue(service.getStats()["remasks"] > 0)
+                for beliefs, expected in held:
+                    self.assertEqual(dict(beliefs.items()), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
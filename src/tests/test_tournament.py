@@ -0,0 +1,72 @@
+'''
+Tests of the ratings of the tournaments.
+
+Run them from the src directory:
+python -m unittest discover -s tests
+'''
+import unittest
+
+import util
+from tournament import Glicko, INITIAL_RATING, INITIAL_RD
+
+
+class GlickoTest(unittest.TestCase):
+    
+    def testExampleOfGlickman(self):
+        # the example of the paper of Glickman (The Glicko system): the player beats the first
+        # opponent and loses against the others, his rating goes to 1464 and his deviation to 151.4
+        glicko = Glicko()
+        glicko.ratings = {"player": (1500.0, 200.0), "a": (1400.0, 30.0), "b": (1550.0, 100.0),
+                          "c": (1700.0, 300.0)}
+        glicko.ratePeriod([("player", "a"), ("b", "player"), ("c", "player")])
+        rating, rd = glicko.getRating("player")
+        self.assertAlmostEqual(rating, 1464.1, places=1)
+        self.assertAlmostEqual(rd, 151.4, places=1)
+    
+    def testNewPlayers(self):
+        glicko = Glicko()
+        self.assertEqual(glicko.getRating("player"), (INITIAL_RATING, INITIAL_RD))
+        self.assertAlmostEqual(glicko.expectedScore("player", "opponent"), 0.5)
+        glicko.ratePeriod([("player", "opponent")])
+        rating, rd = glicko.getRating("player")
+        opponentRating, opponentRd = glicko.getRating("opponent")
+        self.assertAlmostEqual(rating - INITIAL_RATING, INITIAL_RATING - opponentRating)
+        self.assertAlmostEqual(rd, opponentRd)
+        self.assertTrue(rd < INITIAL_RD)
+        self.assertTrue(glicko.expectedScore("player", "opponent") > 0.5)
+    
+    def testDeviationGrows(self):
+        glicko = Glicko(c=50.0)
+        glicko.ratings = {"player": (1500.0, 50.0), "opponent": (1500.0, 50.0)}
+        glicko.ratePeriod([("player", "opponent")])
+        fixed = Glicko()
+        fixed.ratings = {"player": (1500.0, 50.0), "opponent": (1500.0, 50.0)}
+        fixed.ratePeriod([("player", "opponent")])
+        self.assertTrue(glicko.getRating("player")[0] > fixed.getRating("player")[0])
+        self.assertTrue(glicko.getRating("player")[1] > fixed.getRating("player")[1])
+
+
+class WilsonIntervalTest(unittest.TestCase):
+    
+    def testInterval(self):
+        low, high = util.wilsonInterval(8, 10)
+        self.assertAlmostEqual(low, 0.4902, places=4)
+        self.assertAlmostEqual(high, 0.9433, places=4)
+    
+    def testBounds(self):
+        self.assertEqual(util.wilsonInterval(0, 0), (0.0, 1.0))
+        low, high = util.wilsonInterval(0, 20)
+        self.assertEqual(low, 0.0)
+        self.assertTrue(0 < high < 0.2)
+        low, high = util.wilsonInterval(20, 20)
+        self.assertTrue(0.8 < low < 1)
+        self.assertAlmostEqual(high, 1.0)
+    
+    def testNarrowerWithMoreTrials(self):
+        low, high = util.wilsonInterval(50, 100)
+        self.assertTrue(low < 0.5 < high)
+        self.assertTrue(util.wilsonInterval(500, 1000)[1] - util.wilsonInterval(500, 1000)[0] < high - low)
+
+
+if __name__ == "__main__":
+    unittest.main()
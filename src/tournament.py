@@ -0,0 +1,210 @@
+'''
+Round-robin tournament between agent types: every Mr.X type plays against every cops type,
+the games are played headless in a pool of processes (see batch.py) and rated with Glicko.
+
+Every pairing (Mr.X type, cops type) is played in rounds of games, on the same seeds for all the pairings
+(thus on the same start positions). A pairing stops as soon as its result is clear: the confidence interval
+(see util.wilsonInterval) of the win rate of Mr.X does not contain 1/2 or it is narrower than 2 * precision,
+or after maxGames games. The other pairings go on, so the games are spent where the result is uncertain.
+
+NOTE : the interval is checked after every round, so its confidence is lower than the nominal one:
+the default z is 2.576 (99%) to make up for that.
+
+Command line usage:
+python tournament.py --mrx Random,MCTS --cops Random,Search --max-games 200 --round 20 --random-positions
+python tournament.py --mrx Random,myagents.SmartMrX --cops Random -o tournament.json
+'''
+
+import math
+
+import batch
+import util
+from agents import AgentRole
+
+
+GLICKO_Q = math.log(10) / 400
+INITIAL_RATING = 1500.0
+INITIAL_RD = 350.0
+
+
+class Glicko:
+    """
+    Glicko ratings (rating and rating deviation) of the players, updated by rating periods:
+    all the games of a period are rated together.
+    A player is any hashable object (es: ("MrX", "Random")).
+    """
+    
+    def __init__(self, c=0.0):
+        self.ratings = {} # player --> (rating, rating deviation)
+        self.c = c # how much the deviation grows in a period (0: the agents do not change)
+    
+    def _g(self, rd):
+        return 1 / math.sqrt(1 + 3 * GLICKO_Q ** 2 * rd ** 2 / math.pi ** 2)
+    
+    def getRating(self, player):
+        return self.ratings.get(player, (INITIAL_RATING, INITIAL_RD))
+    
+    def getInterval(self, player, z=1.96):
+        """
+        Returns the confidence interval (low, high) of the rating of the player.
+        """
+        rating, rd = self.getRating(player)
+        return rating - z * rd, rating + z * rd
+    
+    def expectedScore(self, player, opponent):
+        (rating, _), (opponentRating, opponentRd) = self.getRating(player), self.getRating(opponent)
+        return 1 / (1 + 10 ** (-self._g(opponentRd) * (rating - opponentRating) / 400))
+    
+    def ratePeriod(self, games):
+        """
+        Updates the ratings with the games of a rating period: a list of (winner, loser).
+        """
+        results = {} # player --> [(opponent, score), ...]
+        for winner, loser in games:
+            results.setdefault(winner, []).append((loser, 1.0))
+            results.setdefault(loser, []).append((winner, 0.0))
+        updated = {}
+        for player, scores in results.items():
+            rating, rd = self.getRating(player)
+            rd = min(math.sqrt(rd ** 2 + self.c ** 2), INITIAL_RD)
+            variance = 0.0
+            delta = 0.0
+            for opponent, score in scores:
+                g = self._g(self.getRating(opponent)[1])
+                expected = self.expectedScore(player, opponent)
+                variance += g ** 2 * expected * (1 - expected)
+                delta += g * (score - expected)
+            denominator = 1 / rd ** 2 + GLICKO_Q ** 2 * variance # 1/RD^2 + 1/d^2
+            updated[player] = (rating + GLICKO_Q / denominator * delta, math.sqrt(1 / denominator))
+        self.ratings.update(updated)
+
+
+class Pairing:
+    """
+    The games played by a Mr.X type against a cops type.
+    """
+    
+    def __init__(self, mrxType, copsType):
+        self.mrxType = mrxType
+        self.copsType = copsType
+        self.games = 0
+        self.mrxWins = 0
+        self.done = False
+        self.reason = None # why the pairing stopped
+    
+    def add(self, result):
+        self.games += 1
+        if result["winner"] == AgentRole.Mr_X:
+            self.mrxWins += 1
+    
+    def getInterval(self, z):
+        return util.wilsonInterval(self.mrxWins, self.games, z)
+    
+    def check(self, maxGames, precision, z):
+        """
+        Decides if the pairing is over (see the module documentation).
+        """
+        low, high = self.getInterval(z)
+        if low > 0.5 or high < 0.5:
+            self.done, self.reason = True, "clear"
+        elif high - low <= 2 * precision:
+            self.done, self.reason = True, "precise"
+        elif self.games >= maxGames:
+            self.done, self.reason = True, "max games"
+        return self.done
+    
+    def asDict(self, z):
+        low, high = self.getInterval(z)
+        return {"mrx": self.mrxType, "cops": self.copsType, "games": self.games, "mrxWins": self.mrxWins,
+                "mrxWinRate": float(self.mrxWins) / max(1, self.games), "low": low, "high": high,
+                "reason": self.reason}
+
+
+def runTournament(mrxTypes, copsTypes, maxGames=200, roundGames=20, precision=0.05, z=2.576,
+                  seed=0, settings=None, processes=None, verbose=True):
+    """
+    Plays the tournament (see the module documentation), settings are the settings which differ from
+    the Settings in every game (see GameConfig.derive, es: random initial positions).
+    Returns a dictionary with the keys "pairings" (see Pairing.asDict) and "ratings":
+    a list of dictionaries (role, type, rating, rd, low, high), the best first.
+    """
+    pairings = [Pairing(mrxType, copsType) for mrxType in mrxTypes for copsType in copsTypes]
+    glicko = Glicko()
+    played = 0 # the games played by every pairing (still running) so far
+    while not all([p.done for p in pairings]):
+        numGames = min(roundGames, maxGames - played)
+        specs = []
+        for p in pairings:
+            if not p.done:
+                for spec in batch.makeSpecs(numGames, p.mrxType, p.copsType, seed + played):
+                    spec["game"] += played
+                    if settings:
+                        spec["settings"] = settings
+                    specs.append(spec)
+        byPairing = dict([((p.mrxType, p.copsType), p) for p in pairings])
+        games = []
+        for result in batch.runBatch(specs, processes):
+            byPairing[(result["mrx"], result["cops"])].add(result)
+            players = [("MrX", result["mrx"]), ("Cops", result["cops"])]
+            games.append(tuple(players if result["winner"] == AgentRole.Mr_X else reversed(players)))
+        glicko.ratePeriod(games)
+        played += numGames
+        for p in pairings:
+            if not p.done and p.check(maxGames, precision, z) and verbose:
+                low, high = p.getInterval(z)
+                print "%-12s vs %-12s : Mr.X wins %d / %d [%.3f, %.3f] (%s)" % (p.mrxType, p.copsType, p.mrxWins,
+                                                                               p.games, low, high, p.reason)
+    
+    ratings = []
+    for role, agentTypes in (("MrX", mrxTypes), ("Cops", copsTypes)):
+        for agentType in agentTypes:
+            rating, rd = glicko.getRating((role, agentType))
+            low, high = glicko.getInterval((role, agentType))
+            ratings.append({"role": role, "type": agentType, "rating": rating, "rd": rd, "low": low, "high": high})
+    ratings.sort(key=lambda r: -r["rating"])
+    return {"pairings": [p.asDict(z) for p in pairings], "ratings": ratings}
+
+
+def main(argv=None):
+    import argparse
+    import json
+    
+    parser = argparse.ArgumentParser(description="Round-robin tournament between Mr.X and cops agent types.")
+    parser.add_argument("--mrx", required=True, help="Mr.X types separated by commas (es: Random,MCTS or module.Class)")
+    parser.add_argument("--cops", required=True, help="cops types separated by commas (es: Random,Search)")
+    parser.add_argument("--max-games", type=int, default=200, help="maximum number of games of a pairing")
+    parser.add_argument("--round", type=int, default=20, help="games of a pairing in every round")
+    parser.add_argument("--precision", type=float, default=0.05, help="half width of the interval which ends a pairing")
+    parser.add_argument("--z", type=float, default=2.576, help="quantile of the confidence intervals")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--random-positions", action="store_true",
+                        help="random initial positions (drawn from the seed of every game)")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("-o", "--output", default=None, help="JSON file of the results")
+    args = parser.parse_args(argv)
+    try:
+        for mrxType in args.mrx.split(","):
+            for copsType in args.cops.split(","):
+                batch.checkSelfControlled(mrxType, copsType)
+    except ValueError, message:
+        parser.error(str(message))
+    
+    settings = None
+    if args.random_positions:
+        from settings import Settings
+        settings = {"INITIAL_MrX_POSITION": "random",
+                    "INITIAL_COPS_POSITION": ", ".join(["random"] * Settings.getNumberOfCops())}
+    results = runTournament(args.mrx.split(","), args.cops.split(","), args.max_games, args.round,
+                            args.precision, args.z, args.seed, settings, args.processes)
+    
+    print
+    for r in results["ratings"]:
+        print "%-5s %-20s %7.1f +- %5.1f  [%7.1f, %7.1f]" % (r["role"], r["type"], r["rating"], r["rd"],
+                                                            r["low"], r["high"])
+    if args.output is not None:
+        with open(args.output, "w") as out_file:
+            json.dump(results, out_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,14 @@ Created on 07/set/2016
 '''
 
 import inspect
+import math
 import sys
 
+try:
+    import numpy as np
+except ImportError:  # numpy is needed only by Distribution
+    np = None
+
 
 def raiseNotDefined():
     fileName = inspect.stack()[1][1]
@@ -20,12 +26,11 @@ class Counter(dict):
     """
     ...
     """
-    def __getitem__(self, key):
+    def __missing__(self, key):
         """
-        Returns the item associated to the key. If the key is not present, returns 0.
+        Returns 0 for the keys which are not present (the key is NOT inserted).
         """
-        self.setdefault(key, 0)
-        return dict.__getitem__(self, key)
+        return 0
     
     def argMax(self):
         """
@@ -62,6 +67,156 @@ class Counter(dict):
         return Counter(dict.copy(self))
         
    
+class Distribution:
+    """
+    A probability distribution over the nodes of the board, backed by a dense numpy array indexed by
+    node number: normalize, argMax, topK, entropy, products and masks are vectorized.
+    
+    It can be used as a dictionary (as a Counter) of the nodes with a probability > 0:
+    d[node], d[node] = p, node in d, len(d), d.keys(), d.items(), iteration and printing.
+    
+    NOTE : numpy is required.
+    """
+    
+    def __init__(self, values):
+        """
+        values is a numpy array indexed by node (it is NOT copied) or the number of nodes of the board
+        (all the probabilities are 0).
+        """
+        if np is None:
+            raise ImportError("numpy is required by Distribution")
+        if isinstance(values, (int, long)):
+            values = np.zeros(values)
+        self.array = values
+    
+    def fromDict(dictionary, size):
+        """
+        Returns the Distribution of a dictionary node --> probability (es: a Counter) over size nodes.
+        """
+        result = Distribution(size)
+        for node, value in dictionary.items():
+            result.array[node] = value
+        return result
+    fromDict = staticmethod(fromDict)
+    
+    def getArray(self):
+        """
+        Returns the array of the probabilities, indexed by node.
+        """
+        return self.array
+    
+    def totalCount(self):
+        return float(self.array.sum())
+    
+    def normalize(self):
+        """
+        EDITs the distribution in place so that the totalCount is 1 (nothing is done if it is 0).
+        """
+        total = self.array.sum()
+        if total > 0:
+            self.array /= total
+    
+    def argMax(self):
+        """
+        Returns the list of nodes associated with the greatest probability (as Counter.argMax).
+        """
+        if not self.array.any():
+            return None
+        return [int(node) for node in np.flatnonzero(self.array == self.array.max())]
+    
+    def topK(self, k):
+        """
+        Returns the list of the (at most) k most likely nodes, with a probability > 0: [(node, probability), ...]
+        """
+        nonzero = np.flatnonzero(self.array)
+        if len(nonzero) > k:
+            nonzero = nonzero[np.argpartition(-self.array[nonzero], k - 1)[:k]]
+        nonzero = nonzero[np.argsort(-self.array[nonzero], kind="mergesort")]
+        return [(int(node), float(self.array[node])) for node in nonzero]
+    
+    def entropy(self):
+        """
+        Returns the entropy (in bits) of the normalized distribution.
+        """
+        total = self.array.sum()
+        if total <= 0:
+            return 0.0
+        p = self.array[self.array > 0] / total
+        return float(-(p * np.log2(p)).sum())
+    
+    def mask(self, keep):
+        """
+        EDITs the distribution in place: the probabilities where keep (a boolean array indexed by node) is False
+        are set to 0. It is NOT normalized.
+        """
+        self.array *= keep
+    
+    def maskNodes(self, nodes):
+        """
+        EDITs the distribution in place: the probabilities of nodes (a list of nodes) are set to 0.
+        It is NOT normalized.
+        """
+        nodes = [node for node in nodes if node < len(self.array)]
+        self.array[nodes] = 0
+    
+    def __mul__(self, other):
+        """
+        Element-wise product with another Distribution (or an array indexed by node), NOT normalized.
+        """
+        if isinstance(other, Distribution):
+            other = other.array
+        return Distribution(self.array * other)
+    
+    def copy(self):
+        return Distribution(self.array.copy())
+    
+    # the dictionary adaptor
+    
+    def __getitem__(self, node):
+        if 0 <= node < len(self.array):
+            return float(self.array[node])
+        return 0
+    
+    def __setitem__(self, node, value):
+        self.array[node] = value
+    
+    def __contains__(self, node):
+        return 0 <= node < len(self.array) and self.array[node] > 0
+    
+    def keys(self):
+        return [int(node) for node in np.flatnonzero(self.array)]
+    
+    def values(self):
+        return [float(self.array[node]) for node in np.flatnonzero(self.array)]
+    
+    def items(self):
+        return [(int(node), float(self.array[node])) for node in np.flatnonzero(self.array)]
+    
+    def __iter__(self):
+        return iter(self.keys())
+    
+    def __len__(self):
+        return int(np.count_nonzero(self.array))
+    
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+def wilsonInterval(successes, trials, z=1.96):
+    """
+    Returns the Wilson score interval (low, high) of the probability of success, given the number of
+    successes in trials independent trials (z is the quantile of the normal distribution: 1.96 for 95%).
+    es: the confidence bounds of a win rate. (0.0, 1.0) if there is no trial.
+    """
+    if trials == 0:
+        return 0.0, 1.0
+    p = float(successes) / trials
+    denominator = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denominator
+    halfWidth = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - halfWidth), min(1.0, center + halfWidth)
+
+
 if __name__ == "__main__":
     c = Counter()
     c["a"] = 1